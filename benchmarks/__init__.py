@@ -0,0 +1 @@
+"""オフラインで実行するベンチマーク集（`python -m benchmarks.<名前>` で実行）。"""
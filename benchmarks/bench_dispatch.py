@@ -0,0 +1,137 @@
+"""リアクションイベントの振り分けのスループット比較。
+
+2,000 件の募集を追跡した状態で、無関係なメッセージへのリアクション・マップ投票・操作用の絵文字が
+混ざったイベント列を流し、以前の「募集を引いてから絵文字を 5 回比較する」振り分けと、
+(メッセージID, 絵文字名, カスタム絵文字ID) の対応表による振り分けの 1 秒あたりの処理件数を比べる。
+処理本体は何もしない関数に置き換え、振り分けだけを測る。1 回の計測はぶれが大きいので、
+2 つを交互に ``ROUNDS`` 回ずつ流し、それぞれ最も速かった回の値を使う。
+
+    python -m benchmarks.bench_dispatch
+"""
+
+from __future__ import annotations
+
+import asyncio
+import os
+import random
+import time
+from types import SimpleNamespace
+from typing import Any, List, Optional
+
+os.environ.setdefault("DISCORD_BOT_TOKEN", "benchmark")
+
+import discord  # noqa: E402
+from discord.ext import commands  # noqa: E402
+
+from bot.commands.bo import BoManager, ReactionRoute  # noqa: E402
+from bot.recruitment import TrackedMessage  # noqa: E402
+
+TRACKED_COUNT = 2_000
+EVENT_COUNT = 200_000
+ROUNDS = 5
+BOT_USER_ID = 1
+# (割合, 種類): 無関係なメッセージ / 募集へのマップ投票 / 募集への操作用の絵文字
+EVENT_MIX = ((0.6, "untracked"), (0.3, "map_vote"), (0.1, "control"))
+CONTROL_EMOJIS = ("👋", "⚔️", "➕", "📢", "♻️")
+MAP_EMOJIS = ("🇵", "🇺", "7️⃣", "🇱")
+
+
+async def _noop(payload: Any) -> None:
+    return None
+
+
+def _is_tracked_emoji(emoji: discord.PartialEmoji, target: Optional[str]) -> bool:
+    if target is None:
+        return False
+    if emoji.id is not None:
+        return False
+    return emoji.name == target
+
+
+async def legacy_dispatch(cog: BoManager, payload: Any) -> None:
+    """以前の on_raw_reaction_add の振り分け部分。"""
+    data = cog.tracked_messages.get(payload.message_id)
+    if data is None or payload.guild_id is None:
+        return
+    if payload.user_id == BOT_USER_ID:
+        return
+    if data.is_disbanded:
+        return
+    for target in (data.join_emoji, data.check_emoji, data.dummy_emoji, data.notify_emoji, data.recruit_emoji):
+        if _is_tracked_emoji(payload.emoji, target):
+            await _noop(payload)
+            return
+
+
+def build_events(message_ids: List[int], rng: random.Random) -> List[Any]:
+    emojis = {name: discord.PartialEmoji(name=name) for name in CONTROL_EMOJIS + MAP_EMOJIS}
+    weights = [share for share, _ in EVENT_MIX]
+    kinds = [kind for _, kind in EVENT_MIX]
+    events = []
+    for _ in range(EVENT_COUNT):
+        kind = rng.choices(kinds, weights)[0]
+        if kind == "untracked":
+            message_id = rng.randrange(10**17, 10**18)
+            emoji = emojis[rng.choice(MAP_EMOJIS + CONTROL_EMOJIS)]
+        else:
+            message_id = rng.choice(message_ids)
+            emoji = emojis[rng.choice(MAP_EMOJIS if kind == "map_vote" else CONTROL_EMOJIS)]
+        events.append(
+            SimpleNamespace(message_id=message_id, guild_id=1, user_id=rng.randrange(2, 10**6), emoji=emoji)
+        )
+    return events
+
+
+async def run() -> None:
+    bot = commands.Bot(command_prefix="!", intents=discord.Intents.default())
+    bot._connection.user = SimpleNamespace(id=BOT_USER_ID)  # type: ignore[assignment]
+    cog = BoManager(bot)
+
+    rng = random.Random(0)
+    message_ids = []
+    for index in range(TRACKED_COUNT):
+        message_id = 10**16 + index
+        cog._track(
+            message_id,
+            TrackedMessage(
+                guild_id=1,
+                channel_id=index % 50,
+                title="募集",
+                color=0,
+                join_emoji="👋",
+                check_emoji="⚔️",
+                dummy_emoji="➕",
+                notify_emoji="📢",
+                recruit_emoji="♻️",
+            ),
+        )
+        message_ids.append(message_id)
+    # 処理本体を何もしない関数に置き換えて振り分けだけを測る
+    for key in cog._reaction_routes:
+        cog._reaction_routes[key] = ReactionRoute(_noop, _noop)
+
+    events = build_events(message_ids, rng)
+    dispatchers = (
+        ("legacy chain", lambda payload: legacy_dispatch(cog, payload)),
+        ("dispatch table", cog.on_raw_reaction_add),
+    )
+    results = {name: 0.0 for name, _ in dispatchers}
+    for _ in range(ROUNDS):
+        for name, dispatch in dispatchers:
+            started = time.perf_counter()
+            for payload in events:
+                await dispatch(payload)
+            elapsed = time.perf_counter() - started
+            results[name] = max(results[name], len(events) / elapsed)
+    for name, _ in dispatchers:
+        print(f"{name:>15}: {results[name]:>12,.0f} events/s")
+    print(f"{'speedup':>15}: {results['dispatch table'] / results['legacy chain']:.2f}x")
+    await cog.cog_unload()
+
+
+def main() -> None:
+    asyncio.run(run())
+
+
+if __name__ == "__main__":
+    main()
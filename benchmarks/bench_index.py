@@ -0,0 +1,88 @@
+"""募集インデックスのマイクロベンチマーク。
+
+10,000 件の募集を追跡した状態で「チャンネル内の最新の募集」を求める処理を、
+全件走査と RecruitmentIndex で比較する。
+
+    python -m benchmarks.bench_index
+"""
+
+from __future__ import annotations
+
+import os
+import random
+import timeit
+
+os.environ.setdefault("DISCORD_BOT_TOKEN", "benchmark")
+
+from bot.recruitment import RecruitmentIndex, TrackedMessage  # noqa: E402
+
+TRACKED_COUNT = 10_000
+GUILD_COUNT = 50
+CHANNELS_PER_GUILD = 20
+LOOKUPS = 10_000
+
+
+def build_tracked(count: int) -> dict[int, TrackedMessage]:
+    rng = random.Random(0)
+    tracked: dict[int, TrackedMessage] = {}
+    message_id = 1_000_000
+    for _ in range(count):
+        message_id += rng.randint(1, 1000)
+        guild_id = rng.randrange(GUILD_COUNT)
+        channel_id = guild_id * CHANNELS_PER_GUILD + rng.randrange(CHANNELS_PER_GUILD)
+        tracked[message_id] = TrackedMessage(
+            guild_id=guild_id,
+            channel_id=channel_id,
+            title="募集",
+            color=0,
+            join_emoji="👋",
+            check_emoji="⚔️",
+            dummy_emoji="➕",
+            notify_emoji="📢",
+            recruit_emoji="♻️",
+        )
+    return tracked
+
+
+def latest_by_scan(tracked: dict[int, TrackedMessage], channel_id: int) -> int | None:
+    channel_tracked = [msg_id for msg_id, data in tracked.items() if data.channel_id == channel_id]
+    return max(channel_tracked) if channel_tracked else None
+
+
+def main() -> None:
+    tracked = build_tracked(TRACKED_COUNT)
+    index = RecruitmentIndex()
+    for message_id, data in tracked.items():
+        index.add(message_id, data)
+
+    rng = random.Random(1)
+    channels = [rng.randrange(GUILD_COUNT * CHANNELS_PER_GUILD) for _ in range(LOOKUPS)]
+    for channel_id in channels[:100]:
+        assert latest_by_scan(tracked, channel_id) == index.latest_in_channel(channel_id)
+
+    scan_lookups = 200
+    scan = timeit.timeit(lambda: [latest_by_scan(tracked, c) for c in channels[:scan_lookups]], number=1)
+    indexed = timeit.timeit(lambda: [index.latest_in_channel(c) for c in channels], number=1)
+    guild = timeit.timeit(lambda: [index.in_guild(c % GUILD_COUNT) for c in channels], number=1)
+
+    churn_ids = list(tracked)
+    rng.shuffle(churn_ids)
+    churn_ids = churn_ids[:LOOKUPS]
+
+    def churn() -> None:
+        for message_id in churn_ids:
+            data = tracked[message_id]
+            index.discard(message_id, data)
+            index.add(message_id, data)
+
+    churn_time = timeit.timeit(churn, number=1)
+
+    print(f"tracked messages       : {TRACKED_COUNT}")
+    print(f"scan latest_in_channel : {scan / scan_lookups * 1e6:10.2f} us/op")
+    print(f"index latest_in_channel: {indexed / LOOKUPS * 1e6:10.2f} us/op")
+    print(f"index in_guild         : {guild / LOOKUPS * 1e6:10.2f} us/op")
+    print(f"index discard+add      : {churn_time / LOOKUPS * 1e6:10.2f} us/op")
+
+
+if __name__ == "__main__":
+    main()
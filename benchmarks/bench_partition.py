@@ -0,0 +1,101 @@
+"""チーム分けのベンチマークと公平性の比較。
+
+以前の貪欲法（重み順に軽いチームへ詰め、人数差を最軽量の参加者で調整する）と
+全探索による最適分割を、ランダムな 12 人ロビーで比較する。
+あわせて、大人数のプールを複数ロビーに分ける ``pool_partition`` の所要時間を測る。
+
+    python -m benchmarks.bench_partition
+"""
+
+from __future__ import annotations
+
+import os
+import random
+import statistics
+import time
+import timeit
+from typing import List, Sequence, Tuple
+
+os.environ.setdefault("DISCORD_BOT_TOKEN", "benchmark")
+
+from bot.teams import best_split, optimal_splits, partition_spread, plan_lobbies, pool_partition  # noqa: E402
+
+LOBBY_SIZES = (4, 6, 8, 10, 12)
+TRIALS = 2000
+POOL_SIZES = (24, 48, 100, 150)
+POOL_TIME_BUDGET = 0.2
+ROLE_WEIGHTS = (1, 1, 1, 2, 2, 3, 4)
+
+
+def greedy_split(weights: Sequence[int], rng: random.Random) -> Tuple[List[int], List[int]]:
+    """以前の _balanced_split + _auto_balance_sizes と同じ手順。"""
+    team_one: List[int] = []
+    team_two: List[int] = []
+    weight_one = 0
+    weight_two = 0
+    order = sorted(range(len(weights)), key=lambda i: (weights[i], rng.random()), reverse=True)
+    for index in order:
+        if weight_one <= weight_two:
+            team_one.append(index)
+            weight_one += weights[index]
+        else:
+            team_two.append(index)
+            weight_two += weights[index]
+
+    while len(team_one) != len(team_two):
+        larger, smaller = (team_one, team_two) if len(team_one) > len(team_two) else (team_two, team_one)
+        candidate = min(range(len(larger)), key=lambda i: weights[larger[i]])
+        smaller.append(larger.pop(candidate))
+    return team_one, team_two
+
+
+def weight_gap(weights: Sequence[int], team: Sequence[int]) -> int:
+    return abs(sum(weights) - 2 * sum(weights[index] for index in team))
+
+
+def main() -> None:
+    rng = random.Random(0)
+    print(f"{'size':>4} {'greedy us':>10} {'exact us':>10} {'greedy gap':>11} {'exact gap':>10} {'greedy worse':>13}")
+    for size in LOBBY_SIZES:
+        lobbies = [[rng.choice(ROLE_WEIGHTS) for _ in range(size)] for _ in range(TRIALS)]
+
+        greedy_gaps = [weight_gap(weights, greedy_split(weights, rng)[0]) for weights in lobbies]
+        exact_gaps = [weight_gap(weights, best_split(weights, rng)[0]) for weights in lobbies]
+        worse = sum(1 for greedy, exact in zip(greedy_gaps, exact_gaps) if greedy > exact)
+        assert all(exact <= greedy for greedy, exact in zip(greedy_gaps, exact_gaps))
+
+        sample = lobbies[:200]
+        greedy_time = timeit.timeit(lambda: [greedy_split(w, rng) for w in sample], number=5) / (5 * len(sample))
+        exact_time = timeit.timeit(lambda: [best_split(w, rng) for w in sample], number=5) / (5 * len(sample))
+
+        print(
+            f"{size:>4} {greedy_time * 1e6:>10.1f} {exact_time * 1e6:>10.1f} "
+            f"{statistics.mean(greedy_gaps):>11.3f} {statistics.mean(exact_gaps):>10.3f} "
+            f"{worse / TRIALS:>12.1%}"
+        )
+
+    # 同点の分け方が複数ある場合に偏りなく選ばれているかを確認する
+    weights = [1] * 12
+    counts: dict = {}
+    for _ in range(20000):
+        team_one, _ = best_split(weights, rng)
+        key = 0 in team_one
+        counts[key] = counts.get(key, 0) + 1
+    print(f"tie candidates for 12 equal players: {len(optimal_splits(weights))}, "
+          f"player 0 in team 1: {counts.get(True, 0) / 20000:.1%}")
+
+    print()
+    print(f"{'pool':>4} {'teams':>5} {'lobbies':>7} {'ms':>8} {'worst gap':>9}")
+    for size in POOL_SIZES:
+        for team_count in (2, 3, 4):
+            weights = [rng.choice(ROLE_WEIGHTS) for _ in range(size)]
+            lobby_sizes = plan_lobbies(size, team_count, 12)
+            started = time.perf_counter()
+            lobbies = pool_partition(weights, lobby_sizes, team_count, time_budget=POOL_TIME_BUDGET, seed=0)
+            elapsed = time.perf_counter() - started
+            worst = max(partition_spread(weights, lobby) for lobby in lobbies)
+            print(f"{size:>4} {team_count:>5} {len(lobbies):>7} {elapsed * 1e3:>8.1f} {worst:>9}")
+
+
+if __name__ == "__main__":
+    main()
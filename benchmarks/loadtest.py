@@ -0,0 +1,221 @@
+"""BoManager の負荷試験。
+
+Discord に接続せず、テストと共通のハーネス（``tests.harness``）が模した偽物の層の上で
+実際の Cog にイベントを流す。偽物の REST 呼び出しには遅延と、ルートごと・全体のレート制限が入る。
+
+シナリオ:
+
+- ``join_storm``: 1 つの募集に 12 人が同時に 👋 を押す（10 回繰り返す）
+- ``lobbies``: 200 件の募集を同時に作成し、それぞれに 8 人が参加する
+- ``teams``: 12 人の募集で ⚔️ を繰り返し押す
+- ``close_game``: 16 人の募集 20 件を同時に ``close_game`` で終了し、参加者全員にメンションする
+
+シナリオごとに、1 秒あたりのイベント数・イベントあたりの REST 呼び出し数・イベントの遅延（p50 / p99）を出力する。
+遅延は、Embed が変わるイベントでは「イベントの発生からその変更を含む Embed の編集が完了するまで」、
+それ以外のイベントでは「ハンドラが戻るまで」の時間。1 秒あたりのイベント数は最後のハンドラが戻るまでの時間で求めるので、
+イベントを時間をかけて発生させるシナリオ（``lobbies`` の参加・``teams``）では発生の間隔で頭打ちになる。
+
+    python -m benchmarks.loadtest
+    python -m benchmarks.loadtest --scenario join_storm --latency 150 --no-rate-limits
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import logging
+import os
+import random
+import time
+from dataclasses import dataclass
+from typing import Awaitable, Callable, Dict, List, Sequence
+
+os.environ.setdefault("DISCORD_BOT_TOKEN", "benchmark")
+
+from tests.harness import FakeBot, FakeRest  # noqa: E402
+
+SCENARIOS = ("join_storm", "lobbies", "teams", "close_game")
+
+
+@dataclass
+class ScenarioResult:
+    name: str
+    events: int
+    elapsed: float
+    drain: float
+    rest_calls: Dict[str, int]
+    rate_limited: int
+    rate_limit_wait: float
+    latencies: List[float]
+    missing_edits: int
+
+
+class LoadTest(FakeBot):
+    """``FakeBot`` にシナリオの計測を加えたもの。"""
+
+    async def measure(self, name: str, events: Callable[[], Sequence[Awaitable[None]]]) -> ScenarioResult:
+        """準備で発生した呼び出しを片付けてから ``events`` を同時に流し、結果を集計する。"""
+        await self.drain()
+        self.rest.reset()
+        self.samples = []
+        started = time.perf_counter()
+        await asyncio.gather(*events())
+        elapsed = time.perf_counter() - started
+        await self.drain()
+        # 最後の 2 回の確認の間隔は処理の時間に含めない
+        drain = time.perf_counter() - started - elapsed
+
+        latencies: List[float] = []
+        missing = 0
+        for sample in self.samples:
+            if not sample.expects_edit:
+                latencies.append(sample.handled - sample.dispatched)
+                continue
+            done = [
+                done_at for built_at, done_at in self.rest.edits.get(sample.message_id, ()) if built_at >= sample.handled
+            ]
+            if not done:
+                missing += 1
+                continue
+            latencies.append(min(done) - sample.dispatched)
+        return ScenarioResult(
+            name=name,
+            events=len(self.samples),
+            elapsed=elapsed,
+            drain=drain,
+            rest_calls=dict(self.rest.calls),
+            rate_limited=self.rest.rate_limited,
+            rate_limit_wait=self.rest.rate_limit_wait,
+            latencies=latencies,
+            missing_edits=missing,
+        )
+
+
+async def join_storm(test: LoadTest) -> ScenarioResult:
+    lobbies = [await test.create_lobby(test.new_channel()) for _ in range(10)]
+    results = []
+    for message_id in lobbies:
+        players = [test.next_user() for _ in range(12)]
+        results.append(
+            await test.measure("join_storm", lambda: [test.react(message_id, user_id, "👋") for user_id in players])
+        )
+    return _merge(results)
+
+
+async def lobbies(test: LoadTest) -> ScenarioResult:
+    channels = [test.new_channel() for _ in range(20)]
+
+    async def lobby(index: int) -> None:
+        # 作成した募集に 2 秒かけてばらばらに参加する
+        message_id = await test.create_lobby(channels[index % len(channels)], sample=True)
+        await asyncio.gather(
+            *(test.react(message_id, test.next_user(), "👋", delay=test.rng.uniform(0, 2.0)) for _ in range(8))
+        )
+
+    return await test.measure("lobbies", lambda: [lobby(index) for index in range(200)])
+
+
+async def teams(test: LoadTest) -> ScenarioResult:
+    message_id = await test.create_lobby(test.new_channel())
+    players = [test.next_user() for _ in range(11)]
+    await asyncio.gather(*(test.react(message_id, user_id, "👋") for user_id in players))
+    return await test.measure(
+        "teams",
+        lambda: [test.react(message_id, test.rng.choice(players), "⚔️", delay=test.rng.uniform(0, 3.0)) for _ in range(60)],
+    )
+
+
+async def close_game(test: LoadTest) -> ScenarioResult:
+    message_ids = []
+    for _ in range(20):
+        message_id = await test.create_lobby(test.new_channel())
+        await asyncio.gather(*(test.react(message_id, test.next_user(), "👋") for _ in range(15)))
+        message_ids.append(message_id)
+    return await test.measure("close_game", lambda: [test.close_game(message_id) for message_id in message_ids])
+
+
+SCENARIO_RUNNERS: Dict[str, Callable[[LoadTest], Awaitable[ScenarioResult]]] = {
+    "join_storm": join_storm,
+    "lobbies": lobbies,
+    "teams": teams,
+    "close_game": close_game,
+}
+
+
+def _merge(results: Sequence[ScenarioResult]) -> ScenarioResult:
+    """同じシナリオを繰り返した結果を 1 つにまとめる。"""
+    calls: Dict[str, int] = {}
+    for result in results:
+        for kind, count in result.rest_calls.items():
+            calls[kind] = calls.get(kind, 0) + count
+    return ScenarioResult(
+        name=results[0].name,
+        events=sum(result.events for result in results),
+        elapsed=sum(result.elapsed for result in results),
+        drain=sum(result.drain for result in results),
+        rest_calls=calls,
+        rate_limited=sum(result.rate_limited for result in results),
+        rate_limit_wait=sum(result.rate_limit_wait for result in results),
+        latencies=[latency for result in results for latency in result.latencies],
+        missing_edits=sum(result.missing_edits for result in results),
+    )
+
+
+def _percentile(values: Sequence[float], fraction: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(int(len(ordered) * fraction), len(ordered) - 1)]
+
+
+def report(result: ScenarioResult) -> None:
+    total = sum(result.rest_calls.values())
+    events = max(result.events, 1)
+    breakdown = " ".join(f"{kind}={count / events:.2f}" for kind, count in sorted(result.rest_calls.items()))
+    print(
+        f"{result.name:>10}: {result.events:>5} events {result.events / result.elapsed:>9,.1f} events/s"
+        f"  drain {result.drain:5.2f}s  REST/event {total / events:5.2f}"
+        f"  p50 {_percentile(result.latencies, 0.5) * 1000:7.1f}ms  p99 {_percentile(result.latencies, 0.99) * 1000:7.1f}ms"
+    )
+    print(f"{'':>12}REST by route: {breakdown}")
+    print(f"{'':>12}rate limited: {result.rate_limited} waits, {result.rate_limit_wait:.2f}s")
+    if result.missing_edits:
+        print(f"{'':>12}WARNING: {result.missing_edits} events never reached an embed edit")
+
+
+async def run(args: argparse.Namespace) -> None:
+    print(
+        f"REST latency {args.latency:.0f}±{args.jitter:.0f}ms, "
+        f"rate limits {'off' if args.no_rate_limits else 'on'}"
+    )
+    for name in args.scenario or SCENARIOS:
+        rng = random.Random(args.seed)
+        rest = FakeRest(
+            latency=args.latency / 1000,
+            jitter=args.jitter / 1000,
+            rate_limits=not args.no_rate_limits,
+            rng=rng,
+        )
+        # シナリオごとに Cog を作り直し、前のシナリオのキャッシュや送信キューを持ち越さない
+        test = LoadTest(rest, rng)
+        await test.start()
+        try:
+            report(await SCENARIO_RUNNERS[name](test))
+        finally:
+            await test.close()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--scenario", action="append", choices=SCENARIOS, help="実行するシナリオ（複数指定可、既定はすべて）")
+    parser.add_argument("--latency", type=float, default=80.0, help="REST 呼び出しの遅延（ミリ秒）")
+    parser.add_argument("--jitter", type=float, default=20.0, help="遅延のばらつき（ミリ秒）")
+    parser.add_argument("--no-rate-limits", action="store_true", help="レート制限を無効にする")
+    parser.add_argument("--seed", type=int, default=0)
+    # 遅いトレースや統計のログで結果が読みにくくならないよう、警告以上だけを出す
+    logging.getLogger("bot").setLevel(logging.WARNING)
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+"""管理者向けの診断コマンド。"""
+
+from __future__ import annotations
+
+import asyncio
+import cProfile
+import io
+import logging
+import pstats
+from typing import Optional
+
+import discord
+from discord import app_commands
+from discord.ext import commands
+
+from ..tracing import tracer
+
+logger = logging.getLogger(__name__)
+
+# Discord のメッセージに収まるよう、コードブロックの中身はこの文字数で切り詰める
+MESSAGE_LIMIT = 1900
+PROFILE_TOP = 25
+
+
+class Admin(commands.Cog):
+    """プロファイラとトレースの確認コマンド（Bot のオーナーのみ）。"""
+
+    def __init__(self, bot: commands.Bot) -> None:
+        self.bot = bot
+        # cProfile は同時に 1 つしか有効にできない
+        self._profiling = asyncio.Lock()
+
+    @app_commands.command(name="profile", description="指定した秒数だけ Bot をプロファイルし、時間のかかった関数を表示します。")
+    @app_commands.describe(seconds="計測する秒数", sort="並べ替えの基準")
+    @app_commands.choices(
+        sort=[
+            app_commands.Choice(name="関数内の時間 (tottime)", value="tottime"),
+            app_commands.Choice(name="呼び出し先を含む時間 (cumulative)", value="cumulative"),
+        ]
+    )
+    @app_commands.default_permissions(administrator=True)
+    @app_commands.guild_only()
+    async def profile(
+        self,
+        interaction: discord.Interaction,
+        seconds: app_commands.Range[int, 1, 60] = 10,
+        sort: Optional[app_commands.Choice[str]] = None,
+    ) -> None:
+        if not await self._check_owner(interaction):
+            return
+        if self._profiling.locked():
+            await interaction.response.send_message("ほかのプロファイルを実行中です。", ephemeral=True)
+            return
+
+        await interaction.response.defer(ephemeral=True, thinking=True)
+        async with self._profiling:
+            profiler = cProfile.Profile()
+            # イベントループのスレッドで動くすべての処理（ハンドラ・描画・送信）が計測対象になる
+            profiler.enable()
+            try:
+                await asyncio.sleep(seconds)
+            finally:
+                profiler.disable()
+
+        output = io.StringIO()
+        stats = pstats.Stats(profiler, stream=output)
+        stats.strip_dirs().sort_stats(sort.value if sort is not None else "tottime").print_stats(PROFILE_TOP)
+        report = _trim_report(output.getvalue())
+        logger.info("%d 秒間のプロファイル結果:\n%s", seconds, report)
+        await interaction.followup.send(f"```\n{report[:MESSAGE_LIMIT]}\n```", ephemeral=True)
+
+    @app_commands.command(name="traces", description="直近で時間のかかった処理の内訳を表示します。")
+    @app_commands.describe(count="表示する件数")
+    @app_commands.default_permissions(administrator=True)
+    @app_commands.guild_only()
+    async def traces(
+        self,
+        interaction: discord.Interaction,
+        count: app_commands.Range[int, 1, 10] = 3,
+    ) -> None:
+        if not await self._check_owner(interaction):
+            return
+        if not tracer.enabled:
+            await interaction.response.send_message(
+                "トレースは無効です（DISCORD_TRACE_SLOW_MS が 0）。",
+                ephemeral=True,
+            )
+            return
+        slowest = tracer.slowest(count)
+        if not slowest:
+            await interaction.response.send_message("記録されたトレースがありません。", ephemeral=True)
+            return
+        report = "\n\n".join(trace.format() for trace in slowest)
+        await interaction.response.send_message(f"```\n{report[:MESSAGE_LIMIT]}\n```", ephemeral=True)
+
+    async def _check_owner(self, interaction: discord.Interaction) -> bool:
+        # プロファイルやトレースにはほかのギルドの処理も含まれるので、サーバー管理者ではなく Bot のオーナーに限る
+        if await self.bot.is_owner(interaction.user):
+            return True
+        await interaction.response.send_message("このコマンドは Bot のオーナーのみ実行できます。", ephemeral=True)
+        return False
+
+
+def _trim_report(report: str) -> str:
+    """pstats の出力から見出しの前置きを除き、関数ごとの表だけを残す。"""
+    lines = report.strip().splitlines()
+    for index, line in enumerate(lines):
+        if line.lstrip().startswith("ncalls"):
+            return "\n".join(lines[index:])
+    return "\n".join(lines)
+
+
+async def setup(bot: commands.Bot) -> None:
+    await bot.add_cog(Admin(bot))
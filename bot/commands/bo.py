@@ -2,10 +2,17 @@
 
 from __future__ import annotations
 
-import random
+import asyncio
+import contextlib
+import functools
+import logging
+import multiprocessing
 import re
-from dataclasses import dataclass, field
-from typing import Dict, List, Optional, Sequence, Tuple
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, FrozenSet, Iterable, List, Mapping, Optional, Sequence, Set, Tuple
 
 try:
     import discord
@@ -17,6 +24,32 @@ except ModuleNotFoundError as exc:
         "`pip install -r requirements.txt` を実行してください。"
     ) from exc
 
+from ..config import settings
+from ..deadline_scheduler import DeadlineScheduler
+from ..member_cache import CachedMember, MemberCache
+from ..member_index import MemberIndex
+from ..metrics import MetricFamily, registry, timed
+from ..tracing import traced
+from ..outbound import OutboundScheduler, Priority, http_rate_limits
+from ..recruitment import (
+    ArchivedRecruitment,
+    ParticipantEntry,
+    RecruitmentArchive,
+    RecruitmentIndex,
+    Roster,
+    TrackedMessage,
+    estimate_size,
+)
+from ..reaction_pipeline import RateLimited, ReactionCleanup, ReactionJob, ReactionPipeline
+from ..render_scheduler import RenderScheduler
+from ..sharding import ShardScope
+from ..shared_state import InProcessRecruitmentState, RecruitmentState, RedisRecruitmentState, RespClient
+from ..store import RecruitmentStore, SqliteRecruitmentStore, WriteBehindWriter
+from ..team_scoring import ObjectiveWeights, TeammateHistory, TeamScorer
+from ..teams import partition, plan_lobbies, pool_partition
+
+logger = logging.getLogger(__name__)
+
 
 ROLE_MAPPING = {
     "エンジョイ卓": 1280187004092547112,
@@ -24,6 +57,21 @@ ROLE_MAPPING = {
 }
 
 
+# チーム分けの重みを決めるロール（複数持っている場合は大きい方を使う）
+WEIGHT_ROLE_MAPPING = {
+    1280186048395218995: 4,
+    1280186025762750583: 3,
+    1280185996184522927: 2,
+}
+WEIGHT_ROLE_IDS = frozenset(WEIGHT_ROLE_MAPPING)
+DEFAULT_WEIGHT = 1
+
+
+def role_weight(role_ids: FrozenSet[int]) -> int:
+    """ロールIDの集合からチーム分けの重みを求める。"""
+    return max(map(WEIGHT_ROLE_MAPPING.__getitem__, role_ids & WEIGHT_ROLE_IDS), default=DEFAULT_WEIGHT)
+
+
 def resolve_role_mention(channel_name: str) -> Optional[str]:
     """チャンネル名に応じてメンション対象ロールを決定する。"""
     for keyword, role_id in ROLE_MAPPING.items():
@@ -43,51 +91,343 @@ def parse_user_mention(mention: str) -> Optional[int]:
     return None
 
 
-# ここから下は既存コードの続き
-@dataclass
-class ParticipantEntry:
-    key: str
-    user_id: Optional[int]
-    label: str
-    is_dummy: bool = False
-
-
 @dataclass
 class WeightedEntry:
     entry: ParticipantEntry
     weight: int
 
 
-@dataclass
-class TrackedMessage:
-    guild_id: int
-    channel_id: int
-    join_emoji: str
-    check_emoji: Optional[str]
-    dummy_emoji: Optional[str]
-    notify_emoji: Optional[str]
-    recruit_emoji: Optional[str]
-    participants: List[ParticipantEntry] = field(default_factory=list)
-    team_one: List[str] = field(default_factory=list)
-    team_two: List[str] = field(default_factory=list)
-    dummy_count: int = 0
-    teams_visible: bool = False
-    is_disbanded: bool = False
+@dataclass(frozen=True)
+class ReactionRoute:
+    """募集の 1 つの絵文字に対する処理（外されたときの処理は 👋 のみ）。"""
+
+    on_add: Callable[[discord.RawReactionActionEvent], Awaitable[None]]
+    on_remove: Optional[Callable[[discord.RawReactionActionEvent], Awaitable[None]]] = None
+
+
+MAIN_CAPACITY = 12
+MAX_TEAM_COUNT = 4
+DISBANDED_PREFIX = "【解散】"
+PARTICIPANTS_FIELD = "参加者"
+RESERVE_FIELD = "補欠"
+# /bo pool で参加者をまとめる範囲
+POOL_SCOPE_CHANNEL = "channel"
+POOL_SCOPE_GUILD = "guild"
+
+JOIN_EMOJIS = ("👋", "+1")
+CHECK_EMOJI = "⚔️"
+DUMMY_EMOJI = "➕"
+NOTIFY_EMOJI = "📢"
+RECRUIT_EMOJI = "♻️"
+MAP_VOTE_REACTIONS = (("🇵",), ("🇺",), ("7️⃣",), ("🇱",))
+# 募集メッセージに付けるリアクション（各要素は候補の組で、先頭から順に試す）
+RECRUITMENT_REACTIONS = (
+    JOIN_EMOJIS,
+    (CHECK_EMOJI,),
+    *MAP_VOTE_REACTIONS,
+    (NOTIFY_EMOJI,),
+    (RECRUIT_EMOJI,),
+)
+BOT_REACTIONS = frozenset(emoji for candidates in RECRUITMENT_REACTIONS for emoji in candidates)
+# 操作用のリアクション（マップ投票以外）
+CONTROL_EMOJIS = frozenset((*JOIN_EMOJIS, CHECK_EMOJI, DUMMY_EMOJI, NOTIFY_EMOJI, RECRUIT_EMOJI))
+# 同じ絵文字の削除がこの件数以上たまったら、1 件ずつではなく絵文字ごとまとめて削除する
+REACTION_CLEAR_THRESHOLD = 3
+# ボタン操作の募集のボタン（custom_id の接尾辞 → ラベル・絵文字・スタイル）
+BUTTON_ACTIONS = {
+    "join": ("参加", JOIN_EMOJIS[0], discord.ButtonStyle.success),
+    "leave": ("離脱", None, discord.ButtonStyle.secondary),
+    "split": ("チーム分け", CHECK_EMOJI, discord.ButtonStyle.primary),
+    "dummy": ("ダミー", DUMMY_EMOJI, discord.ButtonStyle.secondary),
+    "notify": ("参加者通知", NOTIFY_EMOJI, discord.ButtonStyle.secondary),
+    "recruit": ("募集通知", RECRUIT_EMOJI, discord.ButtonStyle.secondary),
+}
+
+# チーム分けの計算中に参加者が変わった場合にやり直す回数
+TEAM_ASSIGN_ATTEMPTS = 3
+# この人数以下の分割は全探索でも 1 ミリ秒ほどで終わるので、別プロセスに送らずその場で計算する
+PARTITION_INLINE_LIMIT = 9
+# 共有の保存先で、同じイベントを受け取ったワーカーのうち 1 つだけが処理するための確保期間（秒）。
+# 同じゲートウェイイベントが各ワーカーに届くまでの差を覆えればよい。押されたリアクションは
+# 0.5 秒ほどで削除されるので、同じ利用者の押し直しを取りこぼさないようそれより短くする
+EVENT_CLAIM_TTL = 0.3
+# 共有の保存先に存在しないと分かったメッセージIDを覚えておく件数
+UNKNOWN_MESSAGE_CACHE_SIZE = 4096
+
+HANDLER_SECONDS = registry.histogram(
+    "civ6matcher_handler_seconds",
+    "BoManager の各処理にかかった時間（秒）",
+    ["handler"],
+)
+CHANGE_TO_EDIT_SECONDS = registry.histogram(
+    "civ6matcher_change_to_edit_seconds",
+    "募集の状態が変わってから Embed の編集が完了するまでの時間（秒）",
+    ["path"],
+)
+
+
+def team_field_name(team: int) -> str:
+    return f"チーム{team + 1}"
+
+
+def instrumented(name: str, *, root: bool = False) -> Callable[[Callable[..., Awaitable[Any]]], Callable[..., Awaitable[Any]]]:
+    """処理時間をメトリクスに記録し、トレースのスパンとして計測する。
+
+    ``root`` が真なら、呼び出し元のトレースから切り離して新しいトレースを始める
+    （複数のイベントをまとめて行う再描画など）。
+    """
+
+    def decorator(func: Callable[..., Awaitable[Any]]) -> Callable[..., Awaitable[Any]]:
+        return timed(HANDLER_SECONDS, handler=name)(traced(name, root=root)(func))
+
+    return decorator
+
+
+class RecruitmentButton(
+    discord.ui.DynamicItem[discord.ui.Button],
+    template=r"bo:(?P<action>join|leave|split|dummy|notify|recruit)",
+):
+    """ボタン操作の募集のボタン。
+
+    custom_id は操作の種類だけで決まり、どの募集かは押されたメッセージのIDで判別する。
+    メッセージごとにビューを保持しないので、再起動後もそのまま押せる。
+    """
+
+    def __init__(self, action: str) -> None:
+        label, emoji, style = BUTTON_ACTIONS[action]
+        super().__init__(discord.ui.Button(label=label, emoji=emoji, style=style, custom_id=f"bo:{action}"))
+        self.action = action
+
+    @classmethod
+    async def from_custom_id(
+        cls,
+        interaction: discord.Interaction,
+        item: discord.ui.Button,
+        match: "re.Match[str]",
+    ) -> "RecruitmentButton":
+        return cls(match["action"])
+
+    async def callback(self, interaction: discord.Interaction) -> None:
+        manager = interaction.client.get_cog(BoManager.__cog_name__)
+        if isinstance(manager, BoManager):
+            await manager.handle_button(self.action, interaction)
+
+
+def recruitment_view() -> discord.ui.View:
+    view = discord.ui.View(timeout=None)
+    for action in BUTTON_ACTIONS:
+        view.add_item(RecruitmentButton(action))
+    return view
+
+
+def needed_players_range(participant_count: int) -> Optional[str]:
+    """募集通知に載せる「あと何人」の範囲（例: ``@1-3``）。12 名以上なら None。"""
+    if participant_count <= 8:
+        return f"@{8 - participant_count}-{12 - participant_count}"
+    if participant_count in (9, 10):
+        return f"@{10 - participant_count}-{12 - participant_count}"
+    if participant_count == 11:
+        return "@1"
+    return None
+
+
+def render_recruitment_embed(
+    message_id: Optional[int],
+    data: TrackedMessage,
+    mentions: Mapping[int, str],
+) -> discord.Embed:
+    """募集の状態から Embed を組み立てる。
+
+    ``mentions`` はユーザーID→表示用メンションの対応で、足りない分は ``<@ID>`` で補う。
+    フィールドは「参加者」「補欠」「チーム1」「チーム2」…の順に並ぶ。
+    """
+    title = data.title
+    if data.is_disbanded and not title.startswith(DISBANDED_PREFIX):
+        title = f"{DISBANDED_PREFIX}{title}"
+    embed = discord.Embed(title=title, color=discord.Color(data.color))
+
+    # タイトル直下にメッセージIDを常時表示
+    if message_id is not None:
+        embed.description = f"`ID: {message_id}`"
+
+    main_entries = data.participants.main(MAIN_CAPACITY)
+    reserve_entries = data.participants.reserve(MAIN_CAPACITY)
+
+    participant_lines = _format_entries(main_entries, mentions, start_index=1)
+    embed.add_field(
+        name=PARTICIPANTS_FIELD,
+        value="\n".join(participant_lines) if participant_lines else "なし",
+        inline=False,
+    )
+
+    reserve_lines = _format_entries(reserve_entries, mentions, start_index=len(main_entries) + 1)
+    if reserve_lines:
+        embed.add_field(name=RESERVE_FIELD, value="\n".join(reserve_lines), inline=False)
+
+    if data.teams_visible:
+        # チーム情報は先頭12名のみ対象
+        teams = data.participants.teams
+        for team in range(data.team_count):
+            team_entries = [entry for entry in main_entries if teams.get(entry.key) == team]
+            team_names = _format_entries(team_entries, mentions)
+            embed.add_field(
+                name=team_field_name(team),
+                value=", ".join(team_names) if team_names else "未割り当て",
+                inline=False,
+            )
+
+    return embed
+
+
+def _format_entries(
+    entries: Sequence[ParticipantEntry],
+    mentions: Mapping[int, str],
+    *,
+    start_index: Optional[int] = None,
+) -> List[str]:
+    formatted: List[str] = []
+    for index, entry in enumerate(entries):
+        if entry.is_dummy or entry.user_id is None:
+            display = entry.label
+        else:
+            display = mentions.get(entry.user_id, f"<@{entry.user_id}>")
+
+        if start_index is not None:
+            formatted.append(f"{start_index + index}. {display}")
+        else:
+            formatted.append(display)
+    return formatted
 
 
 class BoManager(commands.Cog):
     """募集 Embed の管理を行う Cog。"""
 
-    def __init__(self, bot: commands.Bot) -> None:
+    def __init__(
+        self,
+        bot: commands.Bot,
+        store: Optional[RecruitmentStore] = None,
+        state: Optional[RecruitmentState] = None,
+    ) -> None:
         self.bot = bot
+        # このプロセスが受け持つシャード。保存先を他のプロセスと共有しても自分のギルドの募集だけを扱う
+        self.shards = ShardScope(
+            settings.shard_count,
+            frozenset(settings.shard_ids) if settings.shard_ids is not None else None,
+        )
         self.tracked_messages: Dict[int, TrackedMessage] = {}
+        # 参加・離脱・チーム分けの書き込み先。共有の保存先なら複数のワーカーで同じ募集を扱える
+        self.state: RecruitmentState = state or InProcessRecruitmentState(self.tracked_messages)
+        # 振り分けの度にプロパティを引かないよう、共有の保存先かを覚えておく
+        self._shared_state = self.state.is_shared
+        # 共有の保存先にもなかったメッセージID（無関係なメッセージへのリアクションで毎回問い合わせないため）
+        self._unknown_messages: "OrderedDict[int, None]" = OrderedDict()
+        self.recruitment_index = RecruitmentIndex()
+        # (メッセージID, 絵文字名, カスタム絵文字ID) → 処理。リアクションイベントの振り分けに使う
+        self._reaction_routes: Dict[Tuple[int, Optional[str], Optional[int]], ReactionRoute] = {}
+        self._routed_keys: Dict[int, List[Tuple[int, str, None]]] = {}
+        self.archive = RecruitmentArchive(settings.archive_size)
+        self._retention_task: Optional[asyncio.Task[None]] = None
+        self._warm_task: Optional[asyncio.Task[None]] = None
+        self.auto_close = DeadlineScheduler(self._auto_close)
+        self.team_scorer = TeamScorer(
+            ObjectiveWeights(
+                balance=settings.team_balance_weight,
+                repeat=settings.team_repeat_weight,
+                spread=settings.team_spread_weight,
+            )
+        )
+        self.teammate_history = TeammateHistory(settings.team_history_games)
+        self._partition_pool: Optional[ProcessPoolExecutor] = None
+        self.state_writer: Optional[WriteBehindWriter] = None
+        if store is not None:
+            self.state_writer = WriteBehindWriter(
+                store,
+                self.tracked_messages.get,
+                interval=settings.state_flush_interval,
+            )
+        self.member_cache = MemberCache(
+            ttl=settings.member_cache_ttl,
+            max_size=settings.member_cache_size,
+        )
+        self.member_index = MemberIndex(WEIGHT_ROLE_IDS)
+        # (ギルドID, ユーザーID) → 重み。ロールが変わったときだけ破棄する
+        self._weights: "OrderedDict[Tuple[int, int], int]" = OrderedDict()
+        self.weight_hits = 0
+        self.weight_misses = 0
+        # 再描画待ちの募集 → 最初に状態が変わった時刻（変更から編集完了までの時間の計測に使う）
+        self._dirty_since: Dict[int, float] = {}
+        self._fetch_semaphore = asyncio.Semaphore(max(settings.member_fetch_concurrency, 1))
+        self.render_scheduler = RenderScheduler(self._update_embed, delay=settings.render_delay)
+        self.reaction_pipeline = ReactionPipeline()
+        # 利用者のリアクションの削除は Embed の再描画の後にまとめて行う
+        self.reaction_cleanup = ReactionCleanup(self._clean_reactions, delay=settings.render_delay)
+        self.outbound = OutboundScheduler(
+            concurrency=settings.outbound_concurrency,
+            max_retry_wait=settings.outbound_max_retry_wait,
+        )
         self.command: Optional[app_commands.Command] = None
         self._register_command()
 
-    def cog_unload(self) -> None:
+    async def cog_load(self) -> None:
+        if self.state_writer is not None:
+            # 終了していない募集を一括で復元し、リアクションを再び受け付けられるようにする
+            restored = await self.state_writer.load_open(self.shards.owns)
+            now = time.time()
+            expired = 0
+            for message_id, data in sorted(restored.items(), key=lambda item: item[1].updated_at):
+                deadline = self._auto_close_deadline(data)
+                if deadline is not None and deadline <= now:
+                    # 停止中に期限を過ぎた募集は、解散の投稿やメンションをせずにアーカイブだけする
+                    record = ArchivedRecruitment.from_tracked(message_id, data, "expired")
+                    self.archive.add(record)
+                    self.state_writer.archive(record)
+                    expired += 1
+                    continue
+                self._track(message_id, data)
+            self.state_writer.start()
+            logger.info("募集 %d 件を復元しました（期限切れで %d 件をアーカイブ）。", len(restored) - expired, expired)
+        self._retention_task = asyncio.create_task(self._run_retention())
+        self.auto_close.start()
+        self._warm_task = asyncio.create_task(self._warm_partition_pool())
+        self.bot.add_dynamic_items(RecruitmentButton)
+        registry.register_collector("bo", self.collect_metrics)
+        # 拡張機能の再読み込み時は、接続済みのギルドの索引をその場で作る
+        for guild in self.bot.guilds:
+            if guild.chunked:
+                self.member_index.load(guild.id, guild.members)
+
+    async def cog_unload(self) -> None:
         if self.command is not None:
             self.bot.tree.remove_command(self.command.name, type=discord.AppCommandType.chat_input)
+        if self._retention_task is not None:
+            self._retention_task.cancel()
+        if self._warm_task is not None:
+            self._warm_task.cancel()
+        self.bot.remove_dynamic_items(RecruitmentButton)
+        registry.unregister_collector("bo")
+        self.auto_close.close()
+        self.render_scheduler.close()
+        self.reaction_pipeline.close()
+        self.reaction_cleanup.close()
+        logger.info("送信キュー統計: %s", self.outbound.stats())
+        self.outbound.close()
+        if self._partition_pool is not None:
+            self._partition_pool.shutdown(wait=False, cancel_futures=True)
+        if self.state_writer is not None:
+            await self.state_writer.close()
         self.tracked_messages.clear()
+        self.recruitment_index.clear()
+        self._reaction_routes.clear()
+        self._routed_keys.clear()
+        self.archive.clear()
+        logger.info("メンバーキャッシュ統計: %s", self.member_cache.stats())
+        logger.info("メンバー索引統計: %s", self.member_index.stats())
+        self.member_cache.clear()
+        self.member_index.clear()
+        self._weights.clear()
+        self._unknown_messages.clear()
+        self._dirty_since.clear()
+        await self.state.close()
 
     def _register_command(self) -> None:
         tree = self.bot.tree
@@ -100,29 +440,58 @@ class BoManager(commands.Cog):
             start="募集タイトル",
             remove_user="削除するユーザーのメンション（例: <@123456789>）",
             close_game="終了する募集のID",
+            teams="チーム数（既定: 2）",
+            pool="参加者をまとめて複数のロビーに分ける範囲",
+            buttons="リアクションの代わりにボタンで操作する",
+        )
+        @app_commands.choices(
+            pool=[
+                app_commands.Choice(name="このチャンネルの募集", value=POOL_SCOPE_CHANNEL),
+                app_commands.Choice(name="サーバー内のすべての募集", value=POOL_SCOPE_GUILD),
+            ]
         )
         async def bo_command(
             interaction: discord.Interaction,
             start: Optional[str] = None,
             remove_user: Optional[str] = None,
             close_game: Optional[str] = None,
+            teams: Optional[app_commands.Range[int, 2, MAX_TEAM_COUNT]] = None,
+            pool: Optional[app_commands.Choice[str]] = None,
+            buttons: Optional[bool] = None,
         ) -> None:
-            await self._handle_bo(interaction, start, remove_user, close_game)
+            await self._handle_bo(
+                interaction,
+                start,
+                remove_user,
+                close_game,
+                teams,
+                pool.value if pool is not None else None,
+                bool(buttons),
+            )
 
         self.command = bo_command
 
+    @instrumented("handle_bo")
     async def _handle_bo(
         self,
         interaction: discord.Interaction,
         start: Optional[str],
         remove_user: Optional[str] = None,
         close_game: Optional[str] = None,
+        teams: Optional[int] = None,
+        pool: Optional[str] = None,
+        buttons: bool = False,
     ) -> None:
         # ゲーム終了モード
         if close_game is not None:
             await self._handle_close_game(interaction, close_game)
             return
 
+        # プールモード
+        if pool is not None:
+            await self._handle_pool(interaction, pool, teams)
+            return
+
         # ユーザー削除モード
         if remove_user is not None:
             await self._handle_remove_user(interaction, remove_user)
@@ -134,106 +503,374 @@ class BoManager(commands.Cog):
 
         if role_mention is None:
             response = "未対応のチャンネルです"
-            await interaction.response.send_message(response, ephemeral=True)
+            await self._respond(interaction, response, ephemeral=True)
+            return
+
+        if interaction.guild_id is None:
             return
 
         body = start.strip() if start else "募集"
-        embed = discord.Embed(
+        participants = Roster()
+        mentions: Dict[int, str] = {}
+        if interaction.user:
+            # 実行ユーザーはインタラクションに含まれているのでそのままキャッシュに保存
+            host = CachedMember.from_member(interaction.user)
+            self.member_cache.put(interaction.guild_id, interaction.user.id, host)
+            mentions[interaction.user.id] = host.mention
+            participants.append(
+                ParticipantEntry(
+                    key=f"user:{interaction.user.id}",
+                    user_id=interaction.user.id,
+                    label="",
+                    is_dummy=False,
+                )
+            )
+
+        tracked = self._new_recruitment(
+            guild_id=interaction.guild_id,
+            channel_id=channel.id,
             title=body,
-            color=discord.Color.gold(),
+            participants=participants,
+            team_count=teams or 2,
+            uses_buttons=buttons,
         )
-        embed.add_field(name="参加者", value="なし", inline=False)
-
-        content = role_mention
 
-        await interaction.response.send_message(
-            content=content,
-            embed=embed,
+        # 実行ユーザーを含めた Embed を最初の送信で表示する
+        extra: Dict[str, Any] = {"view": recruitment_view()} if buttons else {}
+        callback = await self._respond(
+            interaction,
+            content=role_mention,
+            embed=render_recruitment_embed(None, tracked, mentions),
             allowed_mentions=discord.AllowedMentions(roles=True),
+            **extra,
         )
-        sent_message = await interaction.original_response()
-        if sent_message is None or interaction.guild_id is None:
-            return
+        message_id = getattr(callback, "message_id", None)
+        if message_id is None:
+            sent_message = await interaction.original_response()
+            if sent_message is None:
+                return
+            message_id = sent_message.id
 
-        plus_one = discord.PartialEmoji(name="👋")
-        try:
-            await sent_message.add_reaction(plus_one)
-        except discord.HTTPException:
-            plus_one = discord.PartialEmoji(name="+1")
-            try:
-                await sent_message.add_reaction(plus_one)
-            except discord.HTTPException:
-                plus_one = None
+        # リアクションの付与を待たずに追跡を始め、直後の👋も取りこぼさないようにする
+        self._track(message_id, tracked)
+        self._mark_persist(message_id)
+        await self.state.put(message_id, tracked)
+        # メッセージIDの表示は次の描画で追記する（直後の参加と同じ編集にまとめられる）
+        self.render_scheduler.mark_dirty(message_id)
+        self._bootstrap_reactions(message_id, tracked)
 
-        check = discord.PartialEmoji(name="⚔️")
-        try:
-            await sent_message.add_reaction(check)
-        except discord.HTTPException:
-            check = None
+    @staticmethod
+    def _new_recruitment(
+        *,
+        guild_id: int,
+        channel_id: int,
+        title: str,
+        participants: Roster,
+        team_count: int,
+        color: Optional[int] = None,
+        teams_visible: bool = False,
+        uses_buttons: bool = False,
+        dummy_count: int = 0,
+    ) -> TrackedMessage:
+        """既定のリアクション構成で募集を作成する（リアクションの付与結果は後から反映される）。"""
+        return TrackedMessage(
+            guild_id=guild_id,
+            channel_id=channel_id,
+            title=title,
+            color=color if color is not None else discord.Color.gold().value,
+            join_emoji=JOIN_EMOJIS[0],
+            check_emoji=CHECK_EMOJI,
+            dummy_emoji=DUMMY_EMOJI,
+            notify_emoji=NOTIFY_EMOJI,
+            recruit_emoji=RECRUIT_EMOJI,
+            participants=participants,
+            team_count=team_count,
+            teams_visible=teams_visible,
+            uses_buttons=uses_buttons,
+            dummy_count=dummy_count,
+        )
 
-        extra_reactions = [
-            discord.PartialEmoji(name="🇵"),
-            discord.PartialEmoji(name="🇺"),
-            discord.PartialEmoji(name="7️⃣"),
-            discord.PartialEmoji(name="🇱"),
-        ]
-        for reaction in extra_reactions:
+    def _bootstrap_reactions(self, message_id: int, data: TrackedMessage) -> None:
+        """募集メッセージへの操作用リアクションの付与をバックグラウンドのパイプラインに積む。"""
+        message = self._partial_message(data.channel_id, message_id, data.guild_id)
+
+        async def add(emoji: str) -> None:
             try:
-                await sent_message.add_reaction(reaction)
-            except discord.HTTPException:
-                continue
+                await self.outbound.submit(
+                    Priority.NORMAL,
+                    ("reaction", data.channel_id),
+                    functools.partial(message.add_reaction, emoji),
+                )
+            except discord.RateLimited as exc:
+                raise RateLimited(exc.retry_after) from exc
+            except discord.NotFound:
+                # メッセージが削除されていれば追跡をやめる
+                self._untrack(message_id)
+                raise
+            except discord.HTTPException as exc:
+                if exc.status == 429:
+                    raise RateLimited(0.0) from exc
+                raise
+
+        async def on_result(slot: int, emoji: Optional[str]) -> None:
+            if data.uses_buttons:
+                return
 
-        notify = discord.PartialEmoji(name="📢")
-        try:
-            await sent_message.add_reaction(notify)
-        except discord.HTTPException:
-            notify = None
+            # 👋 が付けられなければ代替の絵文字を、⚔️ が付けられなければチーム分けなしとして扱う
+            def mutate(current: TrackedMessage) -> bool:
+                if slot == 0 and emoji is not None and emoji != current.join_emoji:
+                    current.join_emoji = emoji
+                    return True
+                if slot == 1 and emoji is None and current.check_emoji is not None:
+                    current.check_emoji = None
+                    return True
+                return False
+
+            updated = await self.state.update(message_id, mutate)
+            if updated is None or not self._adopt(message_id, updated):
+                return
+            self._route_reactions(message_id, self.tracked_messages[message_id])
+            self._mark_persist(message_id)
+
+        self.reaction_pipeline.enqueue(
+            data.channel_id,
+            ReactionJob(
+                message_id=message_id,
+                # ボタン操作の募集にはマップ投票のリアクションだけを付ける
+                slots=MAP_VOTE_REACTIONS if data.uses_buttons else RECRUITMENT_REACTIONS,
+                add=add,
+                on_result=on_result,
+            ),
+        )
 
-        recruit = discord.PartialEmoji(name="♻️")
-        try:
-            await sent_message.add_reaction(recruit)
-        except discord.HTTPException:
-            recruit = None
-
-        participants: List[ParticipantEntry] = []
-        if interaction.user and interaction.guild_id:
-            # 実行ユーザーを事前に fetch してキャッシュに保存
-            guild = self.bot.get_guild(interaction.guild_id)
-            if guild is not None:
-                try:
-                    await guild.fetch_member(interaction.user.id)
-                except discord.HTTPException:
-                    try:
-                        await self.bot.fetch_user(interaction.user.id)
-                    except discord.HTTPException:
-                        pass
-            
-            participants.append(
-                ParticipantEntry(
-                    key=f"user:{interaction.user.id}",
-                    user_id=interaction.user.id,
-                    label="",
-                    is_dummy=False,
+    @instrumented("handle_pool")
+    async def _handle_pool(
+        self,
+        interaction: discord.Interaction,
+        scope: str,
+        teams: Optional[int],
+    ) -> None:
+        """募集の参加者をまとめて複数のロビーに分け、ロビーごとにチームを分ける。
+
+        チャンネル内の最新の募集を 1 つ目のロビーとして使い、2 つ目以降のロビーは新しい募集として投稿する。
+        ``scope`` が ``guild`` の場合はサーバー内で開催中のすべての募集の参加者を対象にする。
+        """
+        channel = interaction.channel
+        guild_id = interaction.guild_id
+        if channel is None or guild_id is None:
+            await self._respond(
+                interaction,
+                "チャンネル情報を取得できませんでした。",
+                ephemeral=True,
+            )
+            return
+
+        anchor_id = self.recruitment_index.latest_in_channel(channel.id)
+        anchor = self.tracked_messages.get(anchor_id) if anchor_id is not None else None
+        if anchor_id is None or anchor is None:
+            await self._respond(
+                interaction,
+                "このチャンネルに募集メッセージが見つかりませんでした。",
+                ephemeral=True,
+            )
+            return
+
+        source_ids = {anchor_id}
+        if scope == POOL_SCOPE_GUILD:
+            source_ids.update(self.recruitment_index.in_guild(guild_id))
+        team_count = teams or anchor.team_count
+
+        # 重みの取得と分割には時間がかかることがあるので先に応答を保留する
+        await self.outbound.send_now(
+            ("interaction", interaction.id),
+            functools.partial(interaction.response.defer, ephemeral=True, thinking=True),
+        )
+
+        extra_lobbies: List[List[ParticipantEntry]] = []
+        extra_teams: List[List[List[str]]] = []
+        async with contextlib.AsyncExitStack() as stack:
+            # 複数の募集のロックはメッセージID順に取得し、プール同士のデッドロックを防ぐ
+            sources: List[Tuple[int, TrackedMessage]] = []
+            for message_id in sorted(source_ids):
+                data = self.tracked_messages.get(message_id)
+                if data is None:
+                    continue
+                await stack.enter_async_context(data.lock)
+                if not data.is_disbanded:
+                    sources.append((message_id, data))
+            if anchor.is_disbanded or self.tracked_messages.get(anchor_id) is not anchor:
+                await self._followup(interaction, "この募集は既に終了しています。", ephemeral=True)
+                return
+
+            # 1 つ目のロビーの募集の参加者を先頭に、参加順のままプールにまとめる
+            # ダミーのキーは募集ごとの連番なので、ほかの募集のダミーは元の募集に残す
+            ordered = [(anchor_id, anchor)] + [item for item in sources if item[0] != anchor_id]
+            pool: Dict[str, ParticipantEntry] = {}
+            for message_id, data in ordered:
+                for entry in data.participants:
+                    if entry.is_dummy and message_id != anchor_id:
+                        continue
+                    pool.setdefault(entry.key, entry)
+            entries = list(pool.values())
+
+            lobby_sizes = plan_lobbies(len(entries), team_count, MAIN_CAPACITY)
+            if not lobby_sizes:
+                await self._followup(
+                    interaction,
+                    f"参加者が足りません（{team_count}名以上必要です）。",
+                    ephemeral=True,
                 )
+                return
+
+            weighted_entries = await self._with_weights(entries, guild_id)
+            lobbies = await self._pool_partition(
+                [item.weight for item in weighted_entries],
+                lobby_sizes,
+                team_count,
             )
 
-        tracked = TrackedMessage(
-            guild_id=interaction.guild_id,
-            channel_id=sent_message.channel.id,
-            join_emoji=plus_one.name if plus_one else "👋",
-            check_emoji=check.name if check else None,
-            dummy_emoji="➕",
-            notify_emoji=notify.name if notify else "📢",
-            recruit_emoji=recruit.name if recruit else "♻️",
+            placed = {entries[index].key for lobby in lobbies for team in lobby for index in team}
+            for message_id, data in sources:
+                if message_id == anchor_id:
+                    continue
+                moved = [entry.key for entry in data.participants if entry.key in placed]
+                for key in moved:
+                    data.participants.remove(key)
+                if moved:
+                    self._mark_dirty(message_id)
+
+            lobby_entries = [
+                [entries[index] for index in sorted(index for team in lobby for index in team)]
+                for lobby in lobbies
+            ]
+            lobby_teams = [
+                [[entries[index].key for index in team] for team in lobby]
+                for lobby in lobbies
+            ]
+
+            # ロビーに入れなかった 1 つ目の募集の参加者は補欠として残す
+            leftovers = [entry for entry in anchor.participants if entry.key not in placed]
+            anchor.participants = Roster(lobby_entries[0] + leftovers)
+            anchor.participants.assign_teams(lobby_teams[0])
+            anchor.team_count = team_count
+            anchor.teams_visible = True
+            self._mark_dirty(anchor_id)
+
+            extra_lobbies = lobby_entries[1:]
+            extra_teams = lobby_teams[1:]
+
+        if self.state.is_shared:
+            # ほかのワーカーはこのワーカーのロックの外で参加・離脱させられるので、
+            # 組み替えは募集ごとに compare-and-set で最新の状態に適用し直し、その間の変更を失わない
+            moved = await self._commit_pool(anchor_id, sources, placed, lobby_entries[0], lobby_teams[0], team_count)
+            extra_lobbies = [[entry for entry in lobby if entry.key in moved] for lobby in extra_lobbies]
+
+        # 2 つ目以降のロビーはロックを解放してから新しい募集として投稿する
+        for number, (lobby, team_keys) in enumerate(zip(extra_lobbies, extra_teams), start=2):
+            await self._post_lobby(anchor, channel.id, guild_id, number, lobby, team_keys)
+
+        summary = f"{sum(lobby_sizes)}名を{len(lobby_sizes)}ロビーに分けました。"
+        unplaced = len(entries) - sum(lobby_sizes)
+        if unplaced:
+            summary += f"（{unplaced}名は補欠として元の募集に残っています）"
+        await self._followup(interaction, summary, ephemeral=True)
+
+    async def _commit_pool(
+        self,
+        anchor_id: int,
+        sources: Sequence[Tuple[int, TrackedMessage]],
+        placed: Set[str],
+        anchor_entries: Sequence[ParticipantEntry],
+        anchor_teams: Sequence[Sequence[str]],
+        team_count: int,
+    ) -> Set[str]:
+        """プールの組み替えを共有の保存先に書き込み、ロビーに移せた参加者のキーを返す。
+
+        計算後にほかのワーカーで離脱した参加者はロビーに入れず、参加した人は元の募集に残す。
+        """
+        taken: Set[str] = set()
+        for message_id, _ in sources:
+            if message_id == anchor_id:
+                continue
+            removed: Set[str] = set()
+
+            def move_out(current: TrackedMessage) -> bool:
+                removed.clear()
+                if current.is_disbanded:
+                    return False
+                removed.update(entry.key for entry in current.participants if entry.key in placed)
+                for key in removed:
+                    current.participants.remove(key)
+                return bool(removed)
+
+            self._apply(message_id, await self.state.update(message_id, move_out), render=True)
+            taken |= removed
+
+        moved = set(taken)
+
+        def rearrange(current: TrackedMessage) -> bool:
+            nonlocal moved
+            moved = taken | {entry.key for entry in current.participants if entry.key in placed}
+            if current.is_disbanded:
+                return False
+            leftovers = [entry for entry in current.participants if entry.key not in placed]
+            current.participants = Roster([entry for entry in anchor_entries if entry.key in moved] + leftovers)
+            current.participants.assign_teams(anchor_teams)
+            current.team_count = team_count
+            current.teams_visible = True
+            return True
+
+        self._apply(anchor_id, await self.state.update(anchor_id, rearrange), render=True)
+        return moved
+
+    async def _post_lobby(
+        self,
+        anchor: TrackedMessage,
+        channel_id: int,
+        guild_id: int,
+        number: int,
+        entries: Sequence[ParticipantEntry],
+        team_keys: Sequence[Sequence[str]],
+    ) -> None:
+        """プールで分けた 2 つ目以降のロビーを新しい募集として投稿し、追跡を始める。"""
+        participants = Roster(entries)
+        participants.assign_teams(team_keys)
+        tracked = self._new_recruitment(
+            guild_id=guild_id,
+            channel_id=channel_id,
+            title=f"{anchor.title}（{number}）",
             participants=participants,
+            team_count=anchor.team_count,
+            color=anchor.color,
+            teams_visible=True,
+            uses_buttons=anchor.uses_buttons,
+            # ダミーは 1 つ目の募集から移ってくるので、新しいダミーの連番が重ならないよう続きから振る
+            dummy_count=anchor.dummy_count,
         )
-        self.tracked_messages[sent_message.id] = tracked
 
-        if participants:
-            await self._update_embed(sent_message.id)
+        user_ids = participants.user_ids()
+        members = await self._resolve_members(guild_id, user_ids) if user_ids else {}
+        mentions = {user_id: member.mention for user_id, member in members.items()}
+        channel = self.bot.get_partial_messageable(channel_id, guild_id=guild_id)
+        try:
+            message = await self._send(
+                channel,
+                " ".join(mentions.values()) or None,
+                embed=render_recruitment_embed(None, tracked, mentions),
+                allowed_mentions=discord.AllowedMentions(users=True, roles=False, everyone=False),
+                **({"view": recruitment_view()} if tracked.uses_buttons else {}),
+            )
+        except discord.HTTPException:
+            logger.exception("ロビー %d の募集を投稿できませんでした。", number)
+            return
 
-        # ここでの埋め込み再編集は不要（_update_embed 側でIDを常時追記）
+        self._track(message.id, tracked)
+        self._mark_persist(message.id)
+        await self.state.put(message.id, tracked)
+        self.render_scheduler.mark_dirty(message.id)
+        self._bootstrap_reactions(message.id, tracked)
 
+    @instrumented("handle_remove_user")
     async def _handle_remove_user(
         self,
         interaction: discord.Interaction,
@@ -243,7 +880,8 @@ class BoManager(commands.Cog):
         # ユーザーメンション形式をパース
         user_id = parse_user_mention(remove_user)
         if user_id is None:
-            await interaction.response.send_message(
+            await self._respond(
+                interaction,
                 "無効なユーザーメンション形式です。例: <@123456789>",
                 ephemeral=True,
             )
@@ -252,58 +890,44 @@ class BoManager(commands.Cog):
         # チャンネル内の最新の募集メッセージを探す
         channel = interaction.channel
         if channel is None:
-            await interaction.response.send_message(
+            await self._respond(
+                interaction,
                 "チャンネル情報を取得できませんでした。",
                 ephemeral=True,
             )
             return
 
-        # 同じチャンネルの tracked_messages を探す
-        channel_tracked = [
-            (msg_id, data)
-            for msg_id, data in self.tracked_messages.items()
-            if data.channel_id == channel.id
-        ]
-
-        if not channel_tracked:
-            await interaction.response.send_message(
+        # チャンネル内で開催中の最新のメッセージを取得（メッセージIDが大きいもの）
+        latest_msg_id = self.recruitment_index.latest_in_channel(channel.id)
+        data = self.tracked_messages.get(latest_msg_id) if latest_msg_id is not None else None
+        if latest_msg_id is None or data is None:
+            await self._respond(
+                interaction,
                 "このチャンネルに募集メッセージが見つかりませんでした。",
                 ephemeral=True,
             )
             return
 
-        # 最新のメッセージを取得（メッセージIDが大きいもの）
-        latest_msg_id, data = max(channel_tracked, key=lambda x: x[0])
-
-        # 参加者リストから該当ユーザーを削除
-        entry_index = next(
-            (
-                index
-                for index, entry in enumerate(data.participants)
-                if entry.user_id == user_id
-            ),
-            None,
-        )
-
-        if entry_index is None:
-            await interaction.response.send_message(
+        # 参加者リストから該当ユーザーを削除（チーム分けからも削除される）
+        updated = await self.state.leave(latest_msg_id, user_id)
+        if updated is None:
+            await self._respond(
+                interaction,
                 f"<@{user_id}> は参加者リストに登録されていません。",
                 ephemeral=True,
             )
             return
-
-        removed_entry = data.participants.pop(entry_index)
-        # チーム分けからも削除
-        data.team_one = [key for key in data.team_one if key != removed_entry.key]
-        data.team_two = [key for key in data.team_two if key != removed_entry.key]
+        self._adopt(latest_msg_id, updated)
 
         # Embed を更新
-        await interaction.response.send_message(
+        await self._respond(
+            interaction,
             f"<@{user_id}> を参加者リストから削除しました。",
             ephemeral=True,
         )
-        await self._update_embed(latest_msg_id)
+        self._mark_dirty(latest_msg_id)
 
+    @instrumented("handle_close_game")
     async def _handle_close_game(
         self,
         interaction: discord.Interaction,
@@ -314,7 +938,8 @@ class BoManager(commands.Cog):
         try:
             message_id = int(close_game.strip())
         except (TypeError, ValueError):
-            await interaction.response.send_message(
+            await self._respond(
+                interaction,
                 "無効なメッセージIDです。数値のみを入力してください。",
                 ephemeral=True,
             )
@@ -323,7 +948,16 @@ class BoManager(commands.Cog):
         # tracked_messages から該当メッセージを取得
         data = self.tracked_messages.get(message_id)
         if data is None:
-            await interaction.response.send_message(
+            archived = self.archive.get(message_id)
+            if archived is not None and archived.is_disbanded:
+                await self._respond(
+                    interaction,
+                    "この募集は既に終了しています。",
+                    ephemeral=True,
+                )
+                return
+            await self._respond(
+                interaction,
                 "指定されたメッセージIDの募集が見つかりませんでした。",
                 ephemeral=True,
             )
@@ -331,685 +965,994 @@ class BoManager(commands.Cog):
 
         # 既に終了済みかチェック
         if data.is_disbanded:
-            await interaction.response.send_message(
+            await self._respond(
+                interaction,
                 "この募集は既に終了しています。",
                 ephemeral=True,
             )
             return
 
-        # チャンネルを取得
-        channel = self.bot.get_channel(data.channel_id)
-        if channel is None:
-            try:
-                channel = await self.bot.fetch_channel(data.channel_id)
-            except discord.HTTPException:
-                await interaction.response.send_message(
-                    "チャンネル情報を取得できませんでした。",
-                    ephemeral=True,
-                )
-                return
-
-        # メッセージを取得
-        try:
-            message = await channel.fetch_message(message_id)
-        except discord.HTTPException:
-            await interaction.response.send_message(
+        if not await self._disband(message_id):
+            await self._respond(
+                interaction,
                 "メッセージを取得できませんでした。",
                 ephemeral=True,
             )
             return
 
-        # Embed の色を赤に変更し、タイトルに【解散】を追加
-        if message.embeds:
-            embed = message.embeds[0]
-            new_embed = discord.Embed.from_dict(embed.to_dict())
-            new_embed.color = discord.Color.red()
-            # タイトルに【解散】を追加（既に追加されていない場合）
-            if new_embed.title and not new_embed.title.startswith("【解散】"):
-                new_embed.title = f"【解散】{new_embed.title}"
-            elif not new_embed.title:
-                new_embed.title = "【解散】"
-            try:
-                await message.edit(embed=new_embed)
-            except discord.HTTPException:
-                pass
+        await self._respond(
+            interaction,
+            "ゲーム募集を終了しました。",
+            ephemeral=True,
+        )
+
+    @instrumented("disband")
+    async def _disband(self, message_id: int) -> bool:
+        """募集を終了し、参加者に解散を通知する。終了できなかった場合は False を返す。"""
+        data = self.tracked_messages.get(message_id)
+        if data is None:
+            return False
+
+        # 終了フラグを設定（リアクションイベントが発火しないようにする）
+        # Embed は色を赤に変更し、タイトルの頭に【解散】を付けて描画される
+        red = discord.Color.red().value
+
+        def disband(current: TrackedMessage) -> bool:
+            if current.is_disbanded:
+                return False
+            current.is_disbanded = True
+            current.color = red
+            return True
+
+        updated = await self.state.update(message_id, disband)
+        if updated is None:
+            return False
+        self._adopt(message_id, updated)
+        self.recruitment_index.discard(message_id, data)
+        # 終了済みの募集ではリアクションイベントを発火しない
+        self._unroute_reactions(message_id)
+        self.auto_close.cancel(message_id)
+        self._mark_persist(message_id)
+        await self.render_scheduler.flush(message_id)
+        if message_id not in self.tracked_messages:
+            return False
 
         # 参加者にメンションして解散メッセージを送信
-        participant_user_ids = [
-            entry.user_id
-            for entry in data.participants
-            if not entry.is_dummy and entry.user_id is not None
-        ]
+        participant_user_ids = data.participants.user_ids()
 
         if participant_user_ids:
-            # 参加者を事前に fetch してキャッシュに保存
-            if data.guild_id:
-                guild = self.bot.get_guild(data.guild_id)
-                if guild is not None:
-                    for user_id in participant_user_ids:
-                        try:
-                            await guild.fetch_member(user_id)
-                        except discord.HTTPException:
-                            try:
-                                await self.bot.fetch_user(user_id)
-                            except discord.HTTPException:
-                                pass
-
             mentions = await self._resolve_display_mentions(data.guild_id, participant_user_ids)
             mention_text = " ".join(mentions)
             content = f"{mention_text} 解散しました"
 
+            channel = self.bot.get_partial_messageable(data.channel_id, guild_id=data.guild_id)
             try:
-                await channel.send(
+                await self._send(
+                    channel,
                     content,
                     allowed_mentions=discord.AllowedMentions(users=True, roles=False, everyone=False),
                 )
             except discord.HTTPException:
                 pass
 
-        # 終了フラグを設定（リアクションイベントが発火しないようにする）
-        data.is_disbanded = True
-
-        await interaction.response.send_message(
-            "ゲーム募集を終了しました。",
-            ephemeral=True,
-        )
+        # 同じメンバーが続けて同じチームにならないよう、この試合のチーム構成を記録する
+        if data.participants.teams:
+            self.teammate_history.record(
+                data.guild_id,
+                [
+                    [entry.user_id for entry in data.participants.team_members(team, MAIN_CAPACITY) if entry.user_id]
+                    for team in range(data.team_count)
+                ],
+            )
 
-    @commands.Cog.listener(name="on_raw_reaction_add")
-    async def on_raw_reaction_add(self, payload: discord.RawReactionActionEvent) -> None:
-        data = self.tracked_messages.get(payload.message_id)
-        if data is None or payload.guild_id is None:
-            return
-        if payload.user_id == self.bot.user.id:
-            return
-        # 終了済みの募集ではイベントを発火しない
-        if data.is_disbanded:
-            return
+        # 終了した募集は要約だけを残してメモリから外す
+        self._archive(message_id, "disbanded")
+        return True
 
-        if self._is_tracked_emoji(payload.emoji, data.join_emoji):
-            if not any(entry.user_id == payload.user_id for entry in data.participants):
-                # ユーザー情報を事前に fetch してキャッシュに保存
-                guild = self.bot.get_guild(payload.guild_id)
-                if guild is not None:
-                    try:
-                        await guild.fetch_member(payload.user_id)
-                    except discord.HTTPException:
-                        try:
-                            await self.bot.fetch_user(payload.user_id)
-                        except discord.HTTPException:
-                            pass
-                
-                entry = ParticipantEntry(
-                    key=f"user:{payload.user_id}",
-                    user_id=payload.user_id,
-                    label="",
-                    is_dummy=False,
-                )
-                data.participants.append(entry)
-                await self._update_embed(payload.message_id)
+    async def _auto_close(self, message_id: int) -> None:
+        data = self.tracked_messages.get(message_id)
+        if data is None or data.is_disbanded:
             return
-
-        if self._is_tracked_emoji(payload.emoji, data.check_emoji):
-            data.teams_visible = True
-            await self._assign_teams(payload.message_id)
+        # 期限の判定後に操作があれば延長する
+        deadline = self._auto_close_deadline(data)
+        if deadline is not None and deadline > time.time():
+            self.auto_close.schedule(message_id, deadline)
             return
+        logger.info("募集 %s を自動で終了します。", message_id)
+        await self._disband(message_id)
 
-        if self._is_tracked_emoji(payload.emoji, data.dummy_emoji):
-            await self._handle_dummy_reaction(payload)
-            return
+    @staticmethod
+    def _auto_close_deadline(data: TrackedMessage) -> Optional[float]:
+        deadlines = []
+        if settings.auto_close_idle > 0:
+            deadlines.append(data.updated_at + settings.auto_close_idle)
+        if settings.auto_close_max_age > 0:
+            deadlines.append(data.created_at + settings.auto_close_max_age)
+        return min(deadlines) if deadlines else None
+
+    def _schedule_auto_close(self, message_id: int, data: TrackedMessage) -> None:
+        deadline = self._auto_close_deadline(data)
+        if deadline is not None and not data.is_disbanded:
+            self.auto_close.schedule(message_id, deadline)
 
-        if self._is_tracked_emoji(payload.emoji, data.notify_emoji):
-            await self._handle_notify_reaction(payload)
+    @commands.Cog.listener(name="on_raw_reaction_add")
+    async def on_raw_reaction_add(self, payload: discord.RawReactionActionEvent) -> None:
+        # 追跡していないメッセージ・絵文字はここで 1 回の辞書引きだけで捨てる
+        route = self._reaction_routes.get((payload.message_id, payload.emoji.name, payload.emoji.id))
+        if route is None:
+            if not self._maybe_shared(payload):
+                return
+            route = await self._shared_route(payload)
+        if route is None or payload.guild_id is None:
             return
-
-        if self._is_tracked_emoji(payload.emoji, data.recruit_emoji):
-            await self._handle_recruit_reaction(payload)
+        if payload.user_id == self.bot.user.id:
             return
+        await route.on_add(payload)
 
     @commands.Cog.listener(name="on_raw_reaction_remove")
     async def on_raw_reaction_remove(self, payload: discord.RawReactionActionEvent) -> None:
-        data = self.tracked_messages.get(payload.message_id)
-        if data is None or payload.guild_id is None:
+        route = self._reaction_routes.get((payload.message_id, payload.emoji.name, payload.emoji.id))
+        if route is None:
+            if not self._maybe_shared(payload):
+                return
+            route = await self._shared_route(payload)
+        if route is None or route.on_remove is None or payload.guild_id is None:
             return
         if payload.user_id == self.bot.user.id:
             return
-        # 終了済みの募集ではイベントを発火しない
-        if data.is_disbanded:
-            return
+        await route.on_remove(payload)
+
+    def _maybe_shared(self, payload: discord.RawReactionActionEvent) -> bool:
+        """ほかのワーカーが作成した募集への操作用リアクションかもしれないか（保存先への問い合わせ前の判定）。"""
+        return (
+            self._shared_state
+            and payload.emoji.id is None
+            and payload.emoji.name in CONTROL_EMOJIS
+            and payload.message_id not in self.tracked_messages
+            and payload.message_id not in self._unknown_messages
+        )
 
-        if not self._is_tracked_emoji(payload.emoji, data.join_emoji):
-            return
+    async def _shared_route(self, payload: discord.RawReactionActionEvent) -> Optional[ReactionRoute]:
+        """ほかのワーカーが作成した募集を読み込み、リアクションに対応する処理を返す。"""
+        if await self._lookup_shared(payload.message_id) is None:
+            return None
+        return self._reaction_routes.get((payload.message_id, payload.emoji.name, payload.emoji.id))
 
-        entry_index = next(
-            (index for index, entry in enumerate(data.participants) if entry.user_id == payload.user_id),
-            None,
+    def _route_reactions(self, message_id: int, data: TrackedMessage) -> None:
+        """募集の絵文字→処理の対応表を作り直す（終了済みの募集は登録しない）。"""
+        self._unroute_reactions(message_id)
+        if data.is_disbanded or data.uses_buttons:
+            return
+        handlers = (
+            (data.join_emoji, ReactionRoute(self._handle_join_reaction, self._handle_leave_reaction)),
+            (data.check_emoji, ReactionRoute(self._handle_teams_reaction)),
+            (data.dummy_emoji, ReactionRoute(self._handle_dummy_reaction)),
+            (data.notify_emoji, ReactionRoute(self._handle_notify_reaction)),
+            (data.recruit_emoji, ReactionRoute(self._handle_recruit_reaction)),
         )
-        if entry_index is not None:
-            removed_entry = data.participants.pop(entry_index)
-            data.team_one = [key for key in data.team_one if key != removed_entry.key]
-            data.team_two = [key for key in data.team_two if key != removed_entry.key]
-            await self._update_embed(payload.message_id)
+        keys: List[Tuple[int, str, None]] = []
+        for emoji, route in handlers:
+            # 操作用の絵文字はすべて Unicode 絵文字なので、カスタム絵文字 ID は常に None
+            if emoji is None:
+                continue
+            key = (message_id, emoji, None)
+            if key not in self._reaction_routes:
+                self._reaction_routes[key] = route
+                keys.append(key)
+        self._routed_keys[message_id] = keys
+
+    def _unroute_reactions(self, message_id: int) -> None:
+        for key in self._routed_keys.pop(message_id, ()):
+            self._reaction_routes.pop(key, None)
+
+    @instrumented("handle_join_reaction")
+    async def _handle_join_reaction(self, payload: discord.RawReactionActionEvent) -> None:
+        # ゲートウェイから届いたメンバー情報をキャッシュに保存
+        if payload.member is not None:
+            self.member_cache.put(
+                payload.guild_id,
+                payload.user_id,
+                CachedMember.from_member(payload.member),
+            )
+        await self._join(payload.message_id, payload.user_id)
 
-    async def _assign_teams(self, message_id: int) -> None:
-        data = self.tracked_messages.get(message_id)
-        if data is None or not data.participants:
-            return
+    @instrumented("handle_leave_reaction")
+    async def _handle_leave_reaction(self, payload: discord.RawReactionActionEvent) -> None:
+        await self._leave(payload.message_id, payload.user_id)
 
-        main_entries = data.participants[:12]
-        if not main_entries:
-            return
+    async def _join(self, message_id: int, user_id: int, *, render: bool = True) -> bool:
+        """参加者に追加する。追加された場合は True を返す。"""
+        if message_id not in self.tracked_messages:
+            return False
+        entry = ParticipantEntry(
+            key=f"user:{user_id}",
+            user_id=user_id,
+            label="",
+            is_dummy=False,
+        )
+        return self._apply(message_id, await self.state.join(message_id, entry), render=render)
 
-        if len(main_entries) % 2 != 0:
-            data.team_one.clear()
-            data.team_two.clear()
-            await self._update_embed(message_id)
-            return
+    async def _leave(self, message_id: int, user_id: int, *, render: bool = True) -> bool:
+        """参加者から外す（チーム分けからも外れる）。外した場合は True を返す。"""
+        if message_id not in self.tracked_messages:
+            return False
+        return self._apply(message_id, await self.state.leave(message_id, user_id), render=render)
 
-        weighted_entries = await self._with_weights(main_entries, data.guild_id)
-        team_one, team_two = self._balanced_split(weighted_entries)
-        team_one, team_two = self._auto_balance_sizes(team_one, team_two)
-        data.team_one = [item.entry.key for item in team_one]
-        data.team_two = [item.entry.key for item in team_two]
-        await self._update_embed(message_id)
+    async def _add_dummy(self, message_id: int, *, render: bool = True) -> bool:
+        if message_id not in self.tracked_messages:
+            return False
+        return self._apply(message_id, await self.state.add_dummy(message_id), render=render)
 
-    async def _update_embed(self, message_id: int) -> None:
+    def _apply(self, message_id: int, updated: Optional[TrackedMessage], *, render: bool) -> bool:
+        """保存先で変更された募集をメモリ上の募集に反映し、再描画と保存を予約する。"""
+        if updated is None or not self._adopt(message_id, updated):
+            return False
+        (self._mark_dirty if render else self._touch)(message_id)
+        return True
+
+    def _adopt(self, message_id: int, updated: TrackedMessage) -> bool:
+        """共有の保存先から読んだ状態でメモリ上の募集を置き換える。追跡していなければ False を返す。"""
         data = self.tracked_messages.get(message_id)
         if data is None:
+            return False
+        if updated is not data:
+            # ロックや参照を保ったまま、ほかのワーカーが変えうる項目だけを差し替える
+            data.participants = updated.participants
+            data.team_count = updated.team_count
+            data.dummy_count = updated.dummy_count
+            data.teams_visible = updated.teams_visible
+            data.is_disbanded = updated.is_disbanded
+            data.color = updated.color
+            if (updated.join_emoji, updated.check_emoji) != (data.join_emoji, data.check_emoji):
+                # リアクションの付与結果で操作用の絵文字が変わった
+                data.join_emoji = updated.join_emoji
+                data.check_emoji = updated.check_emoji
+                self._route_reactions(message_id, data)
+        return True
+
+    async def _lookup_shared(self, message_id: int) -> Optional[TrackedMessage]:
+        """ほかのワーカーが作成した募集を共有の保存先から読み込み、追跡を始める。"""
+        data = self.tracked_messages.get(message_id)
+        if data is not None or not self.state.is_shared or message_id in self._unknown_messages:
+            return data
+        data = await self.state.get(message_id)
+        if data is None or data.is_disbanded or not self.shards.owns(data.guild_id):
+            self._unknown_messages[message_id] = None
+            if len(self._unknown_messages) > UNKNOWN_MESSAGE_CACHE_SIZE:
+                self._unknown_messages.popitem(last=False)
+            return None
+        if message_id not in self.tracked_messages:
+            self._track(message_id, data)
+        return self.tracked_messages.get(message_id)
+
+    @instrumented("handle_teams_reaction")
+    async def _handle_teams_reaction(self, payload: discord.RawReactionActionEvent) -> None:
+        if not await self._claim_reaction(payload):
             return
+        await self._assign_teams(payload.message_id, reveal=True)
 
-        channel = self.bot.get_channel(data.channel_id)
-        if channel is None:
-            try:
-                channel = await self.bot.fetch_channel(data.channel_id)
-            except discord.HTTPException:
-                self.tracked_messages.pop(message_id, None)
+    @instrumented("assign_teams")
+    async def _assign_teams(self, message_id: int, *, render: bool = True, reveal: bool = False) -> None:
+        """チーム分けを計算して書き込む。``reveal`` が真ならチーム欄を表示する。
+
+        重みの取得と分割の計算はロックの外で行い、書き込むときに主メンバーが計算時と同じかを確かめる
+        （compare-and-set）。その間に参加者が変わっていれば最新の参加者で計算し直す。
+        """
+        if message_id not in self.tracked_messages:
+            return
+        for _ in range(TEAM_ASSIGN_ATTEMPTS):
+            data = await self.state.get(message_id)
+            if data is None or data.is_disbanded or not data.participants:
                 return
 
-        try:
-            message = await channel.fetch_message(message_id)
-        except discord.HTTPException:
-            self.tracked_messages.pop(message_id, None)
-            return
-
-        if not message.embeds:
-            return
-
-        base_embed = message.embeds[0]
-        new_embed = discord.Embed.from_dict(base_embed.to_dict())
-        main_entries = data.participants[:12]
-        reserve_entries = data.participants[12:]
-
-        # 参加者ユーザーを事前に fetch してキャッシュに保存
-        if data.guild_id:
-            guild = self.bot.get_guild(data.guild_id)
-            if guild is not None:
-                all_user_ids = [
-                    entry.user_id
-                    for entry in data.participants
-                    if not entry.is_dummy and entry.user_id is not None
-                ]
-                for user_id in all_user_ids:
-                    try:
-                        await guild.fetch_member(user_id)
-                    except discord.HTTPException:
-                        try:
-                            await self.bot.fetch_user(user_id)
-                        except discord.HTTPException:
-                            pass
-
-        participant_mentions = await self._format_entries(
-            data.guild_id,
-            main_entries,
-            include_order=True,
-            start_index=1,
+            main_entries = data.participants.main(MAIN_CAPACITY)
+            main_keys = [entry.key for entry in main_entries]
+            team_keys: List[List[str]] = []
+            if len(main_entries) % data.team_count == 0:
+                weighted_entries = await self._with_weights(main_entries, data.guild_id)
+                weights = [item.weight for item in weighted_entries]
+                if data.team_count == 2:
+                    cooccurrence = self.teammate_history.cooccurrence(
+                        data.guild_id,
+                        [entry.user_id for entry in main_entries],
+                    )
+                    teams: Sequence[Sequence[int]] = self.team_scorer.choose(weights, cooccurrence)
+                else:
+                    teams = await self._partition(weights, data.team_count)
+                team_keys = [[main_entries[index].key for index in team] for team in teams]
+
+            stale = False
+
+            def assign(current: TrackedMessage) -> bool:
+                nonlocal stale
+                if current.is_disbanded:
+                    return False
+                if [entry.key for entry in current.participants.main(MAIN_CAPACITY)] != main_keys:
+                    stale = True
+                    return False
+                # 参加者数がチーム数で割り切れない場合はチーム分けを解除する
+                current.participants.assign_teams(team_keys)
+                if reveal:
+                    current.teams_visible = True
+                return True
+
+            updated = await self.state.update(message_id, assign)
+            if not stale:
+                self._apply(message_id, updated, render=render)
+                return
+        logger.warning("募集 %s のチーム分けは参加者の変更が続いたため中断しました。", message_id)
+
+    async def _partition(self, weights: Sequence[int], team_count: int) -> List[List[int]]:
+        """k チームへの分割を計算する。全探索や大人数の探索はイベントループを止めないよう別プロセスで行う。"""
+        return await self._run_partition(
+            partition,
+            list(weights),
+            team_count,
+            time_budget=settings.partition_time_budget,
         )
-        has_participants = bool(participant_mentions)
 
-        field_value = "\n".join(participant_mentions) if has_participants else "なし"
-        field_index = self._find_participant_field_index(new_embed.fields)
-        if field_index is None:
-            new_embed.add_field(name="参加者", value=field_value, inline=False)
-        else:
-            new_embed.set_field_at(field_index, name="参加者", value=field_value, inline=False)
-
-        # 補欠情報
-        reserve_mentions = await self._format_entries(
-            data.guild_id,
-            reserve_entries,
-            include_order=True,
-            start_index=len(main_entries) + 1,
+    async def _pool_partition(
+        self,
+        weights: Sequence[int],
+        lobby_sizes: Sequence[int],
+        team_count: int,
+    ) -> List[List[List[int]]]:
+        return await self._run_partition(
+            pool_partition,
+            list(weights),
+            list(lobby_sizes),
+            team_count,
+            time_budget=settings.partition_time_budget,
         )
-        self._set_embed_field(new_embed, "補欠", reserve_mentions, empty_value="なし", remove_if_empty=True)
 
-        if data.teams_visible:
-            # チーム情報を最新化（先頭12名のみ対象）
-            main_keys = {entry.key for entry in main_entries}
-            data.team_one = [key for key in data.team_one if key in main_keys]
-            data.team_two = [key for key in data.team_two if key in main_keys]
-
-            team_one_entries = self._entries_from_keys(data, data.team_one)
-            team_two_entries = self._entries_from_keys(data, data.team_two)
-
-            team_one_mentions = await self._format_entries(
-                data.guild_id,
-                team_one_entries,
-                include_order=False,
-            )
-            team_two_mentions = await self._format_entries(
-                data.guild_id,
-                team_two_entries,
-                include_order=False,
+    @traced("partition")
+    async def _run_partition(self, func: Callable[..., Any], weights: List[int], *args: Any, **kwargs: Any) -> Any:
+        if len(weights) <= PARTITION_INLINE_LIMIT:
+            return func(weights, *args, **kwargs)
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor(), functools.partial(func, weights, *args, **kwargs))
+
+    def _executor(self) -> ProcessPoolExecutor:
+        if self._partition_pool is None:
+            # スレッドを持つプロセス（SQLite の書き込み・aiohttp の名前解決）から fork するとデッドロックしうるので、
+            # forkserver から作業プロセスを起動する
+            self._partition_pool = ProcessPoolExecutor(
+                max_workers=max(settings.partition_workers, 1),
+                mp_context=multiprocessing.get_context("forkserver"),
             )
+        return self._partition_pool
 
-            self._set_embed_field(
-                new_embed,
-                "チーム1",
-                team_one_mentions,
-                empty_value="未割り当て",
-                joiner=", ",
-            )
-            self._set_embed_field(
-                new_embed,
-                "チーム2",
-                team_two_mentions,
-                empty_value="未割り当て",
-                joiner=", ",
+    async def _warm_partition_pool(self) -> None:
+        """作業プロセスの起動とモジュールの読み込みを、最初のチーム分けの前に済ませておく。"""
+        loop = asyncio.get_running_loop()
+        executor = self._executor()
+        try:
+            await asyncio.gather(
+                *(
+                    loop.run_in_executor(executor, functools.partial(partition, [1, 1], 2))
+                    for _ in range(max(settings.partition_workers, 1))
+                )
             )
-        else:
-            # チーム欄を削除
-            self._remove_field(new_embed, "チーム1")
-            self._remove_field(new_embed, "チーム2")
+        except Exception:
+            logger.exception("チーム分けの作業プロセスを起動できませんでした。")
+
+    def _track(self, message_id: int, data: TrackedMessage) -> None:
+        self.tracked_messages[message_id] = data
+        if not data.is_disbanded:
+            self.recruitment_index.add(message_id, data)
+        self._route_reactions(message_id, data)
+        self._schedule_auto_close(message_id, data)
+        self._enforce_retention()
+
+    def _untrack(self, message_id: int) -> None:
+        data = self.tracked_messages.pop(message_id, None)
+        if data is not None:
+            self.recruitment_index.discard(message_id, data)
+            self._unroute_reactions(message_id)
+            self.auto_close.cancel(message_id)
+            self.reaction_pipeline.cancel(message_id)
+            self._dirty_since.pop(message_id, None)
+            self._mark_persist(message_id)
+
+    def _archive(self, message_id: int, reason: str) -> None:
+        """募集をメモリから外し、要約だけをアーカイブ（と永続化バックエンド）に残す。"""
+        data = self.tracked_messages.pop(message_id, None)
+        if data is None:
+            return
+        self.recruitment_index.discard(message_id, data)
+        self._unroute_reactions(message_id)
+        self.render_scheduler.discard(message_id)
+        self._dirty_since.pop(message_id, None)
+        self.auto_close.cancel(message_id)
+        self.reaction_pipeline.cancel(message_id)
+        self.reaction_cleanup.discard(message_id)
+        record = ArchivedRecruitment.from_tracked(message_id, data, reason)
+        self.archive.add(record)
+        if self.state_writer is not None:
+            self.state_writer.archive(record)
+
+    def _enforce_retention(self) -> None:
+        """上限件数を超えた募集と、一定時間操作のない募集をアーカイブする。"""
+        idle_before = time.time() - settings.recruitment_idle_ttl
+        # tracked_messages は最後に操作された順に並んでいるので先頭から見ればよい
+        while self.tracked_messages:
+            message_id, data = next(iter(self.tracked_messages.items()))
+            if data.lock.locked():
+                break
+            if len(self.tracked_messages) > settings.max_tracked_messages:
+                self._archive(message_id, "capacity")
+            elif data.updated_at < idle_before:
+                self._archive(message_id, "idle")
+            else:
+                break
 
-        # フィールド順序を固定
-        order = ["参加者", "補欠"]
-        if data.teams_visible:
-            order.extend(["チーム1", "チーム2"])
-        self._reorder_fields(new_embed, order)
+    def retention_stats(self) -> Dict[str, int]:
+        """メモリ上の募集件数とおおよそのメモリ使用量を返す。"""
+        return {
+            "tracked": len(self.tracked_messages),
+            "participants": sum(len(data.participants) for data in self.tracked_messages.values()),
+            "archived": len(self.archive),
+            "approx_bytes": estimate_size(self.tracked_messages) + estimate_size(self.archive),
+        }
+
+    def collect_metrics(self) -> List[MetricFamily]:
+        """メトリクスの収集時に、各コンポーネントの統計値を読み出す。"""
+        retention = self.retention_stats()
+        recruitments = MetricFamily("civ6matcher_recruitments", "gauge", "メモリ上の募集の件数")
+        recruitments.add(retention["tracked"], state="tracked")
+        recruitments.add(retention["archived"], state="archived")
+        participants = MetricFamily("civ6matcher_participants", "gauge", "メモリ上の募集の参加者数の合計")
+        participants.add(retention["participants"])
+        by_shard = MetricFamily("civ6matcher_shard_recruitments", "gauge", "シャードごとのメモリ上の募集の件数")
+        for shard_id, count in self.shard_stats().items():
+            by_shard.add(count, shard=shard_id)
+
+        outbound = self.outbound.stats()
+        rest_calls = MetricFamily("civ6matcher_rest_calls", "counter", "REST 呼び出しの数（ルートの種類・結果別）")
+        for (route, outcome), count in self.outbound.outcomes.items():
+            rest_calls.add(count, "_total", route=route, outcome=outcome)
+        coalesced = MetricFamily("civ6matcher_rest_coalesced", "counter", "送信前に新しい呼び出しへまとめた REST 呼び出しの数")
+        coalesced.add(self.outbound.coalesced, "_total")
+        rate_limit_wait = MetricFamily(
+            "civ6matcher_rate_limit_wait_seconds",
+            "counter",
+            "レート制限で待った秒数の合計",
+        )
+        rate_limit_wait.add(self.outbound.rate_limit_wait, "_total", source="outbound")
+        rate_limit_wait.add(self.reaction_pipeline.rate_limit_wait, "_total", source="reactions")
+        rate_limit_wait.add(sum(http_rate_limits.wait.values()), "_total", source="http")
+        rate_limited = MetricFamily(
+            "civ6matcher_http_rate_limited",
+            "counter",
+            "Discord から返された 429 の数（レート制限のスコープ別）",
+        )
+        for scope, count in http_rate_limits.count.items():
+            rate_limited.add(count, "_total", scope=scope)
+        queued = MetricFamily("civ6matcher_outbound_queued", "gauge", "送信待ちの REST 呼び出しの数")
+        for priority in Priority:
+            queued.add(outbound[f"queued_{priority.name.lower()}"], priority=priority.name.lower())
+        in_flight = MetricFamily("civ6matcher_outbound_in_flight", "gauge", "送信中の REST 呼び出しの数")
+        in_flight.add(outbound["in_flight"])
+        pending = MetricFamily("civ6matcher_reactions_pending", "gauge", "付与・削除を待っているリアクションの数")
+        pending.add(self.reaction_pipeline.pending(), kind="add")
+        pending.add(self.reaction_cleanup.pending(), kind="remove")
+
+        member_cache = self.member_cache.stats()
+        cache_lookups = MetricFamily("civ6matcher_cache_lookups", "counter", "キャッシュの参照回数（キャッシュ・結果別）")
+        cache_lookups.add(member_cache["hits"], "_total", cache="member", result="hit")
+        cache_lookups.add(member_cache["misses"], "_total", cache="member", result="miss")
+        cache_lookups.add(self.weight_hits, "_total", cache="weight", result="hit")
+        cache_lookups.add(self.weight_misses, "_total", cache="weight", result="miss")
+        hit_ratio = MetricFamily("civ6matcher_cache_hit_ratio", "gauge", "キャッシュのヒット率")
+        hit_ratio.add(member_cache["hit_rate"], cache="member")
+        weight_lookups = self.weight_hits + self.weight_misses
+        hit_ratio.add(self.weight_hits / weight_lookups if weight_lookups else 0.0, cache="weight")
+        cache_size = MetricFamily("civ6matcher_cache_entries", "gauge", "キャッシュ・索引の件数")
+        cache_size.add(member_cache["size"], cache="member")
+        cache_size.add(len(self._weights), cache="weight")
+        cache_size.add(len(self.member_index), cache="member_index")
+
+        return [
+            recruitments,
+            participants,
+            by_shard,
+            rest_calls,
+            coalesced,
+            rate_limit_wait,
+            rate_limited,
+            queued,
+            in_flight,
+            pending,
+            cache_lookups,
+            hit_ratio,
+            cache_size,
+        ]
 
-        # タイトル直下にメッセージIDを常時表示
-        new_embed.description = f"`ID: {message_id}`"
+    def shard_stats(self) -> Dict[int, int]:
+        """シャードIDごとのメモリ上の募集件数を返す。"""
+        # 自動シャーディングのシャード数は接続後に Bot から分かる
+        self.shards = self.shards.with_count(self.bot.shard_count)
+        return self.shards.count_by_shard(data.guild_id for data in self.tracked_messages.values())
+
+    async def _run_retention(self) -> None:
+        while True:
+            await asyncio.sleep(settings.retention_sweep_interval)
+            self._enforce_retention()
+            logger.info("募集の保持状況: %s", self.retention_stats())
+            logger.info("送信キュー統計: %s", self.outbound.stats())
+            if settings.sharded:
+                logger.info("シャードごとの募集件数: %s", self.shard_stats())
+
+    def _mark_dirty(self, message_id: int) -> None:
+        """募集の状態が変わったことを記録し、Embed の再描画と保存を予約する。"""
+        self._touch(message_id)
+        self._dirty_since.setdefault(message_id, time.monotonic())
+        self.render_scheduler.mark_dirty(message_id)
+
+    def _touch(self, message_id: int) -> None:
+        """募集の状態が変わったことを記録し、保存を予約する（Embed は呼び出し側で更新する）。"""
+        data = self.tracked_messages.pop(message_id, None)
+        if data is not None:
+            # 最後に操作された募集を末尾に移す（保持期間の判定に使う）
+            data.updated_at = time.time()
+            self.tracked_messages[message_id] = data
+            self._schedule_auto_close(message_id, data)
+        self._mark_persist(message_id)
+
+    def _mark_persist(self, message_id: int) -> None:
+        if self.state_writer is not None:
+            self.state_writer.mark(message_id)
+
+    @instrumented("update_embed", root=True)
+    async def _update_embed(self, message_id: int) -> None:
+        # 描画を始めた後の変更は次の編集の待ち時間として数える
+        changed_at = self._dirty_since.pop(message_id, None)
+        data = self.tracked_messages.get(message_id)
+        if data is None:
+            return
 
-        await message.edit(embed=new_embed, allowed_mentions=discord.AllowedMentions.none())
+        # 参加者ユーザーをまとめて解決（キャッシュ済みなら REST は発生しない）
+        user_ids = data.participants.user_ids()
+        members = await self._resolve_members(data.guild_id, user_ids) if user_ids else {}
+        mentions = {user_id: member.mention for user_id, member in members.items()}
 
-    async def _handle_dummy_reaction(self, payload: discord.RawReactionActionEvent) -> None:
-        data = self.tracked_messages.get(payload.message_id)
-        if data is None:
+        embed = render_recruitment_embed(message_id, data, mentions)
+        # 終了した募集のボタンは取り除く
+        extra: Dict[str, Any] = {"view": None} if data.uses_buttons and data.is_disbanded else {}
+        message = self._partial_message(data.channel_id, message_id, data.guild_id)
+        try:
+            # 送信前の古い編集が残っていれば、この編集で置き換える
+            await self.outbound.submit(
+                Priority.HIGH,
+                ("edit", data.channel_id),
+                functools.partial(message.edit, embed=embed, allowed_mentions=discord.AllowedMentions.none(), **extra),
+                key=("edit", message_id),
+            )
+        except discord.NotFound:
+            # メッセージが削除されていれば追跡をやめる
+            self._untrack(message_id)
             return
+        if changed_at is not None:
+            CHANGE_TO_EDIT_SECONDS.observe(time.monotonic() - changed_at, path="render")
 
-        data.dummy_count += 1
-        label = f"ダミー{data.dummy_count}"
-        entry = ParticipantEntry(
-            key=f"dummy:{data.dummy_count}",
-            user_id=None,
-            label=label,
-            is_dummy=True,
-        )
-        data.participants.append(entry)
-        await self._update_embed(payload.message_id)
-        await self._remove_user_reaction(payload)
+    @instrumented("handle_dummy_reaction")
+    async def _handle_dummy_reaction(self, payload: discord.RawReactionActionEvent) -> None:
+        if payload.message_id not in self.tracked_messages:
+            return
+        if not await self._claim_reaction(payload):
+            return
+        await self._add_dummy(payload.message_id)
+        self._remove_user_reaction(payload)
 
+    @instrumented("handle_notify_reaction")
     async def _handle_notify_reaction(self, payload: discord.RawReactionActionEvent) -> None:
         data = self.tracked_messages.get(payload.message_id)
-        if data is None:
-            await self._remove_user_reaction(payload)
-            return
-
-        main_entries = data.participants[:12]
-        target_entries = [entry for entry in main_entries if not entry.is_dummy and entry.user_id is not None]
-        if not target_entries:
-            await self._remove_user_reaction(payload)
-            return
-
-        user_ids = [entry.user_id for entry in target_entries if entry.user_id is not None]
-        
-        # 参加者ユーザーを事前に fetch してキャッシュに保存
-        if payload.guild_id:
-            guild = self.bot.get_guild(payload.guild_id)
-            if guild is not None:
-                for user_id in user_ids:
-                    try:
-                        await guild.fetch_member(user_id)
-                    except discord.HTTPException:
-                        try:
-                            await self.bot.fetch_user(user_id)
-                        except discord.HTTPException:
-                            pass
-
-        mentions = await self._resolve_display_mentions(payload.guild_id, user_ids) if payload.guild_id else []
-        if not mentions:
-            await self._remove_user_reaction(payload)
+        if data is None or payload.guild_id is None:
+            self._remove_user_reaction(payload)
+            return
+        if not await self._claim_reaction(payload):
             return
 
-        channel = self.bot.get_channel(payload.channel_id)
-        if channel is None:
+        # 発火ユーザーはゲートウェイのメンバー情報をキャッシュに保存
+        if payload.member is not None:
+            self.member_cache.put(
+                payload.guild_id,
+                payload.user_id,
+                CachedMember.from_member(payload.member),
+            )
+
+        message = await self._notify_message(data, payload.user_id)
+        if message is not None:
+            channel = self.bot.get_partial_messageable(payload.channel_id, guild_id=payload.guild_id)
             try:
-                channel = await self.bot.fetch_channel(payload.channel_id)
+                await self._send(
+                    channel,
+                    message,
+                    allowed_mentions=discord.AllowedMentions(users=True, roles=False, everyone=False),
+                )
             except discord.HTTPException:
-                await self._remove_user_reaction(payload)
-                return
-
-        # 発火ユーザーを事前に fetch してキャッシュに保存
-        if payload.guild_id:
-            guild = self.bot.get_guild(payload.guild_id)
-            if guild is not None:
-                try:
-                    await guild.fetch_member(payload.user_id)
-                except discord.HTTPException:
-                    try:
-                        await self.bot.fetch_user(payload.user_id)
-                    except discord.HTTPException:
-                        pass
-
-        trigger_mention = ""
-        if payload.guild_id:
-            trigger_mentions = await self._resolve_display_mentions(payload.guild_id, [payload.user_id])
-            if trigger_mentions:
-                trigger_mention = f" (by {trigger_mentions[0]})"
-        if not trigger_mention:
-            trigger_mention = f" (by <@{payload.user_id}>)"
-
-        message = " ".join(mentions) + trigger_mention
-        try:
-            await channel.send(message, allowed_mentions=discord.AllowedMentions(users=True, roles=False, everyone=False))
-        except discord.HTTPException:
-            pass
+                pass
 
-        await self._remove_user_reaction(payload)
+        self._remove_user_reaction(payload)
 
+    @instrumented("handle_recruit_reaction")
     async def _handle_recruit_reaction(self, payload: discord.RawReactionActionEvent) -> None:
         data = self.tracked_messages.get(payload.message_id)
-        if data is None:
-            await self._remove_user_reaction(payload)
+        if data is None or payload.guild_id is None:
+            self._remove_user_reaction(payload)
+            return
+        if not await self._claim_reaction(payload):
             return
 
         channel = self.bot.get_channel(payload.channel_id)
         if channel is None:
             try:
-                channel = await self.bot.fetch_channel(payload.channel_id)
+                channel = await self.outbound.send_now(
+                    ("channel", payload.channel_id),
+                    functools.partial(self.bot.fetch_channel, payload.channel_id),
+                )
             except discord.HTTPException:
-                await self._remove_user_reaction(payload)
+                self._remove_user_reaction(payload)
                 return
 
-        channel_name = getattr(channel, "name", "")
-        role_mention = resolve_role_mention(channel_name)
-        if role_mention is None:
-            await self._remove_user_reaction(payload)
-            return
-
-        main_entries = data.participants[:12]
-        participant_entries = [entry for entry in main_entries if not entry.is_dummy and entry.user_id is not None]
-        participant_count = len(participant_entries)
-
-        if participant_count <= 8:
-            min_needed = 8 - participant_count
-            max_needed = 12 - participant_count
-            message_range = f"@{min_needed}-{max_needed}"
-        elif participant_count in (9, 10):
-            min_needed = 10 - participant_count
-            max_needed = 12 - participant_count
-            message_range = f"@{min_needed}-{max_needed}"
-        elif participant_count == 11:
-            message_range = "@1"
-        else:
-            await self._remove_user_reaction(payload)
-            return
-
-        # 発火ユーザーを事前に fetch してキャッシュに保存
-        if payload.guild_id:
-            guild = self.bot.get_guild(payload.guild_id)
-            if guild is not None:
-                try:
-                    await guild.fetch_member(payload.user_id)
-                except discord.HTTPException:
-                    try:
-                        await self.bot.fetch_user(payload.user_id)
-                    except discord.HTTPException:
-                        pass
-
-        trigger_mention = ""
-        if payload.guild_id:
-            trigger_mentions = await self._resolve_display_mentions(payload.guild_id, [payload.user_id])
-            if trigger_mentions:
-                trigger_mention = trigger_mentions[0]
-        if not trigger_mention:
-            trigger_mention = f"<@{payload.user_id}>"
-
-        message = f"{trigger_mention} to {role_mention} {message_range}"
-        try:
-            await channel.send(
-                message,
-                allowed_mentions=discord.AllowedMentions(users=True, roles=True, everyone=False),
+        # 発火ユーザーはゲートウェイのメンバー情報をキャッシュに保存
+        if payload.member is not None:
+            self.member_cache.put(
+                payload.guild_id,
+                payload.user_id,
+                CachedMember.from_member(payload.member),
             )
-        except discord.HTTPException:
-            pass
-
-        await self._remove_user_reaction(payload)
 
-    async def _remove_user_reaction(self, payload: discord.RawReactionActionEvent) -> None:
-        channel = self.bot.get_channel(payload.channel_id)
-        if channel is None:
+        message = await self._recruit_message(data, getattr(channel, "name", ""), payload.user_id)
+        if message is not None:
             try:
-                channel = await self.bot.fetch_channel(payload.channel_id)
+                await self._send(
+                    channel,
+                    message,
+                    allowed_mentions=discord.AllowedMentions(users=True, roles=True, everyone=False),
+                )
             except discord.HTTPException:
-                return
+                pass
 
-        try:
-            message = await channel.fetch_message(payload.message_id)
-        except discord.HTTPException:
+        self._remove_user_reaction(payload)
+
+    @instrumented("handle_button")
+    async def handle_button(self, action: str, interaction: discord.Interaction) -> None:
+        """ボタン操作を処理し、状態の変更と Embed の更新を 1 回のインタラクション応答で行う。"""
+        started = time.monotonic()
+        # 同じインタラクションを受け取ったほかのワーカーが応答する
+        if self._shared_state and not await self.state.claim(f"interaction:{interaction.id}", EVENT_CLAIM_TTL):
+            return
+        message_id = interaction.message.id if interaction.message is not None else None
+        data = await self._lookup_shared(message_id) if message_id is not None else None
+        if message_id is None or data is None or data.is_disbanded:
+            await self._respond(interaction, "この募集は終了しています。", ephemeral=True)
             return
 
-        try:
-            await message.remove_reaction(payload.emoji, discord.Object(id=payload.user_id))
-        except discord.HTTPException:
+        user = interaction.user
+        self.member_cache.put(data.guild_id, user.id, CachedMember.from_member(user))
+
+        if action == "notify" or action == "recruit":
+            if action == "notify":
+                content = await self._notify_message(data, user.id)
+                allowed_mentions = discord.AllowedMentions(users=True, roles=False, everyone=False)
+            else:
+                channel_name = getattr(interaction.channel, "name", "") if interaction.channel else ""
+                content = await self._recruit_message(data, channel_name, user.id)
+                allowed_mentions = discord.AllowedMentions(users=True, roles=True, everyone=False)
+            if content is None:
+                await self._acknowledge(interaction)
+            else:
+                # 通知そのものをインタラクションの応答として送る
+                await self._respond(interaction, content, allowed_mentions=allowed_mentions)
             return
 
-    def _entries_from_keys(self, data: TrackedMessage, keys: Sequence[str]) -> List[ParticipantEntry]:
-        entries: List[ParticipantEntry] = []
-        for key in keys:
-            entry = next((item for item in data.participants if item.key == key), None)
-            if entry is not None:
-                entries.append(entry)
-        return entries
+        if action == "join":
+            changed = await self._join(message_id, user.id, render=False)
+        elif action == "leave":
+            changed = await self._leave(message_id, user.id, render=False)
+        elif action == "dummy":
+            changed = await self._add_dummy(message_id, render=False)
+        else:
+            await self._assign_teams(message_id, render=False, reveal=True)
+            changed = True
+
+        if not changed:
+            await self._acknowledge(interaction)
+            return
+
+        # 予約済みの再描画は不要になるので破棄し、応答で最新の Embed に置き換える
+        self.render_scheduler.discard(message_id)
+        self._dirty_since.pop(message_id, None)
+        user_ids = data.participants.user_ids()
+        members = await self._resolve_members(data.guild_id, user_ids) if user_ids else {}
+        mentions = {user_id: member.mention for user_id, member in members.items()}
+        await self.outbound.send_now(
+            ("interaction", interaction.id),
+            functools.partial(
+                interaction.response.edit_message,
+                embed=render_recruitment_embed(message_id, data, mentions),
+                allowed_mentions=discord.AllowedMentions.none(),
+            ),
+        )
+        CHANGE_TO_EDIT_SECONDS.observe(time.monotonic() - started, path="button")
+
+    async def _acknowledge(self, interaction: discord.Interaction) -> None:
+        """メッセージを変えずにボタン操作へ応答する。"""
+        await self.outbound.send_now(("interaction", interaction.id), interaction.response.defer)
+
+    async def _notify_message(self, data: TrackedMessage, user_id: int) -> Optional[str]:
+        """参加者（補欠を除く）へのメンション文を返す。参加者がいなければ None。"""
+        user_ids = data.participants.user_ids(MAIN_CAPACITY)
+        if not user_ids:
+            return None
+        mentions = await self._resolve_display_mentions(data.guild_id, user_ids)
+        if not mentions:
+            return None
+        trigger_mentions = await self._resolve_display_mentions(data.guild_id, [user_id])
+        trigger_mention = trigger_mentions[0] if trigger_mentions else f"<@{user_id}>"
+        return " ".join(mentions) + f" (by {trigger_mention})"
+
+    async def _recruit_message(self, data: TrackedMessage, channel_name: str, user_id: int) -> Optional[str]:
+        """募集ロールへの「あと何人」の通知文を返す。未対応のチャンネル・満員なら None。"""
+        role_mention = resolve_role_mention(channel_name)
+        if role_mention is None:
+            return None
+        message_range = needed_players_range(len(data.participants.user_ids(MAIN_CAPACITY)))
+        if message_range is None:
+            return None
+        trigger_mentions = await self._resolve_display_mentions(data.guild_id, [user_id])
+        trigger_mention = trigger_mentions[0] if trigger_mentions else f"<@{user_id}>"
+        return f"{trigger_mention} to {role_mention} {message_range}"
+
+    async def _claim_reaction(self, payload: discord.RawReactionActionEvent) -> bool:
+        """共有の保存先では、同じリアクションイベントを受け取ったワーカーのうち 1 つだけに処理させる。
+
+        参加・離脱は何度適用しても同じ結果になるが、ダミーの追加・通知・チーム分けは
+        ワーカーの数だけ繰り返されてしまうので、処理の前に確保する。
+        """
+        if not self._shared_state:
+            return True
+        return await self.state.claim(
+            f"{payload.message_id}:{payload.user_id}:{payload.emoji}",
+            EVENT_CLAIM_TTL,
+        )
+
+    def _remove_user_reaction(self, payload: discord.RawReactionActionEvent) -> None:
+        """押されたリアクションの削除を予約する（待たずに戻る）。"""
+        message = self._partial_message(payload.channel_id, payload.message_id, payload.guild_id)
+        self.reaction_cleanup.add(message, str(payload.emoji), payload.user_id)
+
+    async def _clean_reactions(self, message: discord.PartialMessage, pending: Dict[str, Set[int]]) -> None:
+        """1 つのメッセージで溜まったリアクションの削除をまとめて送る。"""
+        route = ("reaction", message.channel.id)
+        calls = []
+        for emoji, user_ids in pending.items():
+            if len(user_ids) >= REACTION_CLEAR_THRESHOLD:
+                # 絵文字ごと削除し、Bot が付けていたリアクションなら付け直す（件数によらず最大 2 回）
+                calls.append(self._clear_and_restore(message, route, emoji))
+                continue
+            for user_id in user_ids:
+                calls.append(
+                    self.outbound.submit(
+                        Priority.LOW,
+                        route,
+                        functools.partial(message.remove_reaction, emoji, discord.Object(id=user_id)),
+                    )
+                )
+        for result in await asyncio.gather(*calls, return_exceptions=True):
+            if isinstance(result, Exception) and not isinstance(result, discord.HTTPException):
+                logger.warning("リアクションの削除に失敗しました: %r", result)
+
+    async def _clear_and_restore(self, message: discord.PartialMessage, route: Tuple[str, int], emoji: str) -> None:
+        await self.outbound.submit(Priority.LOW, route, functools.partial(message.clear_reaction, emoji))
+        if emoji in BOT_REACTIONS:
+            await self.outbound.submit(Priority.NORMAL, route, functools.partial(message.add_reaction, emoji))
+
+    async def _respond(self, interaction: discord.Interaction, *args: Any, **kwargs: Any) -> Any:
+        """インタラクションへの応答を送信キューを通さずに送る。
+
+        応答はインタラクションごとのトークンで送られ、Bot のレート制限のバケットを共有しないので、
+        Embed の編集などの後ろに並べず 3 秒の期限内に返す。
+        """
+        return await self.outbound.send_now(
+            ("interaction", interaction.id),
+            functools.partial(interaction.response.send_message, *args, **kwargs),
+        )
+
+    async def _followup(self, interaction: discord.Interaction, *args: Any, **kwargs: Any) -> Any:
+        return await self.outbound.send_now(
+            ("interaction", interaction.id),
+            functools.partial(interaction.followup.send, *args, **kwargs),
+        )
 
-    async def _format_entries(
+    async def _send(
         self,
-        guild_id: int,
-        entries: Sequence[ParticipantEntry],
+        channel: discord.abc.Messageable,
+        content: Optional[str],
         *,
-        include_order: bool,
-        start_index: int = 1,
-    ) -> List[str]:
-        user_entries = [entry for entry in entries if not entry.is_dummy and entry.user_id is not None]
-        mentions_map: Dict[int, str] = {}
-        if user_entries:
-            user_ids = [entry.user_id for entry in user_entries if entry.user_id is not None]
-            mentions = await self._resolve_display_mentions(guild_id, user_ids)
-            for entry, mention in zip(user_entries, mentions):
-                if entry.user_id is not None:
-                    mentions_map[entry.user_id] = mention
-
-        formatted: List[str] = []
-        for index, entry in enumerate(entries):
-            if entry.is_dummy:
-                display = entry.label
-            elif entry.user_id is not None:
-                display = mentions_map.get(entry.user_id, f"<@{entry.user_id}>")
-            else:
-                display = entry.label
+        priority: Priority = Priority.NORMAL,
+        **kwargs: Any,
+    ) -> discord.Message:
+        """チャンネルへの送信を送信キューに積み、完了まで待つ。"""
+        return await self.outbound.submit(
+            priority,
+            ("send", getattr(channel, "id", None)),
+            functools.partial(channel.send, content, **kwargs),
+        )
 
-            if include_order:
-                prefix = f"{start_index + index}. "
-                formatted.append(f"{prefix}{display}")
-            else:
-                formatted.append(display)
-        return formatted
+    def _partial_message(
+        self,
+        channel_id: int,
+        message_id: int,
+        guild_id: Optional[int] = None,
+    ) -> discord.PartialMessage:
+        """fetch せずに編集・リアクション操作ができるメッセージハンドルを返す。"""
+        channel = self.bot.get_partial_messageable(channel_id, guild_id=guild_id)
+        return channel.get_partial_message(message_id)
 
     async def _resolve_display_mentions(self, guild_id: int, user_ids: Sequence[int]) -> List[str]:
+        members = await self._resolve_members(guild_id, user_ids)
+        return [members[user_id].mention for user_id in user_ids]
+
+    @instrumented("resolve_members")
+    async def _resolve_members(self, guild_id: int, user_ids: Iterable[int]) -> Dict[int, CachedMember]:
+        """メンバー情報を索引・キャッシュから解決し、どちらにもないものだけを並行して REST で取得する。"""
         guild = self.bot.get_guild(guild_id)
-        mentions: List[str] = []
-
-        # 事前にすべてのユーザー情報を fetch してキャッシュに保存
-        for user_id in user_ids:
-            if guild is not None:
-                try:
-                    # ギルドメンバーとして fetch（キャッシュに保存される）
-                    await guild.fetch_member(user_id)
-                except discord.HTTPException:
-                    # ギルドメンバーでない場合は、ユーザー情報のみ fetch
-                    try:
-                        await self.bot.fetch_user(user_id)
-                    except discord.HTTPException:
-                        pass
-
-        # キャッシュから取得してメンションを生成
-        for user_id in user_ids:
-            mention: Optional[str] = None
-
-            if guild is not None:
-                member = guild.get_member(user_id)
-                if member is not None:
-                    mention = member.mention
-
-            if mention is None:
-                user = self.bot.get_user(user_id)
-                if user is not None:
-                    mention = getattr(user, "mention", None)
-                    if mention is None:
-                        mention = f"<@{user_id}>"
-
-            mentions.append(mention or f"<@{user_id}>")
-
-        return mentions
+        resolved: Dict[int, CachedMember] = {}
+        missing: List[int] = []
+
+        for user_id in dict.fromkeys(user_ids):
+            # ゲートウェイで維持している索引にいれば REST もキャッシュも不要
+            indexed = self.member_index.get(guild_id, user_id)
+            if indexed is not None:
+                resolved[user_id] = indexed
+                continue
 
-    @staticmethod
-    def _find_participant_field_index(fields: Sequence[discord.EmbedField]) -> Optional[int]:
-        for index, field in enumerate(fields):
-            if field.name == "参加者":
-                return index
-        return None
+            cached = self.member_cache.get(guild_id, user_id)
+            if cached is not None:
+                resolved[user_id] = cached
+                continue
 
-    @staticmethod
-    def _is_tracked_emoji(emoji: discord.PartialEmoji, target: str) -> bool:
-        if target is None:
-            return False
-        if emoji.id is not None:
-            return False
-        return emoji.name == target
+            # ゲートウェイ由来の discord.py 内部キャッシュにあれば REST は不要
+            member = guild.get_member(user_id) if guild is not None else None
+            if member is not None:
+                cached = CachedMember.from_member(member)
+                self.member_cache.put(guild_id, user_id, cached)
+                resolved[user_id] = cached
+            else:
+                missing.append(user_id)
 
-    @staticmethod
-    def _set_embed_field(
-        embed: discord.Embed,
-        name: str,
-        names: Sequence[str],
-        *,
-        empty_value: str = "未割り当て",
-        remove_if_empty: bool = False,
-        joiner: str = "\n",
-    ) -> None:
-        has_values = bool(names)
-        if not has_values and remove_if_empty:
-            index_list = [index for index, field in enumerate(embed.fields) if field.name == name]
-            if index_list:
-                embed.remove_field(index_list[0])
-            return
+        if missing:
+            # 同時に発行する REST は fetch_semaphore で制限する
+            fetched = await asyncio.gather(*(self._fetch_member(guild, user_id) for user_id in missing))
+            for user_id, cached in zip(missing, fetched):
+                self.member_cache.put(guild_id, user_id, cached)
+                resolved[user_id] = cached
 
-        value = joiner.join(names) if has_values else empty_value
-        field_indices = [index for index, field in enumerate(embed.fields) if field.name == name]
-        if field_indices:
-            embed.set_field_at(field_indices[0], name=name, value=value, inline=False)
-        else:
-            embed.add_field(name=name, value=value, inline=False)
+        return resolved
 
-    @staticmethod
-    def _remove_field(embed: discord.Embed, name: str) -> None:
-        index_list = [index for index, field in enumerate(embed.fields) if field.name == name]
-        if index_list:
-            embed.remove_field(index_list[0])
+    @traced("fetch_member")
+    async def _fetch_member(self, guild: Optional[discord.Guild], user_id: int) -> CachedMember:
+        async with self._fetch_semaphore:
+            return await self._fetch_member_unbounded(guild, user_id)
 
-    @staticmethod
-    def _reorder_fields(embed: discord.Embed, order: Sequence[str]) -> None:
-        field_map = {field.name: field for field in embed.fields}
-        embed.clear_fields()
-        for name in order:
-            field = field_map.get(name)
-            if field is not None:
-                embed.add_field(name=field.name, value=field.value, inline=field.inline)
+    async def _fetch_member_unbounded(self, guild: Optional[discord.Guild], user_id: int) -> CachedMember:
+        if guild is not None:
+            try:
+                member = await self.outbound.send_now(
+                    ("member", guild.id),
+                    functools.partial(guild.fetch_member, user_id),
+                )
+                return CachedMember.from_member(member)
+            except discord.HTTPException:
+                pass
 
+        # ギルドメンバーでない場合は、ユーザー情報のみ取得
+        user = self.bot.get_user(user_id)
+        if user is None:
+            try:
+                user = await self.outbound.send_now(("user", user_id), functools.partial(self.bot.fetch_user, user_id))
+            except discord.HTTPException:
+                return CachedMember.placeholder(user_id)
+        return CachedMember.from_member(user, partial=True)
+
+    @commands.Cog.listener(name="on_guild_available")
+    async def on_guild_available(self, guild: discord.Guild) -> None:
+        # 起動時のチャンク取得が済んでいればそのメンバー一覧を使い、済んでいなければ 1 回だけ要求する
+        members = guild.members if guild.chunked else await guild.chunk()
+        self.member_index.load(guild.id, members)
+        logger.info("ギルド %s のメンバー索引を作成しました（%d 名）。", guild.id, len(members))
+
+    @commands.Cog.listener(name="on_guild_join")
+    async def on_guild_join(self, guild: discord.Guild) -> None:
+        await self.on_guild_available(guild)
+
+    @commands.Cog.listener(name="on_guild_unavailable")
+    async def on_guild_unavailable(self, guild: discord.Guild) -> None:
+        self.member_index.drop_guild(guild.id)
+
+    @commands.Cog.listener(name="on_guild_remove")
+    async def on_guild_remove(self, guild: discord.Guild) -> None:
+        self.member_index.drop_guild(guild.id)
+        self.member_cache.invalidate_guild(guild.id)
+
+    @commands.Cog.listener(name="on_member_join")
+    async def on_member_join(self, member: discord.Member) -> None:
+        self.member_index.upsert(member.guild.id, member)
+        self.member_cache.put(member.guild.id, member.id, CachedMember.from_member(member))
+        self._weights.pop((member.guild.id, member.id), None)
+
+    @commands.Cog.listener(name="on_member_update")
+    async def on_member_update(self, before: discord.Member, after: discord.Member) -> None:
+        self.member_index.upsert(after.guild.id, after)
+        cached = CachedMember.from_member(after)
+        self.member_cache.put(after.guild.id, after.id, cached)
+        # 重みに関係するロールが変わったときだけ記憶した重みを捨てる
+        before_roles = CachedMember.from_member(before).role_ids & WEIGHT_ROLE_IDS
+        if before_roles != cached.role_ids & WEIGHT_ROLE_IDS:
+            self._weights.pop((after.guild.id, after.id), None)
+
+    @commands.Cog.listener(name="on_member_remove")
+    async def on_member_remove(self, member: discord.Member) -> None:
+        self.member_index.remove(member.guild.id, member.id)
+        self.member_cache.invalidate(member.guild.id, member.id)
+        self._weights.pop((member.guild.id, member.id), None)
+
+    @traced("with_weights")
     async def _with_weights(
         self,
         entries: Sequence[ParticipantEntry],
         guild_id: int,
     ) -> List[WeightedEntry]:
-        weighted: List[WeightedEntry] = []
-        guild = self.bot.get_guild(guild_id)
-
-        async def resolve_weight(user_id: Optional[int]) -> int:
-            if user_id is None:
-                return 1
-            member = None
-            if guild is not None:
-                member = guild.get_member(user_id)
-                if member is None:
-                    try:
-                        member = await guild.fetch_member(user_id)
-                    except discord.HTTPException:
-                        member = None
-            if member is None:
-                return 1
-            role_ids = {role.id for role in member.roles}
-            if 1280186048395218995 in role_ids:
-                return 4
-            if 1280186025762750583 in role_ids:
-                return 3
-            if 1280185996184522927 in role_ids:
-                return 2
-            return 1
-
-        for entry in entries:
-            weight = await resolve_weight(entry.user_id)
-            weighted.append(WeightedEntry(entry=entry, weight=weight))
-        return weighted
-
-    @staticmethod
-    def _balanced_split(entries: Sequence[WeightedEntry]) -> Tuple[List[WeightedEntry], List[WeightedEntry]]:
-        team_one: List[WeightedEntry] = []
-        team_two: List[WeightedEntry] = []
-        weight_one = 0
-        weight_two = 0
-
-        sorted_entries = sorted(
-            entries,
-            key=lambda item: (item.weight, random.random()),
-            reverse=True,
-        )
-
-        for entry in sorted_entries:
-            weight = entry.weight
-            if weight_one <= weight_two:
-                team_one.append(entry)
-                weight_one += weight
+        """参加者の重みを求める。記憶済みの重みを使い、残りのメンバーだけをまとめて解決する。"""
+        weights: Dict[int, int] = {}
+        missing: List[int] = []
+        for user_id in dict.fromkeys(entry.user_id for entry in entries if entry.user_id is not None):
+            key = (guild_id, user_id)
+            weight = self._weights.get(key)
+            if weight is None:
+                missing.append(user_id)
             else:
-                team_two.append(entry)
-                weight_two += weight
-
-        return team_one, team_two
+                self._weights.move_to_end(key)
+                weights[user_id] = weight
+        self.weight_hits += len(weights)
+        self.weight_misses += len(missing)
+
+        if missing:
+            members = await self._resolve_members(guild_id, missing)
+            for user_id in missing:
+                member = members[user_id]
+                weight = role_weight(member.role_ids)
+                weights[user_id] = weight
+                # ロールが分からないメンバーの重みは記憶せず、メンバー情報のキャッシュが切れたら取り直す
+                if not member.partial:
+                    self._remember_weight(guild_id, user_id, weight)
+
+        return [
+            WeightedEntry(
+                entry=entry,
+                weight=weights[entry.user_id] if entry.user_id is not None else DEFAULT_WEIGHT,
+            )
+            for entry in entries
+        ]
 
-    @staticmethod
-    def _auto_balance_sizes(
-        team_one: List[WeightedEntry],
-        team_two: List[WeightedEntry],
-    ) -> Tuple[List[WeightedEntry], List[WeightedEntry]]:
-        while abs(len(team_one) - len(team_two)) > 0:
-            larger, smaller = (team_one, team_two) if len(team_one) > len(team_two) else (team_two, team_one)
-            if not larger:
-                break
-            candidate_index = min(range(len(larger)), key=lambda i: larger[i].weight)
-            candidate = larger.pop(candidate_index)
-            smaller.append(candidate)
-        return team_one, team_two
+    def _remember_weight(self, guild_id: int, user_id: int, weight: int) -> None:
+        self._weights[(guild_id, user_id)] = weight
+        while len(self._weights) > settings.member_cache_size:
+            self._weights.popitem(last=False)
 
 
 async def setup(bot: commands.Bot) -> None:
-    await bot.add_cog(BoManager(bot))
+    store: Optional[RecruitmentStore] = None
+    if settings.state_db_path:
+        store = SqliteRecruitmentStore(settings.state_db_path)
+    state: Optional[RecruitmentState] = None
+    if settings.state_redis_url:
+        state = RedisRecruitmentState(
+            RespClient.from_url(settings.state_redis_url),
+            ttl=settings.recruitment_idle_ttl,
+        )
+    await bot.add_cog(BoManager(bot, store=store, state=state))
 
 
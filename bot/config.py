@@ -4,7 +4,7 @@ from __future__ import annotations
 
 from dataclasses import dataclass
 import os
-from typing import Optional
+from typing import Optional, Tuple
 
 from dotenv import load_dotenv
 
@@ -16,6 +16,65 @@ class Settings:
     token: str
     command_prefix: str = "!"
     guild_id: Optional[int] = None
+    member_cache_ttl: float = 600.0
+    member_cache_size: int = 5000
+    member_fetch_concurrency: int = 4
+    outbound_concurrency: int = 8
+    max_ratelimit_timeout: Optional[float] = 30.0
+    outbound_max_retry_wait: float = 300.0
+    render_delay: float = 0.3
+    state_db_path: Optional[str] = None
+    state_redis_url: Optional[str] = None
+    state_flush_interval: float = 1.0
+    max_tracked_messages: int = 2000
+    recruitment_idle_ttl: float = 6 * 60 * 60
+    archive_size: int = 1000
+    retention_sweep_interval: float = 300.0
+    auto_close_idle: float = 3 * 60 * 60
+    auto_close_max_age: float = 12 * 60 * 60
+    team_balance_weight: float = 1.0
+    team_repeat_weight: float = 0.25
+    team_spread_weight: float = 0.25
+    team_history_games: int = 5
+    partition_time_budget: float = 0.2
+    partition_workers: int = 1
+    metrics_port: Optional[int] = None
+    trace_slow_ms: float = 1000.0
+    metrics_host: str = "0.0.0.0"
+    sharded: bool = False
+    shard_count: Optional[int] = None
+    shard_ids: Optional[Tuple[int, ...]] = None
+
+
+def _int_env(name: str, default: int) -> int:
+    raw = os.getenv(name, "").strip()
+    return int(raw) if raw.isdigit() else default
+
+
+def _float_env(name: str, default: float) -> float:
+    raw = os.getenv(name, "").strip()
+    try:
+        return float(raw) if raw else default
+    except ValueError:
+        return default
+
+
+def _shard_ids_env(name: str) -> Optional[Tuple[int, ...]]:
+    """``0,1,2`` や ``0-3`` の形式でシャードIDを読み込む。"""
+    raw = os.getenv(name, "").strip()
+    if not raw:
+        return None
+    shard_ids = set()
+    for part in raw.split(","):
+        part = part.strip()
+        start, sep, end = part.partition("-")
+        if sep and start.strip().isdigit() and end.strip().isdigit():
+            shard_ids.update(range(int(start), int(end) + 1))
+        elif part.isdigit():
+            shard_ids.add(int(part))
+        else:
+            raise RuntimeError(f"環境変数 {name} の形式が正しくありません: {raw}")
+    return tuple(sorted(shard_ids))
 
 
 def load_settings() -> Settings:
@@ -31,10 +90,78 @@ def load_settings() -> Settings:
     guild_id_raw = os.getenv("DISCORD_GUILD_ID", "").strip()
     guild_id = int(guild_id_raw) if guild_id_raw.isdigit() else None
 
+    member_cache_ttl = _float_env("DISCORD_MEMBER_CACHE_TTL", 600.0)
+    member_cache_size = _int_env("DISCORD_MEMBER_CACHE_SIZE", 5000)
+    member_fetch_concurrency = _int_env("DISCORD_MEMBER_FETCH_CONCURRENCY", 4)
+    outbound_concurrency = _int_env("DISCORD_OUTBOUND_CONCURRENCY", 8)
+    # これを超える待ち時間の 429 は discord.py が待たずに送信キューへ返す（0 で常に discord.py が待つ）
+    max_ratelimit_timeout = _float_env("DISCORD_MAX_RATELIMIT_TIMEOUT", 30.0) or None
+    outbound_max_retry_wait = _float_env("DISCORD_OUTBOUND_MAX_RETRY_WAIT", 300.0)
+    render_delay = _float_env("DISCORD_RENDER_DELAY", 0.3)
+    state_db_path = os.getenv("DISCORD_STATE_DB", "").strip() or None
+    state_redis_url = os.getenv("DISCORD_STATE_REDIS_URL", "").strip() or None
+    state_flush_interval = _float_env("DISCORD_STATE_FLUSH_INTERVAL", 1.0)
+    max_tracked_messages = _int_env("DISCORD_MAX_TRACKED_MESSAGES", 2000)
+    recruitment_idle_ttl = _float_env("DISCORD_RECRUITMENT_IDLE_TTL", 6 * 60 * 60)
+    archive_size = _int_env("DISCORD_ARCHIVE_SIZE", 1000)
+    retention_sweep_interval = _float_env("DISCORD_RETENTION_SWEEP_INTERVAL", 300.0)
+    auto_close_idle = _float_env("DISCORD_AUTO_CLOSE_IDLE", 3 * 60 * 60)
+    auto_close_max_age = _float_env("DISCORD_AUTO_CLOSE_MAX_AGE", 12 * 60 * 60)
+    team_balance_weight = _float_env("DISCORD_TEAM_BALANCE_WEIGHT", 1.0)
+    team_repeat_weight = _float_env("DISCORD_TEAM_REPEAT_WEIGHT", 0.25)
+    team_spread_weight = _float_env("DISCORD_TEAM_SPREAD_WEIGHT", 0.25)
+    team_history_games = _int_env("DISCORD_TEAM_HISTORY_GAMES", 5)
+    partition_time_budget = _float_env("DISCORD_PARTITION_TIME_BUDGET", 0.2)
+    partition_workers = _int_env("DISCORD_PARTITION_WORKERS", 1)
+
+    metrics_port_raw = os.getenv("DISCORD_METRICS_PORT", "").strip()
+    metrics_port = int(metrics_port_raw) if metrics_port_raw.isdigit() else None
+    metrics_host = os.getenv("DISCORD_METRICS_HOST", "").strip() or "0.0.0.0"
+    trace_slow_ms = _float_env("DISCORD_TRACE_SLOW_MS", 1000.0)
+
+    # DISCORD_SHARD_COUNT=auto で推奨シャード数による自動シャーディング、数値でシャード数を固定する
+    shard_count_raw = os.getenv("DISCORD_SHARD_COUNT", "").strip().lower()
+    shard_count = int(shard_count_raw) if shard_count_raw.isdigit() else None
+    shard_ids = _shard_ids_env("DISCORD_SHARD_IDS")
+    if shard_ids is not None:
+        if shard_count is None:
+            raise RuntimeError("DISCORD_SHARD_IDS を使う場合は DISCORD_SHARD_COUNT にシャード数を指定してください。")
+        if shard_ids[-1] >= shard_count:
+            raise RuntimeError("DISCORD_SHARD_IDS には DISCORD_SHARD_COUNT 未満のシャードIDを指定してください。")
+    sharded = shard_count_raw == "auto" or shard_count is not None
+
     return Settings(
         token=token,
         command_prefix=command_prefix,
         guild_id=guild_id,
+        member_cache_ttl=member_cache_ttl,
+        member_cache_size=member_cache_size,
+        member_fetch_concurrency=member_fetch_concurrency,
+        outbound_concurrency=outbound_concurrency,
+        max_ratelimit_timeout=max_ratelimit_timeout,
+        outbound_max_retry_wait=outbound_max_retry_wait,
+        render_delay=render_delay,
+        state_db_path=state_db_path,
+        state_redis_url=state_redis_url,
+        state_flush_interval=state_flush_interval,
+        max_tracked_messages=max_tracked_messages,
+        recruitment_idle_ttl=recruitment_idle_ttl,
+        archive_size=archive_size,
+        retention_sweep_interval=retention_sweep_interval,
+        auto_close_idle=auto_close_idle,
+        auto_close_max_age=auto_close_max_age,
+        team_balance_weight=team_balance_weight,
+        team_repeat_weight=team_repeat_weight,
+        team_spread_weight=team_spread_weight,
+        team_history_games=team_history_games,
+        partition_time_budget=partition_time_budget,
+        partition_workers=partition_workers,
+        metrics_port=metrics_port,
+        metrics_host=metrics_host,
+        trace_slow_ms=trace_slow_ms,
+        sharded=sharded,
+        shard_count=shard_count,
+        shard_ids=shard_ids,
     )
 
 
@@ -0,0 +1,100 @@
+"""多数の期限を 1 つのヒープと 1 つのタスクで管理するスケジューラ。"""
+
+from __future__ import annotations
+
+import asyncio
+import heapq
+import logging
+import time
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class DeadlineScheduler:
+    """キーごとの期限を管理し、期限が来たら ``callback(key)`` を呼ぶ。
+
+    期限の変更・取り消しはヒープを直接いじらず、``_deadlines`` に最新の期限だけを持つ。
+    古いヒープ要素は取り出し時に読み捨て、一定量たまったらヒープを作り直すので
+    1 キーあたりのメモリは定数に収まる。
+    """
+
+    def __init__(
+        self,
+        callback: Callable[[int], Awaitable[None]],
+        *,
+        clock: Callable[[], float] = time.time,
+    ) -> None:
+        self._callback = callback
+        self._clock = clock
+        self._heap: List[Tuple[float, int]] = []
+        self._deadlines: Dict[int, float] = {}
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task[None]] = None
+
+    def __len__(self) -> int:
+        return len(self._deadlines)
+
+    def schedule(self, key: int, deadline: float) -> None:
+        """期限を設定する（既に設定済みなら置き換える）。"""
+        previous = self._deadlines.get(key)
+        if previous == deadline:
+            return
+        self._deadlines[key] = deadline
+        heapq.heappush(self._heap, (deadline, key))
+        if len(self._heap) > 2 * len(self._deadlines) + 64:
+            self._compact()
+        if self._heap[0] == (deadline, key):
+            self._wakeup.set()
+
+    def cancel(self, key: int) -> None:
+        self._deadlines.pop(key, None)
+
+    def deadline_of(self, key: int) -> Optional[float]:
+        return self._deadlines.get(key)
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    def close(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        self._heap.clear()
+        self._deadlines.clear()
+
+    def _compact(self) -> None:
+        self._heap = [(deadline, key) for key, deadline in self._deadlines.items()]
+        heapq.heapify(self._heap)
+
+    def _pop_due(self, now: float) -> Optional[int]:
+        while self._heap:
+            deadline, key = self._heap[0]
+            if self._deadlines.get(key) != deadline:
+                # 取り消し済み・置き換え済みの要素
+                heapq.heappop(self._heap)
+                continue
+            if deadline > now:
+                return None
+            heapq.heappop(self._heap)
+            del self._deadlines[key]
+            return key
+        return None
+
+    async def _run(self) -> None:
+        while True:
+            key = self._pop_due(self._clock())
+            if key is not None:
+                try:
+                    await self._callback(key)
+                except Exception:
+                    logger.exception("期限処理 %s に失敗しました。", key)
+                continue
+
+            self._wakeup.clear()
+            timeout = self._heap[0][0] - self._clock() if self._heap else None
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
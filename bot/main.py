@@ -4,6 +4,7 @@ from __future__ import annotations
 
 import asyncio
 import logging
+from typing import Optional
 
 try:
     import discord
@@ -15,10 +16,16 @@ except ModuleNotFoundError as exc:
     ) from exc
 
 from .config import settings
+from .metrics import MetricsServer, registry
+from .outbound import http_rate_limits
+from .tracing import install_log_record_factory, tracer
 
+# ログには処理中のイベントのトレースIDを含める
+install_log_record_factory()
+tracer.configure(slow_threshold=settings.trace_slow_ms / 1000)
 logging.basicConfig(
     level=logging.INFO,
-    format="%(asctime)s %(levelname)s %(name)s %(message)s",
+    format="%(asctime)s %(levelname)s %(name)s [%(trace_id)s] %(message)s",
 )
 logger = logging.getLogger(__name__)
 
@@ -26,13 +33,20 @@ logger = logging.getLogger(__name__)
 COMMAND_EXTENSIONS = (
     "bot.commands.ping",
     "bot.commands.bo",
+    "bot.commands.admin",
 )
 
 
 class Civ6MatcherBot(commands.Bot):
     """civ6matcher 向けの Bot クラス。"""
 
+    metrics_server: Optional[MetricsServer] = None
+
     async def setup_hook(self) -> None:
+        if settings.metrics_port is not None:
+            self.metrics_server = MetricsServer(registry, host=settings.metrics_host, port=settings.metrics_port)
+            await self.metrics_server.start()
+
         for extension in COMMAND_EXTENSIONS:
             await self.load_extension(extension)
             logger.info("拡張機能 %s を読み込みました。", extension)
@@ -45,14 +59,42 @@ class Civ6MatcherBot(commands.Bot):
             await self.tree.sync()
             logger.info("スラッシュコマンドを全体に同期しました。")
 
+    async def close(self) -> None:
+        if self.metrics_server is not None:
+            await self.metrics_server.close()
+            self.metrics_server = None
+        await super().close()
+
+
+class ShardedCiv6MatcherBot(Civ6MatcherBot, commands.AutoShardedBot):
+    """複数のシャード（ゲートウェイ接続）を 1 プロセスで扱う Bot クラス。"""
+
 
 def create_bot() -> Civ6MatcherBot:
     intents = discord.Intents.default()
     intents.message_content = True
     intents.members = True  # Server Members Intent を有効化
+    if settings.sharded:
+        # シャード数が未指定なら Discord の推奨値を使い、シャードIDが未指定なら全シャードに接続する
+        bot: Civ6MatcherBot = ShardedCiv6MatcherBot(
+            command_prefix=settings.command_prefix,
+            intents=intents,
+            max_ratelimit_timeout=settings.max_ratelimit_timeout,
+            http_trace=http_rate_limits.trace_config(),
+            shard_count=settings.shard_count,
+            shard_ids=list(settings.shard_ids) if settings.shard_ids is not None else None,
+        )
+        logger.info(
+            "シャード %s / %s で起動します。",
+            settings.shard_ids if settings.shard_ids is not None else "すべて",
+            settings.shard_count or "自動",
+        )
+        return bot
     bot = Civ6MatcherBot(
         command_prefix=settings.command_prefix,
         intents=intents,
+        max_ratelimit_timeout=settings.max_ratelimit_timeout,
+        http_trace=http_rate_limits.trace_config(),
     )
     return bot
 
@@ -0,0 +1,102 @@
+"""ギルドメンバー情報（メンション・ロール）の TTL/LRU キャッシュ。"""
+
+from __future__ import annotations
+
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, FrozenSet, Optional, Tuple
+
+
+@dataclass(frozen=True)
+class CachedMember:
+    mention: str
+    role_ids: FrozenSet[int] = frozenset()
+    # True ならギルドメンバーとして取得できておらず、ロールが分からない
+    partial: bool = False
+
+    @classmethod
+    def from_member(cls, member: Any, *, partial: bool = False) -> "CachedMember":
+        """discord.Member / discord.User からキャッシュ用のレコードを作成する。"""
+        roles = getattr(member, "roles", None) or ()
+        return cls(
+            mention=getattr(member, "mention", None) or f"<@{member.id}>",
+            role_ids=frozenset(role.id for role in roles),
+            partial=partial,
+        )
+
+    @classmethod
+    def placeholder(cls, user_id: int) -> "CachedMember":
+        """取得できなかったユーザー用のレコード（再取得の嵐を防ぐため負のキャッシュとして使う）。"""
+        return cls(mention=f"<@{user_id}>", partial=True)
+
+
+class MemberCache:
+    """(ギルドID, ユーザーID) をキーにしたメンバー情報キャッシュ。
+
+    エントリは ``ttl`` 秒で失効し、``max_size`` を超えると最も古く参照されたものから削除される。
+    """
+
+    def __init__(
+        self,
+        *,
+        ttl: float = 600.0,
+        max_size: int = 5000,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.ttl = ttl
+        self.max_size = max_size
+        self._clock = clock
+        self._entries: "OrderedDict[Tuple[int, int], Tuple[float, CachedMember]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, guild_id: int, user_id: int) -> Optional[CachedMember]:
+        key = (guild_id, user_id)
+        item = self._entries.get(key)
+        if item is None:
+            self.misses += 1
+            return None
+
+        expires_at, member = item
+        if expires_at <= self._clock():
+            del self._entries[key]
+            self.misses += 1
+            return None
+
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return member
+
+    def put(self, guild_id: int, user_id: int, member: CachedMember) -> None:
+        key = (guild_id, user_id)
+        self._entries[key] = (self._clock() + self.ttl, member)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def invalidate(self, guild_id: int, user_id: int) -> None:
+        self._entries.pop((guild_id, user_id), None)
+
+    def invalidate_guild(self, guild_id: int) -> None:
+        for key in [key for key in self._entries if key[0] == guild_id]:
+            del self._entries[key]
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+    def stats(self) -> Dict[str, float]:
+        """ヒット数・ミス数などの統計値を返す。"""
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
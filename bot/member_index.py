@@ -0,0 +1,77 @@
+"""ゲートウェイのイベントから組み立てるギルドメンバーの索引。"""
+
+from __future__ import annotations
+
+from typing import Any, Dict, FrozenSet, Iterable, Optional
+
+from .member_cache import CachedMember
+
+
+class MemberIndex:
+    """ギルドごとに「メンバーID → 追跡対象ロール」を保持する索引。
+
+    ``on_guild_available`` でメンバー一覧を一度読み込み、以降はメンバーの参加・更新・退出イベントで
+    差分だけを反映する。ロールは ``tracked_roles`` に含まれるものだけを残し、同じ組み合わせの
+    frozenset は共有するので、大きなギルドでも 1 メンバーあたり辞書の 1 要素分に収まる。
+    メンションは ``<@ID>`` から組み立てられるので保持しない。
+    """
+
+    def __init__(self, tracked_roles: Iterable[int]) -> None:
+        self.tracked_roles = frozenset(tracked_roles)
+        self._guilds: Dict[int, Dict[int, FrozenSet[int]]] = {}
+        self._role_sets: Dict[FrozenSet[int], FrozenSet[int]] = {}
+
+    def __len__(self) -> int:
+        return sum(len(members) for members in self._guilds.values())
+
+    def load(self, guild_id: int, members: Iterable[Any]) -> None:
+        """ギルドのメンバー一覧で索引を作り直す。"""
+        self._guilds[guild_id] = {member.id: self._roles_of(member) for member in members}
+
+    def is_loaded(self, guild_id: int) -> bool:
+        return guild_id in self._guilds
+
+    def upsert(self, guild_id: int, member: Any) -> bool:
+        """メンバーを追加・更新し、追跡対象ロールが変わったかを返す（未読み込みのギルドは無視する）。"""
+        members = self._guilds.get(guild_id)
+        if members is None:
+            return False
+        roles = self._roles_of(member)
+        previous = members.get(member.id)
+        members[member.id] = roles
+        return previous is not roles
+
+    def remove(self, guild_id: int, user_id: int) -> None:
+        members = self._guilds.get(guild_id)
+        if members is not None:
+            members.pop(user_id, None)
+
+    def drop_guild(self, guild_id: int) -> None:
+        self._guilds.pop(guild_id, None)
+
+    def get(self, guild_id: int, user_id: int) -> Optional[CachedMember]:
+        members = self._guilds.get(guild_id)
+        if members is None:
+            return None
+        roles = members.get(user_id)
+        if roles is None:
+            return None
+        return CachedMember(mention=f"<@{user_id}>", role_ids=roles)
+
+    def clear(self) -> None:
+        self._guilds.clear()
+        self._role_sets.clear()
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "guilds": len(self._guilds),
+            "members": len(self),
+            "role_sets": len(self._role_sets),
+        }
+
+    def _roles_of(self, member: Any) -> FrozenSet[int]:
+        roles = frozenset(
+            role.id for role in getattr(member, "roles", None) or () if role.id in self.tracked_roles
+        )
+        # 同じロールの組み合わせは 1 つの frozenset を共有する
+        return self._role_sets.setdefault(roles, roles)
@@ -0,0 +1,211 @@
+"""Prometheus のテキスト形式でメトリクスを公開する軽量な実装。"""
+
+from __future__ import annotations
+
+import functools
+import logging
+import time
+from bisect import bisect_left
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional, Sequence, Tuple, TypeVar
+
+from aiohttp import web
+
+logger = logging.getLogger(__name__)
+
+LabelValues = Tuple[str, ...]
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+T = TypeVar("T")
+
+
+@dataclass
+class MetricFamily:
+    """収集時に組み立てるメトリクス。``samples`` は (接尾辞, ラベル, 値) の並び。"""
+
+    name: str
+    kind: str
+    help: str
+    samples: List[Tuple[str, Dict[str, str], float]] = field(default_factory=list)
+
+    def add(self, value: float, suffix: str = "", **labels: Any) -> None:
+        self.samples.append((suffix, {key: str(label) for key, label in labels.items()}, value))
+
+
+class Counter:
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()) -> None:
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, amount: float = 1.0, **labels: Any) -> None:
+        key = _label_values(self.labelnames, labels)
+        self._values[key] = self._values.get(key, 0.0) + amount
+
+    def collect(self) -> MetricFamily:
+        family = MetricFamily(self.name, "counter", self.help)
+        for key, value in self._values.items():
+            family.add(value, "_total", **dict(zip(self.labelnames, key)))
+        return family
+
+
+class Histogram:
+    """累積バケットのヒストグラム。ラベルの組ごとにバケットの件数・合計・件数を持つ。"""
+
+    def __init__(
+        self,
+        name: str,
+        help: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ) -> None:
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._series: Dict[LabelValues, Tuple[List[int], List[float]]] = {}
+
+    def observe(self, value: float, **labels: Any) -> None:
+        key = _label_values(self.labelnames, labels)
+        series = self._series.get(key)
+        if series is None:
+            # バケットごとの件数（最後は +Inf）と、[合計, 件数]
+            series = self._series[key] = ([0] * (len(self.buckets) + 1), [0.0, 0.0])
+        counts, totals = series
+        counts[bisect_left(self.buckets, value)] += 1
+        totals[0] += value
+        totals[1] += 1
+
+    def collect(self) -> MetricFamily:
+        family = MetricFamily(self.name, "histogram", self.help)
+        for key, (counts, (total, count)) in self._series.items():
+            labels = dict(zip(self.labelnames, key))
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                family.add(cumulative, "_bucket", **labels, le=_format_value(bound))
+            family.add(count, "_bucket", **labels, le="+Inf")
+            family.add(total, "_sum", **labels)
+            family.add(count, "_count", **labels)
+        return family
+
+
+class MetricsRegistry:
+    """メトリクスと、収集時に値を読み出す関数（コレクター）の登録先。"""
+
+    def __init__(self) -> None:
+        self._metrics: Dict[str, Any] = {}
+        self._collectors: Dict[str, Callable[[], Iterable[MetricFamily]]] = {}
+
+    def counter(self, name: str, help: str, labelnames: Sequence[str] = ()) -> Counter:
+        # 拡張機能を再読み込みしても同じ名前のメトリクスは作り直さない
+        metric = self._metrics.get(name)
+        if metric is None:
+            metric = self._metrics[name] = Counter(name, help, labelnames)
+        return metric
+
+    def histogram(
+        self,
+        name: str,
+        help: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ) -> Histogram:
+        metric = self._metrics.get(name)
+        if metric is None:
+            metric = self._metrics[name] = Histogram(name, help, labelnames, buckets)
+        return metric
+
+    def register_collector(self, name: str, collector: Callable[[], Iterable[MetricFamily]]) -> None:
+        self._collectors[name] = collector
+
+    def unregister_collector(self, name: str) -> None:
+        self._collectors.pop(name, None)
+
+    def collect(self) -> List[MetricFamily]:
+        families = [metric.collect() for metric in self._metrics.values()]
+        for name, collector in list(self._collectors.items()):
+            try:
+                families.extend(collector())
+            except Exception:
+                logger.exception("メトリクス %s の収集に失敗しました。", name)
+        return families
+
+    def render(self) -> str:
+        """Prometheus のテキスト形式（0.0.4）で出力する。"""
+        lines: List[str] = []
+        for family in self.collect():
+            lines.append(f"# HELP {family.name} {family.help}")
+            lines.append(f"# TYPE {family.name} {family.kind}")
+            for suffix, labels, value in family.samples:
+                lines.append(f"{family.name}{suffix}{_format_labels(labels)} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+registry = MetricsRegistry()
+
+
+def timed(histogram: Histogram, **labels: Any) -> Callable[[Callable[..., Awaitable[T]]], Callable[..., Awaitable[T]]]:
+    """コルーチン関数の実行時間を ``histogram`` に記録するデコレーター。"""
+
+    def decorator(func: Callable[..., Awaitable[T]]) -> Callable[..., Awaitable[T]]:
+        @functools.wraps(func)
+        async def wrapper(*args: Any, **kwargs: Any) -> T:
+            started = time.perf_counter()
+            try:
+                return await func(*args, **kwargs)
+            finally:
+                histogram.observe(time.perf_counter() - started, **labels)
+
+        return wrapper
+
+    return decorator
+
+
+class MetricsServer:
+    """``/metrics`` を返す HTTP サーバー。Bot と同じイベントループで動かす。"""
+
+    def __init__(self, metrics: MetricsRegistry, *, host: str = "0.0.0.0", port: int = 9100) -> None:
+        self.metrics = metrics
+        self.host = host
+        self.port = port
+        self._runner: Optional[web.AppRunner] = None
+
+    async def start(self) -> None:
+        app = web.Application()
+        app.router.add_get("/metrics", self._handle_metrics)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, self.host, self.port).start()
+        logger.info("メトリクスを http://%s:%d/metrics で公開しました。", self.host, self.port)
+
+    async def close(self) -> None:
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+    async def _handle_metrics(self, request: web.Request) -> web.Response:
+        return web.Response(text=self.metrics.render(), content_type="text/plain", charset="utf-8")
+
+
+def _label_values(labelnames: Tuple[str, ...], labels: Dict[str, Any]) -> LabelValues:
+    return tuple(str(labels.get(name, "")) for name in labelnames)
+
+
+def _format_labels(labels: Dict[str, str]) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape(value)}"' for key, value in labels.items()) + "}"
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
@@ -0,0 +1,358 @@
+"""Discord への REST 呼び出しを優先度順に送り出すスケジューラ。"""
+
+from __future__ import annotations
+
+import asyncio
+import contextvars
+import enum
+import heapq
+import itertools
+import logging
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Deque, Dict, Hashable, List, Optional, Set, Tuple
+
+import aiohttp
+
+from . import tracing
+from .metrics import registry
+
+logger = logging.getLogger(__name__)
+
+REST_SECONDS = registry.histogram(
+    "civ6matcher_rest_seconds",
+    "REST 呼び出しの送信から応答までの時間（秒、ルートの種類別）",
+    ["route"],
+)
+OUTBOUND_WAIT_SECONDS = registry.histogram(
+    "civ6matcher_outbound_wait_seconds",
+    "REST 呼び出しが送信キューで待った時間（秒、優先度別）",
+    ["priority"],
+)
+
+
+class Priority(enum.IntEnum):
+    """小さいほど先に送る。"""
+
+    HIGH = 0  # Embed の編集
+    NORMAL = 1  # 通知メッセージ・リアクションの付与
+    LOW = 2  # リアクションの削除などの後片付け
+
+
+@dataclass(eq=False)
+class _Request:
+    priority: int
+    sequence: int
+    route: Hashable
+    call: Callable[[], Awaitable[Any]]
+    key: Optional[Hashable]
+    submitted_at: float
+    futures: List["asyncio.Future[Any]"] = field(default_factory=list)
+    started: bool = False
+    # レート制限で送り直しを待った秒数の合計
+    retry_wait: float = 0.0
+    # 呼び出し元のスパン。送信をその子スパンとして記録する
+    parent: Optional[tracing.Span] = None
+
+
+class OutboundScheduler:
+    """REST 呼び出しを優先度付きのキューに積み、``concurrency`` 本のワーカーで送り出す。
+
+    - 同じ ``route``（Discord のレート制限のバケットに対応するキー）の呼び出しは 1 件ずつ送り、
+      レート制限（``retry_after`` を持つ例外）を受けたルートは解除まで後回しにして他のルートを先に送る。
+      レート制限を受けた呼び出しは解除後に送り直し、待った秒数の合計が ``max_retry_wait`` を超えたときだけ失敗させる。
+    - 同じ ``key`` の呼び出しがまだ送られずに残っていれば、新しい呼び出しで置き換えて 1 回にまとめる
+      （置き換えられた側の呼び出し元も新しい呼び出しの結果を受け取る）。
+    """
+
+    def __init__(
+        self,
+        *,
+        concurrency: int = 8,
+        max_retry_wait: Optional[float] = None,
+        clock: Callable[[], float] = time.monotonic,
+        wait_samples: int = 1024,
+    ) -> None:
+        self.concurrency = concurrency
+        self.max_retry_wait = max_retry_wait
+        self._clock = clock
+        self._heap: List[Tuple[int, int, _Request]] = []
+        self._pending_keys: Dict[Hashable, _Request] = {}
+        self._busy_routes: Set[Hashable] = set()
+        self._blocked_until: Dict[Hashable, float] = {}
+        self._sequence = itertools.count()
+        self._changed = asyncio.Event()
+        self._workers: List[asyncio.Task[None]] = []
+        self._queued: Dict[int, int] = {priority: 0 for priority in Priority}
+        self._waits: Deque[float] = deque(maxlen=wait_samples)
+        self.submitted = 0
+        self.completed = 0
+        self.failed = 0
+        self.coalesced = 0
+        self.rate_limited = 0
+        # (ルートの種類, 結果) ごとの送信数と、レート制限でルートを止めた秒数の合計
+        self.outcomes: Dict[Tuple[str, str], int] = {}
+        self.rate_limit_wait = 0.0
+
+    def submit(
+        self,
+        priority: Priority,
+        route: Hashable,
+        call: Callable[[], Awaitable[Any]],
+        *,
+        key: Optional[Hashable] = None,
+    ) -> "asyncio.Future[Any]":
+        """呼び出しを予約し、結果を受け取る Future を返す。"""
+        self._ensure_workers()
+        future: "asyncio.Future[Any]" = asyncio.get_running_loop().create_future()
+        self.submitted += 1
+
+        existing = self._pending_keys.get(key) if key is not None else None
+        if existing is not None and not existing.started:
+            # 送信前の古い呼び出しは最新の内容で置き換える
+            existing.call = call
+            existing.futures.append(future)
+            self.coalesced += 1
+            if priority < existing.priority:
+                self._queued[existing.priority] -= 1
+                self._queued[priority] += 1
+                existing.priority = priority
+                heapq.heappush(self._heap, (priority, existing.sequence, existing))
+                self._changed.set()
+            return future
+
+        request = _Request(
+            priority=priority,
+            sequence=next(self._sequence),
+            route=route,
+            call=call,
+            key=key,
+            submitted_at=self._clock(),
+            futures=[future],
+            parent=tracing.current_span(),
+        )
+        if key is not None:
+            self._pending_keys[key] = request
+        self._queued[priority] += 1
+        heapq.heappush(self._heap, (priority, request.sequence, request))
+        self._changed.set()
+        return future
+
+    async def send_now(self, route: Hashable, call: Callable[[], Awaitable[Any]]) -> Any:
+        """キューを通さずにすぐ送る。送信数・結果は ``submit`` と同じく数える。
+
+        インタラクションへの応答のように、Bot のレート制限のバケットを共有せず、
+        期限内に返す必要がある呼び出しや、結果を待って処理を続ける取得系の呼び出しに使う。
+        """
+        self.submitted += 1
+        started = time.perf_counter()
+        try:
+            with tracing.span(f"rest.{route_kind(route)}", wait_ms=0.0):
+                result = await call()
+        except Exception as exc:
+            self.failed += 1
+            retry_after = getattr(exc, "retry_after", None)
+            self._count(route, "rate_limited" if isinstance(retry_after, (int, float)) and retry_after > 0 else "error")
+            raise
+        finally:
+            REST_SECONDS.observe(time.perf_counter() - started, route=route_kind(route))
+        self.completed += 1
+        self._count(route, "ok")
+        return result
+
+    def stats(self) -> Dict[str, float]:
+        """キューの長さ・待ち時間などの統計値を返す。"""
+        waits = sorted(self._waits)
+        stats: Dict[str, float] = {
+            "queued": sum(self._queued.values()),
+            "in_flight": len(self._busy_routes),
+            "blocked_routes": sum(1 for until in self._blocked_until.values() if until > self._clock()),
+            "submitted": self.submitted,
+            "completed": self.completed,
+            "failed": self.failed,
+            "coalesced": self.coalesced,
+            "rate_limited": self.rate_limited,
+            "wait_p50_ms": _percentile(waits, 0.5) * 1000,
+            "wait_p99_ms": _percentile(waits, 0.99) * 1000,
+            "wait_max_ms": (waits[-1] if waits else 0.0) * 1000,
+        }
+        for priority in Priority:
+            stats[f"queued_{priority.name.lower()}"] = self._queued[priority]
+        return stats
+
+    def close(self) -> None:
+        for task in self._workers:
+            task.cancel()
+        self._workers.clear()
+        for _, _, request in self._heap:
+            for future in request.futures:
+                if not future.done():
+                    future.cancel()
+        self._heap.clear()
+        self._pending_keys.clear()
+        self._busy_routes.clear()
+        self._blocked_until.clear()
+        self._queued = {priority: 0 for priority in Priority}
+
+    def _ensure_workers(self) -> None:
+        if not self._workers:
+            # ワーカーは最初に送信したイベントのトレースを引き継がないよう、空のコンテキストで動かす
+            self._workers = [
+                asyncio.create_task(self._work(), context=contextvars.Context())
+                for _ in range(max(self.concurrency, 1))
+            ]
+
+    def _pop_runnable(self, now: float) -> Tuple[Optional[_Request], Optional[float]]:
+        """送れる呼び出しのうち最も優先度の高いものを取り出す。なければ次に再確認する時刻を返す。"""
+        skipped: List[Tuple[int, int, _Request]] = []
+        found: Optional[_Request] = None
+        wake_at: Optional[float] = None
+        while self._heap:
+            item = heapq.heappop(self._heap)
+            priority, _, request = item
+            if request.started or priority != request.priority:
+                # 送信済み、または優先度を上げて積み直した古い要素
+                continue
+            if request.route in self._busy_routes:
+                skipped.append(item)
+                continue
+            blocked_until = self._blocked_until.get(request.route)
+            if blocked_until is not None:
+                if blocked_until > now:
+                    skipped.append(item)
+                    wake_at = blocked_until if wake_at is None else min(wake_at, blocked_until)
+                    continue
+                del self._blocked_until[request.route]
+            found = request
+            break
+        for item in skipped:
+            heapq.heappush(self._heap, item)
+        return found, wake_at
+
+    async def _work(self) -> None:
+        while True:
+            now = self._clock()
+            request, wake_at = self._pop_runnable(now)
+            if request is None:
+                self._changed.clear()
+                timeout = max(wake_at - now, 0.0) if wake_at is not None else None
+                try:
+                    await asyncio.wait_for(self._changed.wait(), timeout)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            await self._execute(request)
+
+    async def _execute(self, request: _Request) -> None:
+        request.started = True
+        self._queued[request.priority] -= 1
+        if request.key is not None and self._pending_keys.get(request.key) is request:
+            del self._pending_keys[request.key]
+        self._busy_routes.add(request.route)
+        wait = self._clock() - request.submitted_at
+        self._waits.append(wait)
+        OUTBOUND_WAIT_SECONDS.observe(wait, priority=Priority(request.priority).name.lower())
+        started = time.perf_counter()
+        try:
+            with tracing.child_span(request.parent, f"rest.{route_kind(request.route)}", wait_ms=round(wait * 1000, 1)):
+                result = await request.call()
+        except Exception as exc:
+            retry_after = getattr(exc, "retry_after", None)
+            if isinstance(retry_after, (int, float)) and retry_after > 0:
+                self.rate_limited += 1
+                self.rate_limit_wait += retry_after
+                self._blocked_until[request.route] = self._clock() + retry_after
+                self._count(request.route, "rate_limited")
+                request.retry_wait += retry_after
+                if self.max_retry_wait is None or request.retry_wait <= self.max_retry_wait:
+                    # ルートの解除後に送り直す（呼び出し元はそのまま結果を待つ）
+                    self._requeue(request)
+                    return
+            else:
+                self._count(request.route, "error")
+            self.failed += 1
+            for future in request.futures:
+                if not future.done():
+                    future.set_exception(exc)
+        else:
+            self.completed += 1
+            self._count(request.route, "ok")
+            for future in request.futures:
+                if not future.done():
+                    future.set_result(result)
+        finally:
+            REST_SECONDS.observe(time.perf_counter() - started, route=route_kind(request.route))
+            self._busy_routes.discard(request.route)
+            self._changed.set()
+
+    def _requeue(self, request: _Request) -> None:
+        """レート制限を受けた呼び出しをキューに戻す。送り直す前に同じ ``key`` の新しい呼び出しがあればそちらにまとめる。"""
+        newer = self._pending_keys.get(request.key) if request.key is not None else None
+        if newer is not None and not newer.started:
+            newer.futures.extend(request.futures)
+            self.coalesced += 1
+            return
+        request.started = False
+        request.sequence = next(self._sequence)
+        if request.key is not None:
+            self._pending_keys[request.key] = request
+        self._queued[request.priority] += 1
+        heapq.heappush(self._heap, (request.priority, request.sequence, request))
+
+    def _count(self, route: Hashable, outcome: str) -> None:
+        key = (route_kind(route), outcome)
+        self.outcomes[key] = self.outcomes.get(key, 0) + 1
+
+
+class HttpRateLimits:
+    """discord.py が内部で待って再送した 429 を数える。
+
+    discord.py は ``max_ratelimit_timeout`` 以下の待ち時間なら 429 を呼び出し元へ返さずに
+    待って再送するため、スケジューラからは見えない。aiohttp のトレースで応答を観測し、
+    待つよう指示された秒数をスコープ別に集計する。
+    """
+
+    def __init__(self) -> None:
+        self.count: Dict[str, int] = {}
+        self.wait: Dict[str, float] = {}
+
+    def trace_config(self) -> aiohttp.TraceConfig:
+        trace_config = aiohttp.TraceConfig()
+        trace_config.on_request_end.append(self._on_request_end)
+        return trace_config
+
+    async def _on_request_end(self, session: Any, context: Any, params: aiohttp.TraceRequestEndParams) -> None:
+        response = params.response
+        if response.status != 429:
+            return
+        scope = response.headers.get("X-RateLimit-Scope", "user")
+        if response.headers.get("X-RateLimit-Global"):
+            scope = "global"
+        self.record(scope, response.headers.get("Retry-After") or response.headers.get("X-RateLimit-Reset-After"))
+
+    def record(self, scope: str, retry_after: Optional[str]) -> None:
+        try:
+            seconds = max(float(retry_after), 0.0) if retry_after is not None else 0.0
+        except ValueError:
+            seconds = 0.0
+        self.count[scope] = self.count.get(scope, 0) + 1
+        self.wait[scope] = self.wait.get(scope, 0.0) + seconds
+
+
+# Bot の HTTP セッションに渡すトレースと、メトリクスで読み出す集計値
+http_rate_limits = HttpRateLimits()
+
+
+def route_kind(route: Hashable) -> str:
+    """ルートの種類（``("edit", チャンネルID)`` なら ``"edit"``）を返す。ID を含めず集計に使う。"""
+    if isinstance(route, tuple) and route and isinstance(route[0], str):
+        return route[0]
+    return str(route)
+
+
+def _percentile(sorted_values: List[float], fraction: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(int(len(sorted_values) * fraction), len(sorted_values) - 1)
+    return sorted_values[index]
@@ -0,0 +1,170 @@
+"""募集メッセージへのリアクション付与をバックグラウンドで行うパイプライン。"""
+
+from __future__ import annotations
+
+import asyncio
+import contextvars
+import logging
+from collections import deque
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Deque, Dict, Optional, Sequence, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class RateLimited(Exception):
+    """レート制限に達したことを表す。``retry_after`` 秒後に同じリアクションをやり直す。"""
+
+    def __init__(self, retry_after: float) -> None:
+        super().__init__(retry_after)
+        self.retry_after = retry_after
+
+
+@dataclass
+class ReactionJob:
+    message_id: int
+    # 付与するリアクションの並び。各要素は候補の組で、先頭から順に試し最初に成功したものを使う
+    slots: Sequence[Tuple[str, ...]]
+    add: Callable[[str], Awaitable[None]]
+    on_result: Optional[Callable[[int, Optional[str]], Awaitable[None]]] = None
+
+
+class ReactionPipeline:
+    """リアクションをチャンネルごとに 1 本のキューで順番に付与する。
+
+    リアクションのレート制限はチャンネル単位なので、同じチャンネルへの付与は直列にして
+    レート制限の取り合いを避け、別チャンネルの付与は並行して進める。
+    コマンドのハンドラはジョブを積むだけで、付与の完了は待たない。
+    """
+
+    def __init__(self, *, max_attempts: int = 3, default_retry_after: float = 1.0) -> None:
+        self.max_attempts = max_attempts
+        self.default_retry_after = default_retry_after
+        self._queues: Dict[int, Deque[ReactionJob]] = {}
+        self._workers: Dict[int, asyncio.Task[None]] = {}
+        self._cancelled: Set[int] = set()
+        self.rate_limited = 0
+        self.rate_limit_wait = 0.0
+
+    def enqueue(self, channel_id: int, job: ReactionJob) -> None:
+        self._cancelled.discard(job.message_id)
+        self._queues.setdefault(channel_id, deque()).append(job)
+        if channel_id not in self._workers:
+            # 後続のジョブを最初のイベントのトレースに含めないよう、空のコンテキストで動かす
+            self._workers[channel_id] = asyncio.create_task(self._run(channel_id), context=contextvars.Context())
+
+    def cancel(self, message_id: int) -> None:
+        """まだ付与していないリアクションを取り消す（メッセージが削除された場合など）。"""
+        if any(job.message_id == message_id for queue in self._queues.values() for job in queue):
+            self._cancelled.add(message_id)
+
+    def pending(self) -> int:
+        return sum(len(queue) for queue in self._queues.values())
+
+    def close(self) -> None:
+        for task in self._workers.values():
+            task.cancel()
+        self._workers.clear()
+        self._queues.clear()
+        self._cancelled.clear()
+
+    async def _run(self, channel_id: int) -> None:
+        queue = self._queues[channel_id]
+        try:
+            while queue:
+                job = queue[0]
+                try:
+                    await self._process(job)
+                except Exception:
+                    logger.exception("メッセージ %s へのリアクション付与に失敗しました。", job.message_id)
+                queue.popleft()
+                self._cancelled.discard(job.message_id)
+        finally:
+            if self._workers.get(channel_id) is asyncio.current_task():
+                del self._workers[channel_id]
+                if not queue:
+                    self._queues.pop(channel_id, None)
+
+    async def _process(self, job: ReactionJob) -> None:
+        for index, candidates in enumerate(job.slots):
+            if job.message_id in self._cancelled:
+                return
+            chosen = await self._add_first(job, candidates)
+            if job.on_result is not None:
+                await job.on_result(index, chosen)
+
+    async def _add_first(self, job: ReactionJob, candidates: Tuple[str, ...]) -> Optional[str]:
+        for emoji in candidates:
+            for _ in range(self.max_attempts):
+                try:
+                    await job.add(emoji)
+                    return emoji
+                except RateLimited as exc:
+                    delay = exc.retry_after or self.default_retry_after
+                    self.rate_limited += 1
+                    self.rate_limit_wait += delay
+                    await asyncio.sleep(delay)
+                except Exception:
+                    logger.debug("メッセージ %s へのリアクション %s の付与に失敗しました。", job.message_id, emoji)
+                    break
+                if job.message_id in self._cancelled:
+                    return None
+        return None
+
+
+class ReactionCleanup:
+    """利用者が押した操作用リアクションの削除を、メッセージごとにまとめて後から行う。
+
+    ``add`` は削除対象を記録するだけで、``delay`` 秒後にそのメッセージで溜まった
+    {絵文字: ユーザーIDの集合} を ``flush`` に 1 回で渡す。同じユーザーの同じ絵文字は 1 件にまとまる。
+    """
+
+    def __init__(
+        self,
+        flush: Callable[[Any, Dict[str, Set[int]]], Awaitable[None]],
+        *,
+        delay: float = 0.5,
+    ) -> None:
+        self._flush = flush
+        self.delay = delay
+        self._pending: Dict[int, Tuple[Any, Dict[str, Set[int]]]] = {}
+        self._tasks: Dict[int, asyncio.Task[None]] = {}
+        self.requested = 0
+        self.deduplicated = 0
+
+    def add(self, message: Any, emoji: str, user_id: int) -> None:
+        """``message``（``id`` を持つメッセージハンドル）から ``user_id`` の ``emoji`` を削除する予約をする。"""
+        self.requested += 1
+        _, pending = self._pending.setdefault(message.id, (message, {}))
+        users = pending.setdefault(emoji, set())
+        if user_id in users:
+            self.deduplicated += 1
+        users.add(user_id)
+        if message.id not in self._tasks:
+            self._tasks[message.id] = asyncio.create_task(self._run(message.id), context=contextvars.Context())
+
+    def discard(self, message_id: int) -> None:
+        self._pending.pop(message_id, None)
+
+    def pending(self) -> int:
+        return sum(len(users) for _, pending in self._pending.values() for users in pending.values())
+
+    def close(self) -> None:
+        for task in self._tasks.values():
+            task.cancel()
+        self._tasks.clear()
+        self._pending.clear()
+
+    async def _run(self, message_id: int) -> None:
+        try:
+            await asyncio.sleep(self.delay)
+            # 削除中に届いた分は次の 1 回にまとめる
+            while message_id in self._pending:
+                message, pending = self._pending.pop(message_id)
+                try:
+                    await self._flush(message, pending)
+                except Exception:
+                    logger.exception("メッセージ %s のリアクション削除に失敗しました。", message_id)
+        finally:
+            if self._tasks.get(message_id) is asyncio.current_task():
+                del self._tasks[message_id]
@@ -0,0 +1,254 @@
+"""募集メッセージの状態を表すデータ構造。"""
+
+from __future__ import annotations
+
+import asyncio
+import sys
+import time
+from bisect import bisect_left
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from itertools import islice
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+
+@dataclass
+class ParticipantEntry:
+    key: str
+    user_id: Optional[int]
+    label: str
+    is_dummy: bool = False
+
+
+class Roster:
+    """参加順を保ったまま、キー・ユーザーIDで O(1) に参照・削除できる参加者リスト。
+
+    チーム分けの結果は参加者キー→チーム番号（0 始まり）で保持し、
+    参加者を削除するとチームからも自動的に外れる。
+    """
+
+    def __init__(self, entries: Iterable[ParticipantEntry] = ()) -> None:
+        # dict は挿入順を保持するので、そのまま参加順のリストとして使える
+        self._entries: Dict[str, ParticipantEntry] = {}
+        self._keys_by_user: Dict[int, str] = {}
+        self.teams: Dict[str, int] = {}
+        for entry in entries:
+            self.append(entry)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __iter__(self) -> Iterator[ParticipantEntry]:
+        return iter(self._entries.values())
+
+    def __contains__(self, key: object) -> bool:
+        return key in self._entries
+
+    def __eq__(self, other: object) -> bool:
+        if not isinstance(other, Roster):
+            return NotImplemented
+        return list(self) == list(other) and self.teams == other.teams
+
+    def __repr__(self) -> str:
+        return f"Roster({list(self)!r}, teams={self.teams!r})"
+
+    def append(self, entry: ParticipantEntry) -> bool:
+        """末尾に追加する。同じキー・ユーザーが既にいれば何もせず False を返す。"""
+        if entry.key in self._entries:
+            return False
+        if entry.user_id is not None:
+            if entry.user_id in self._keys_by_user:
+                return False
+            self._keys_by_user[entry.user_id] = entry.key
+        self._entries[entry.key] = entry
+        return True
+
+    def get(self, key: str) -> Optional[ParticipantEntry]:
+        return self._entries.get(key)
+
+    def get_user(self, user_id: int) -> Optional[ParticipantEntry]:
+        key = self._keys_by_user.get(user_id)
+        return self._entries[key] if key is not None else None
+
+    def has_user(self, user_id: int) -> bool:
+        return user_id in self._keys_by_user
+
+    def remove(self, key: str) -> Optional[ParticipantEntry]:
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return None
+        if entry.user_id is not None:
+            self._keys_by_user.pop(entry.user_id, None)
+        self.teams.pop(key, None)
+        return entry
+
+    def remove_user(self, user_id: int) -> Optional[ParticipantEntry]:
+        key = self._keys_by_user.get(user_id)
+        return self.remove(key) if key is not None else None
+
+    def main(self, capacity: int) -> List[ParticipantEntry]:
+        """先頭 ``capacity`` 名（本枠）を返す。"""
+        return list(islice(self._entries.values(), capacity))
+
+    def reserve(self, capacity: int) -> List[ParticipantEntry]:
+        """``capacity`` 名を超えた参加者（補欠）を返す。"""
+        if len(self._entries) <= capacity:
+            return []
+        return list(islice(self._entries.values(), capacity, None))
+
+    def user_ids(self, capacity: Optional[int] = None) -> List[int]:
+        """ダミーを除いた参加者のユーザーIDを参加順に返す。"""
+        entries = self._entries.values() if capacity is None else islice(self._entries.values(), capacity)
+        return [entry.user_id for entry in entries if not entry.is_dummy and entry.user_id is not None]
+
+    def assign_teams(self, teams: Sequence[Sequence[str]]) -> None:
+        self.teams = {key: index for index, keys in enumerate(teams) for key in keys if key in self._entries}
+
+    def team_members(self, team: int, capacity: int) -> List[ParticipantEntry]:
+        """本枠のうち指定したチームに割り当てられた参加者を参加順に返す。"""
+        return [entry for entry in self.main(capacity) if self.teams.get(entry.key) == team]
+
+
+@dataclass
+class TrackedMessage:
+    guild_id: int
+    channel_id: int
+    title: str
+    color: int
+    join_emoji: str
+    check_emoji: Optional[str]
+    dummy_emoji: Optional[str]
+    notify_emoji: Optional[str]
+    recruit_emoji: Optional[str]
+    participants: Roster = field(default_factory=Roster)
+    team_count: int = 2
+    # True ならリアクションではなくボタンで操作する募集
+    uses_buttons: bool = False
+    dummy_count: int = 0
+    teams_visible: bool = False
+    is_disbanded: bool = False
+    created_at: float = field(default_factory=time.time)
+    updated_at: float = field(default_factory=time.time)
+    # 同じ募集への変更を順番に適用するためのロック（募集ごとに独立）
+    lock: asyncio.Lock = field(default_factory=asyncio.Lock, repr=False, compare=False)
+
+
+@dataclass(frozen=True)
+class ArchivedRecruitment:
+    """メモリから外した募集の要約。Roster やロックを持たないので小さい。"""
+
+    message_id: int
+    guild_id: int
+    channel_id: int
+    title: str
+    user_ids: Tuple[int, ...]
+    is_disbanded: bool
+    closed_at: float
+    reason: str
+
+    @classmethod
+    def from_tracked(cls, message_id: int, data: TrackedMessage, reason: str) -> "ArchivedRecruitment":
+        return cls(
+            message_id=message_id,
+            guild_id=data.guild_id,
+            channel_id=data.channel_id,
+            title=data.title,
+            user_ids=tuple(data.participants.user_ids()),
+            is_disbanded=data.is_disbanded,
+            closed_at=time.time(),
+            reason=reason,
+        )
+
+
+class RecruitmentArchive:
+    """最近アーカイブした募集を ``max_size`` 件まで保持する。"""
+
+    def __init__(self, max_size: int = 1000) -> None:
+        self.max_size = max_size
+        self._records: "OrderedDict[int, ArchivedRecruitment]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._records)
+
+    def add(self, record: ArchivedRecruitment) -> None:
+        self._records[record.message_id] = record
+        self._records.move_to_end(record.message_id)
+        while len(self._records) > self.max_size:
+            self._records.popitem(last=False)
+
+    def get(self, message_id: int) -> Optional[ArchivedRecruitment]:
+        return self._records.get(message_id)
+
+    def clear(self) -> None:
+        self._records.clear()
+
+
+def estimate_size(obj: Any, _seen: Optional[set] = None) -> int:
+    """オブジェクトが参照するコンテナ・dataclass を辿っておおよそのメモリ使用量（バイト）を求める。"""
+    seen = _seen if _seen is not None else set()
+    if id(obj) in seen or isinstance(obj, asyncio.Lock):
+        return 0
+    seen.add(id(obj))
+
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        size += sum(estimate_size(key, seen) + estimate_size(value, seen) for key, value in obj.items())
+    elif isinstance(obj, (list, tuple, set, frozenset)):
+        size += sum(estimate_size(item, seen) for item in obj)
+    elif hasattr(obj, "__dict__"):
+        size += estimate_size(vars(obj), seen)
+    return size
+
+
+class RecruitmentIndex:
+    """開催中の募集メッセージIDをチャンネル・ギルドごとに昇順で保持する二次インデックス。
+
+    メッセージIDはほぼ単調増加なので追加は通常末尾への append になり、
+    「チャンネル内の最新の募集」は O(1)、削除は二分探索で位置を求める。
+    """
+
+    def __init__(self) -> None:
+        self._by_channel: Dict[int, List[int]] = {}
+        self._by_guild: Dict[int, List[int]] = {}
+
+    def add(self, message_id: int, data: TrackedMessage) -> None:
+        _insert_sorted(self._by_channel.setdefault(data.channel_id, []), message_id)
+        _insert_sorted(self._by_guild.setdefault(data.guild_id, []), message_id)
+
+    def discard(self, message_id: int, data: TrackedMessage) -> None:
+        _remove_sorted(self._by_channel, data.channel_id, message_id)
+        _remove_sorted(self._by_guild, data.guild_id, message_id)
+
+    def latest_in_channel(self, channel_id: int) -> Optional[int]:
+        message_ids = self._by_channel.get(channel_id)
+        return message_ids[-1] if message_ids else None
+
+    def in_channel(self, channel_id: int) -> Sequence[int]:
+        return tuple(self._by_channel.get(channel_id, ()))
+
+    def in_guild(self, guild_id: int) -> Sequence[int]:
+        return tuple(self._by_guild.get(guild_id, ()))
+
+    def clear(self) -> None:
+        self._by_channel.clear()
+        self._by_guild.clear()
+
+
+def _insert_sorted(message_ids: List[int], message_id: int) -> None:
+    if not message_ids or message_ids[-1] < message_id:
+        message_ids.append(message_id)
+        return
+    index = bisect_left(message_ids, message_id)
+    if index == len(message_ids) or message_ids[index] != message_id:
+        message_ids.insert(index, message_id)
+
+
+def _remove_sorted(index_map: Dict[int, List[int]], key: int, message_id: int) -> None:
+    message_ids = index_map.get(key)
+    if not message_ids:
+        return
+    index = bisect_left(message_ids, message_id)
+    if index < len(message_ids) and message_ids[index] == message_id:
+        del message_ids[index]
+    if not message_ids:
+        del index_map[key]
@@ -0,0 +1,81 @@
+"""募集 Embed の再描画をまとめて行うスケジューラ。"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+from typing import Awaitable, Callable, Dict, Set
+
+logger = logging.getLogger(__name__)
+
+
+class RenderScheduler:
+    """メッセージ単位で再描画要求を間引くスケジューラ。
+
+    ``mark_dirty`` された Embed は ``delay`` 秒後に一度だけ描画される。
+    描画中に届いた要求は次の 1 回にまとめられ、途中の状態は描画されない。
+    1 メッセージにつき同時に実行される描画は最大 1 件。
+    """
+
+    def __init__(
+        self,
+        render: Callable[[int], Awaitable[None]],
+        *,
+        delay: float = 0.3,
+    ) -> None:
+        self._render = render
+        self.delay = delay
+        self._dirty: Set[int] = set()
+        self._tasks: Dict[int, asyncio.Task[None]] = {}
+
+    def mark_dirty(self, message_id: int) -> None:
+        """再描画が必要なことを記録し、必要であれば描画タスクを起動する。"""
+        self._dirty.add(message_id)
+        if message_id not in self._tasks:
+            self._tasks[message_id] = asyncio.create_task(self._run(message_id))
+
+    def is_pending(self, message_id: int) -> bool:
+        return message_id in self._tasks
+
+    def discard(self, message_id: int) -> None:
+        """未描画の要求を破棄する（実行中の描画はそのまま完了させる）。"""
+        self._dirty.discard(message_id)
+
+    async def flush(self, message_id: int) -> None:
+        """待機せずに最新の状態を描画し、完了まで待つ。"""
+        # 待機中・実行中の描画は最新の状態で上書きされるので取り消す
+        while (task := self._tasks.pop(message_id, None)) is not None:
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+
+        self._dirty.add(message_id)
+        task = asyncio.create_task(self._run(message_id, immediate=True))
+        self._tasks[message_id] = task
+        await task
+
+    def close(self) -> None:
+        for task in self._tasks.values():
+            task.cancel()
+        self._tasks.clear()
+        self._dirty.clear()
+
+    async def _run(self, message_id: int, *, immediate: bool = False) -> None:
+        try:
+            while message_id in self._dirty:
+                if not immediate:
+                    await asyncio.sleep(self.delay)
+                immediate = False
+                self._dirty.discard(message_id)
+                await self._render_safely(message_id)
+        finally:
+            if self._tasks.get(message_id) is asyncio.current_task():
+                del self._tasks[message_id]
+
+    async def _render_safely(self, message_id: int) -> None:
+        try:
+            await self._render(message_id)
+        except Exception:
+            logger.exception("メッセージ %s の Embed 更新に失敗しました。", message_id)
@@ -0,0 +1,46 @@
+"""シャード単位でギルドを受け持つための補助関数。"""
+
+from __future__ import annotations
+
+from dataclasses import dataclass, replace
+from typing import Dict, FrozenSet, Iterable, Optional
+
+
+def shard_id_for(guild_id: int, shard_count: int) -> int:
+    """Discord と同じ式でギルドの属するシャードを求める。"""
+    return (guild_id >> 22) % shard_count
+
+
+@dataclass(frozen=True)
+class ShardScope:
+    """このプロセスが受け持つシャードの範囲。
+
+    ``shard_ids`` が None なら全シャードを受け持つ（シャード分割なし、または自動シャーディング）。
+    複数プロセスで同じ保存先を共有する場合は、受け持つギルドの募集だけを読み込むのに使う。
+    自動シャーディングでは接続するまでシャード数が分からないので、分かった時点で ``with_count`` で補う。
+    """
+
+    shard_count: Optional[int] = None
+    shard_ids: Optional[FrozenSet[int]] = None
+
+    def with_count(self, shard_count: Optional[int]) -> "ShardScope":
+        """シャード数が未定なら ``shard_count`` で補ったものを返す。"""
+        if self.shard_count is not None or not shard_count:
+            return self
+        return replace(self, shard_count=shard_count)
+
+    def owns(self, guild_id: int) -> bool:
+        if self.shard_count is None or self.shard_ids is None:
+            return True
+        return shard_id_for(guild_id, self.shard_count) in self.shard_ids
+
+    def shard_of(self, guild_id: int) -> int:
+        return shard_id_for(guild_id, self.shard_count) if self.shard_count else 0
+
+    def count_by_shard(self, guild_ids: Iterable[int]) -> Dict[int, int]:
+        """ギルドID（重複可）をシャードごとに数える。"""
+        counts: Dict[int, int] = {}
+        for guild_id in guild_ids:
+            shard_id = self.shard_of(guild_id)
+            counts[shard_id] = counts.get(shard_id, 0) + 1
+        return counts
@@ -0,0 +1,342 @@
+"""複数のワーカーで共有できる募集状態の読み書きの窓口。"""
+
+from __future__ import annotations
+
+import asyncio
+import contextlib
+import json
+import random
+import weakref
+from abc import ABC, abstractmethod
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional, Sequence, Union
+from urllib.parse import unquote, urlparse
+
+from . import tracing
+from .recruitment import ParticipantEntry, TrackedMessage
+from .store import recruitment_from_dict, recruitment_to_dict
+
+# 募集の状態を書き換える関数。変更した場合は True、何もしなかった場合は False を返す。
+# 共有の保存先では競合したときに最新の状態で呼び直すので、副作用を持たせないこと。
+Mutation = Callable[[TrackedMessage], bool]
+
+
+class StateConflict(Exception):
+    """ほかのワーカーとの競合が続き、変更を書き込めなかったことを表す。"""
+
+
+class RecruitmentState(ABC):
+    """募集状態の保存先。参加・離脱・チーム分けは ``update`` で原子的に行う。"""
+
+    @abstractmethod
+    async def get(self, message_id: int) -> Optional[TrackedMessage]:
+        """募集の現在の状態を返す。"""
+
+    @abstractmethod
+    async def put(self, message_id: int, data: TrackedMessage) -> None:
+        """募集の状態をそのまま書き込む（作成時など、ほかのワーカーと競合しない場合に使う）。"""
+
+    @abstractmethod
+    async def delete(self, message_id: int) -> None:
+        """募集を削除する。"""
+
+    @abstractmethod
+    async def update(self, message_id: int, mutate: Mutation) -> Optional[TrackedMessage]:
+        """``mutate`` を原子的に適用し、変更後の状態を返す。募集がないか変更がなければ None を返す。"""
+
+    @property
+    def is_shared(self) -> bool:
+        """ほかのワーカーと状態を共有しているか。"""
+        return False
+
+    async def join(self, message_id: int, entry: ParticipantEntry) -> Optional[TrackedMessage]:
+        return await self.update(
+            message_id,
+            lambda data: not data.is_disbanded and data.participants.append(entry),
+        )
+
+    async def leave(self, message_id: int, user_id: int) -> Optional[TrackedMessage]:
+        return await self.update(
+            message_id,
+            lambda data: not data.is_disbanded and data.participants.remove_user(user_id) is not None,
+        )
+
+    async def add_dummy(self, message_id: int) -> Optional[TrackedMessage]:
+        def mutate(data: TrackedMessage) -> bool:
+            if data.is_disbanded:
+                return False
+            data.dummy_count += 1
+            return data.participants.append(
+                ParticipantEntry(
+                    key=f"dummy:{data.dummy_count}",
+                    user_id=None,
+                    label=f"ダミー{data.dummy_count}",
+                    is_dummy=True,
+                )
+            )
+
+        return await self.update(message_id, mutate)
+
+    async def claim(self, key: str, ttl: float) -> bool:
+        """同じイベントを受け取ったワーカーのうち 1 つだけが処理するよう、``key`` を ``ttl`` 秒間確保する。
+
+        確保できた場合は True、ほかのワーカーが先に確保していれば False を返す。
+        プロセス内の保存先ではイベントを受け取るワーカーは 1 つなので常に True。
+        """
+        return True
+
+    async def close(self) -> None:
+        pass
+
+
+class InProcessRecruitmentState(RecruitmentState):
+    """プロセス内の辞書をそのまま使う保存先。変更は募集ごとのロックで直列にする。"""
+
+    def __init__(self, messages: Dict[int, TrackedMessage]) -> None:
+        self._messages = messages
+
+    async def get(self, message_id: int) -> Optional[TrackedMessage]:
+        return self._messages.get(message_id)
+
+    async def put(self, message_id: int, data: TrackedMessage) -> None:
+        # 追跡の開始は BoManager._track が行うので、ここでは同じ辞書に入っていることだけを確認する
+        self._messages.setdefault(message_id, data)
+
+    async def delete(self, message_id: int) -> None:
+        self._messages.pop(message_id, None)
+
+    async def update(self, message_id: int, mutate: Mutation) -> Optional[TrackedMessage]:
+        data = self._messages.get(message_id)
+        if data is None:
+            return None
+        async with data.lock:
+            return data if mutate(data) else None
+
+
+class RespError(Exception):
+    """Redis プロトコルのエラー応答。"""
+
+
+RespValue = Union[None, int, bytes, List[Any], RespError]
+
+
+class RespConnection:
+    """Redis プロトコル（RESP2）の 1 本の接続。"""
+
+    def __init__(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        self._reader = reader
+        self._writer = writer
+
+    async def execute(self, *args: Union[str, bytes, int]) -> RespValue:
+        """コマンドを送り、応答を返す。エラー応答は RespError として送出する。"""
+        self._writer.write(_encode_command(args))
+        await self._writer.drain()
+        reply = await self._read_reply()
+        if isinstance(reply, RespError):
+            raise reply
+        return reply
+
+    def close(self) -> None:
+        self._writer.close()
+
+    async def _read_reply(self) -> RespValue:
+        line = await self._reader.readline()
+        if not line.endswith(b"\r\n"):
+            raise ConnectionError("Redis との接続が切れました。")
+        kind, body = line[:1], line[1:-2]
+        if kind == b"+":
+            return body
+        if kind == b"-":
+            return RespError(body.decode("utf-8", "replace"))
+        if kind == b":":
+            return int(body)
+        if kind == b"$":
+            length = int(body)
+            if length < 0:
+                return None
+            payload = await self._reader.readexactly(length + 2)
+            return payload[:-2]
+        if kind == b"*":
+            length = int(body)
+            if length < 0:
+                return None
+            # トランザクション内のエラーは EXEC の応答の要素として返るので、ここでは送出しない
+            return [await self._read_reply() for _ in range(length)]
+        raise ConnectionError(f"Redis から不明な応答を受け取りました: {line!r}")
+
+
+class RespClient:
+    """Redis プロトコルを話すサーバーへの小さな接続プール。
+
+    WATCH はその接続に対してだけ有効なので、トランザクションは ``connection()`` で
+    借りた 1 本の接続の上で行う。
+    """
+
+    def __init__(
+        self,
+        host: str = "localhost",
+        port: int = 6379,
+        *,
+        db: int = 0,
+        password: Optional[str] = None,
+        pool_size: int = 4,
+    ) -> None:
+        self.host = host
+        self.port = port
+        self.db = db
+        self.password = password
+        self._idle: List[RespConnection] = []
+        self._slots = asyncio.Semaphore(max(pool_size, 1))
+
+    @classmethod
+    def from_url(cls, url: str, **kwargs: Any) -> "RespClient":
+        """``redis://[:password@]host[:port][/db]`` 形式の URL から作る。"""
+        parsed = urlparse(url)
+        if parsed.scheme not in ("redis", "tcp"):
+            raise ValueError(f"対応していない URL です: {url}")
+        db_path = parsed.path.lstrip("/")
+        return cls(
+            parsed.hostname or "localhost",
+            parsed.port or 6379,
+            db=int(db_path) if db_path.isdigit() else 0,
+            password=unquote(parsed.password) if parsed.password else None,
+            **kwargs,
+        )
+
+    @contextlib.asynccontextmanager
+    async def connection(self) -> AsyncIterator[RespConnection]:
+        async with self._slots:
+            conn = self._idle.pop() if self._idle else await self._connect()
+            try:
+                yield conn
+            except BaseException:
+                # 応答の途中で失敗した接続は状態が分からないので使い回さない
+                conn.close()
+                raise
+            self._idle.append(conn)
+
+    async def execute(self, *args: Union[str, bytes, int]) -> RespValue:
+        async with self.connection() as conn:
+            return await conn.execute(*args)
+
+    async def close(self) -> None:
+        for conn in self._idle:
+            conn.close()
+        self._idle.clear()
+
+    async def _connect(self) -> RespConnection:
+        reader, writer = await asyncio.open_connection(self.host, self.port)
+        conn = RespConnection(reader, writer)
+        try:
+            if self.password is not None:
+                await conn.execute("AUTH", self.password)
+            if self.db:
+                await conn.execute("SELECT", self.db)
+        except BaseException:
+            conn.close()
+            raise
+        return conn
+
+
+class RedisRecruitmentState(RecruitmentState):
+    """Redis プロトコルのサーバーに募集状態を置き、複数のワーカーで共有する保存先。
+
+    募集は 1 件ずつ JSON で保存し、変更は WATCH / MULTI / EXEC による楽観的な
+    compare-and-set で行う。ほかのワーカーが先に書き換えた場合は最新の状態を読み直して
+    ``mutate`` を適用し直すので、同時に参加や離脱が起きても更新は失われない。
+    同じワーカー内の同じ募集への変更はロックで直列にし、競合はワーカー間だけで起きるようにする。
+    """
+
+    def __init__(
+        self,
+        client: RespClient,
+        *,
+        prefix: str = "civ6matcher:recruitment:",
+        ttl: Optional[float] = None,
+        max_attempts: int = 8,
+        retry_delay: float = 0.005,
+    ) -> None:
+        self.client = client
+        self.prefix = prefix
+        self.ttl = ttl
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        self.conflicts = 0
+        # 使用中のロックだけを保持する（待っている呼び出しがなくなれば自動的に消える）
+        self._locks: "weakref.WeakValueDictionary[int, asyncio.Lock]" = weakref.WeakValueDictionary()
+
+    @property
+    def is_shared(self) -> bool:
+        return True
+
+    async def get(self, message_id: int) -> Optional[TrackedMessage]:
+        raw = await self.client.execute("GET", self._key(message_id))
+        return _decode(raw)
+
+    async def put(self, message_id: int, data: TrackedMessage) -> None:
+        await self.client.execute(*self._set_command(message_id, data))
+
+    async def delete(self, message_id: int) -> None:
+        await self.client.execute("DEL", self._key(message_id))
+
+    async def update(self, message_id: int, mutate: Mutation) -> Optional[TrackedMessage]:
+        key = self._key(message_id)
+        lock = self._locks.get(message_id)
+        if lock is None:
+            lock = self._locks[message_id] = asyncio.Lock()
+        async with lock:
+            with tracing.span("state.update", backend="redis") as current:
+                for attempt in range(self.max_attempts):
+                    if current is not None:
+                        current.set(attempts=attempt + 1)
+                    async with self.client.connection() as conn:
+                        await conn.execute("WATCH", key)
+                        data = _decode(await conn.execute("GET", key))
+                        if data is None or not mutate(data):
+                            await conn.execute("UNWATCH")
+                            return None
+                        await conn.execute("MULTI")
+                        await conn.execute(*self._set_command(message_id, data))
+                        # 読み込み後にほかのワーカーが書き換えていれば EXEC は nil を返す
+                        if await conn.execute("EXEC") is not None:
+                            return data
+                    self.conflicts += 1
+                    # ほかのワーカーと同じ間隔で再試行し続けないよう、待ち時間をずらす
+                    await asyncio.sleep(random.uniform(0, self.retry_delay * (attempt + 1)))
+        raise StateConflict(f"募集 {message_id} の更新が競合し続けました。")
+
+    async def claim(self, key: str, ttl: float) -> bool:
+        reply = await self.client.execute("SET", f"{self.prefix}event:{key}", 1, "NX", "PX", max(int(ttl * 1000), 1))
+        return reply is not None
+
+    async def close(self) -> None:
+        await self.client.close()
+
+    def _key(self, message_id: int) -> str:
+        return f"{self.prefix}{message_id}"
+
+    def _set_command(self, message_id: int, data: TrackedMessage) -> Sequence[Union[str, int]]:
+        payload = json.dumps(recruitment_to_dict(data), ensure_ascii=False, separators=(",", ":"))
+        command: List[Union[str, int]] = ["SET", self._key(message_id), payload]
+        if self.ttl:
+            # 操作のない募集はサーバー側で期限切れにする
+            command += ["PX", int(self.ttl * 1000)]
+        return command
+
+
+def _decode(raw: RespValue) -> Optional[TrackedMessage]:
+    if raw is None:
+        return None
+    if not isinstance(raw, bytes):
+        raise RespError(f"募集の状態として不正な値です: {raw!r}")
+    return recruitment_from_dict(json.loads(raw))
+
+
+def _encode_command(args: Sequence[Union[str, bytes, int]]) -> bytes:
+    parts = [b"*%d\r\n" % len(args)]
+    for arg in args:
+        if isinstance(arg, bytes):
+            value = arg
+        else:
+            value = str(arg).encode("utf-8")
+        parts.append(b"$%d\r\n%s\r\n" % (len(value), value))
+    return b"".join(parts)
@@ -0,0 +1,306 @@
+"""募集状態の永続化バックエンド。"""
+
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Set, Tuple
+
+from .recruitment import ArchivedRecruitment, ParticipantEntry, Roster, TrackedMessage
+
+logger = logging.getLogger(__name__)
+
+
+def recruitment_to_dict(data: TrackedMessage) -> Dict[str, Any]:
+    """TrackedMessage を JSON 化できる辞書に変換する（ロックは含めない）。"""
+    return {
+        "guild_id": data.guild_id,
+        "channel_id": data.channel_id,
+        "title": data.title,
+        "color": data.color,
+        "join_emoji": data.join_emoji,
+        "check_emoji": data.check_emoji,
+        "dummy_emoji": data.dummy_emoji,
+        "notify_emoji": data.notify_emoji,
+        "recruit_emoji": data.recruit_emoji,
+        "participants": [
+            [entry.key, entry.user_id, entry.label, entry.is_dummy]
+            for entry in data.participants
+        ],
+        "teams": dict(data.participants.teams),
+        "team_count": data.team_count,
+        "uses_buttons": data.uses_buttons,
+        "dummy_count": data.dummy_count,
+        "teams_visible": data.teams_visible,
+        "is_disbanded": data.is_disbanded,
+        "created_at": data.created_at,
+        "updated_at": data.updated_at,
+    }
+
+
+def recruitment_from_dict(raw: Dict[str, Any]) -> TrackedMessage:
+    participants = Roster(
+        ParticipantEntry(key=key, user_id=user_id, label=label, is_dummy=is_dummy)
+        for key, user_id, label, is_dummy in raw["participants"]
+    )
+    participants.teams = {key: team for key, team in raw["teams"].items() if key in participants}
+    return TrackedMessage(
+        guild_id=raw["guild_id"],
+        channel_id=raw["channel_id"],
+        title=raw["title"],
+        color=raw["color"],
+        join_emoji=raw["join_emoji"],
+        check_emoji=raw["check_emoji"],
+        dummy_emoji=raw["dummy_emoji"],
+        notify_emoji=raw["notify_emoji"],
+        recruit_emoji=raw["recruit_emoji"],
+        participants=participants,
+        team_count=raw.get("team_count", 2),
+        uses_buttons=raw.get("uses_buttons", False),
+        dummy_count=raw["dummy_count"],
+        teams_visible=raw["teams_visible"],
+        is_disbanded=raw["is_disbanded"],
+        created_at=raw["created_at"],
+        updated_at=raw["updated_at"],
+    )
+
+
+class RecruitmentStore(ABC):
+    """募集状態の保存先。メソッドはブロッキングで、イベントループ外（スレッド）から呼ばれる。"""
+
+    @abstractmethod
+    def load_open(self, owns: Optional[Callable[[int], bool]] = None) -> Dict[int, TrackedMessage]:
+        """終了していない募集を読み込む。``owns`` を渡した場合は、それが真を返すギルドの募集だけを読み込む。"""
+
+    @abstractmethod
+    def save_many(self, records: Sequence[Tuple[int, Dict[str, Any]]]) -> None:
+        """(メッセージID, recruitment_to_dict の結果) をまとめて保存する。"""
+
+    @abstractmethod
+    def delete_many(self, message_ids: Sequence[int]) -> None:
+        """募集をまとめて削除する。"""
+
+    @abstractmethod
+    def archive_many(self, records: Sequence[ArchivedRecruitment]) -> None:
+        """メモリから外した募集の要約を保存する。"""
+
+    def close(self) -> None:
+        pass
+
+
+class SqliteRecruitmentStore(RecruitmentStore):
+    """SQLite (WAL モード) に募集状態を保存するバックエンド。"""
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS recruitments (
+                message_id INTEGER PRIMARY KEY,
+                guild_id INTEGER NOT NULL,
+                channel_id INTEGER NOT NULL,
+                is_disbanded INTEGER NOT NULL,
+                updated_at REAL NOT NULL,
+                payload TEXT NOT NULL
+            )
+            """
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS recruitments_open ON recruitments (is_disbanded)"
+        )
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS archived_recruitments (
+                message_id INTEGER PRIMARY KEY,
+                guild_id INTEGER NOT NULL,
+                channel_id INTEGER NOT NULL,
+                title TEXT NOT NULL,
+                user_ids TEXT NOT NULL,
+                is_disbanded INTEGER NOT NULL,
+                closed_at REAL NOT NULL,
+                reason TEXT NOT NULL
+            )
+            """
+        )
+
+    def load_open(self, owns: Optional[Callable[[int], bool]] = None) -> Dict[int, TrackedMessage]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT message_id, guild_id, payload FROM recruitments WHERE is_disbanded = 0"
+            ).fetchall()
+        # 他のプロセスが受け持つギルドの募集は JSON を読まずに読み飛ばす
+        return {
+            message_id: recruitment_from_dict(json.loads(payload))
+            for message_id, guild_id, payload in rows
+            if owns is None or owns(guild_id)
+        }
+
+    def save_many(self, records: Sequence[Tuple[int, Dict[str, Any]]]) -> None:
+        if not records:
+            return
+        now = time.time()
+        rows = [
+            (
+                message_id,
+                raw["guild_id"],
+                raw["channel_id"],
+                int(raw["is_disbanded"]),
+                now,
+                json.dumps(raw, ensure_ascii=False, separators=(",", ":")),
+            )
+            for message_id, raw in records
+        ]
+        with self._lock:
+            self._conn.execute("BEGIN")
+            try:
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO recruitments "
+                    "(message_id, guild_id, channel_id, is_disbanded, updated_at, payload) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    rows,
+                )
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._conn.execute("COMMIT")
+
+    def delete_many(self, message_ids: Sequence[int]) -> None:
+        if not message_ids:
+            return
+        with self._lock:
+            self._conn.executemany(
+                "DELETE FROM recruitments WHERE message_id = ?",
+                [(message_id,) for message_id in message_ids],
+            )
+
+    def archive_many(self, records: Sequence[ArchivedRecruitment]) -> None:
+        if not records:
+            return
+        rows = [
+            (
+                record.message_id,
+                record.guild_id,
+                record.channel_id,
+                record.title,
+                json.dumps(list(record.user_ids)),
+                int(record.is_disbanded),
+                record.closed_at,
+                record.reason,
+            )
+            for record in records
+        ]
+        message_ids = [(record.message_id,) for record in records]
+        with self._lock:
+            self._conn.execute("BEGIN")
+            try:
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO archived_recruitments "
+                    "(message_id, guild_id, channel_id, title, user_ids, is_disbanded, closed_at, reason) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                    rows,
+                )
+                self._conn.executemany("DELETE FROM recruitments WHERE message_id = ?", message_ids)
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._conn.execute("COMMIT")
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+class WriteBehindWriter:
+    """変更のあった募集を記録し、``interval`` 秒ごとにまとめて保存する。
+
+    ホットパスでは ``mark`` で ID を記録するだけで、シリアライズと書き込みは後でまとめて行う。
+    """
+
+    def __init__(
+        self,
+        store: RecruitmentStore,
+        lookup: Callable[[int], Optional[TrackedMessage]],
+        *,
+        interval: float = 1.0,
+    ) -> None:
+        self.store = store
+        self._lookup = lookup
+        self.interval = interval
+        self._dirty: Set[int] = set()
+        self._archived: List[ArchivedRecruitment] = []
+        self._task: Optional[asyncio.Task[None]] = None
+        self._flush_lock = asyncio.Lock()
+
+    def mark(self, message_id: int) -> None:
+        self._dirty.add(message_id)
+
+    def archive(self, record: ArchivedRecruitment) -> None:
+        """募集の要約を次回の書き込みで保存し、募集本体は保存対象から外す。"""
+        self._archived.append(record)
+        self._dirty.discard(record.message_id)
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def load_open(self, owns: Optional[Callable[[int], bool]] = None) -> Dict[int, TrackedMessage]:
+        return await asyncio.to_thread(self.store.load_open, owns)
+
+    async def flush(self) -> None:
+        async with self._flush_lock:
+            if not self._dirty and not self._archived:
+                return
+            message_ids, self._dirty = self._dirty, set()
+            archived, self._archived = self._archived, []
+
+            # シリアライズはイベントループ上で行い、その時点の状態を確定させる
+            records: List[Tuple[int, Dict[str, Any]]] = []
+            deleted: List[int] = []
+            for message_id in message_ids:
+                data = self._lookup(message_id)
+                if data is None:
+                    deleted.append(message_id)
+                else:
+                    records.append((message_id, recruitment_to_dict(data)))
+
+            try:
+                await asyncio.to_thread(self._write, records, deleted, archived)
+            except Exception:
+                logger.exception("募集状態の保存に失敗しました。")
+                self._dirty.update(message_ids)
+                self._archived[:0] = archived
+
+    async def close(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+        await asyncio.to_thread(self.store.close)
+
+    def _write(
+        self,
+        records: Sequence[Tuple[int, Dict[str, Any]]],
+        deleted: Iterable[int],
+        archived: Sequence[ArchivedRecruitment],
+    ) -> None:
+        self.store.save_many(records)
+        self.store.delete_many(list(deleted))
+        self.store.archive_many(archived)
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval)
+            await self.flush()
@@ -0,0 +1,139 @@
+"""複数の評価軸でチーム分けを選ぶスコアリングエンジン。
+
+人数ごとに「同人数の 2 チームへの分け方」をすべて並べた表を NumPy 配列として事前計算し、
+重みの合計差・直近の試合で同じチームだった組み合わせ・チーム内の重みのばらつきの差を
+全候補について一度にベクトル演算で評価する。
+"""
+
+from __future__ import annotations
+
+import logging
+import random
+from collections import deque
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Deque, Dict, FrozenSet, List, Optional, Sequence, Tuple
+
+from .teams import Split, best_split, equal_size_splits
+
+try:
+    import numpy as np
+except ModuleNotFoundError:  # numpy が無い環境では重みの合計差のみでチームを分ける
+    np = None
+
+logger = logging.getLogger(__name__)
+
+MAX_TABLE_SIZE = 12
+
+
+@dataclass(frozen=True)
+class ObjectiveWeights:
+    """各評価軸の係数。値が大きいほどその軸を重視する。"""
+
+    balance: float = 1.0
+    repeat: float = 0.25
+    spread: float = 0.25
+
+
+@lru_cache(maxsize=None)
+def split_table(size: int) -> "np.ndarray":
+    """``size`` 人の分け方の表（行: 分け方、列: 参加者、値: チーム1なら 1）を返す。"""
+    splits = equal_size_splits(size)
+    table = np.zeros((len(splits), size), dtype=np.float64)
+    for row, (team_one, _) in enumerate(splits):
+        table[row, list(team_one)] = 1.0
+    table.setflags(write=False)
+    return table
+
+
+class TeamScorer:
+    """分け方の候補をまとめて採点し、最もスコアの低いものを選ぶ。"""
+
+    def __init__(self, objective: ObjectiveWeights, rng: Optional[random.Random] = None) -> None:
+        self.objective = objective
+        self._rng = rng or random.Random()
+        if np is None:
+            logger.warning("numpy が見つからないため、重みの合計差のみでチームを分けます。")
+            return
+        for size in range(2, MAX_TABLE_SIZE + 1, 2):
+            split_table(size)
+
+    def score(
+        self,
+        weights: Sequence[int],
+        cooccurrence: Optional[Sequence[Sequence[float]]] = None,
+    ) -> "np.ndarray":
+        """全候補のスコア（低いほど良い）を ``equal_size_splits`` と同じ順序で返す。"""
+        table = split_table(len(weights))
+        other = 1.0 - table
+        w = np.asarray(weights, dtype=np.float64)
+        half = len(weights) / 2
+
+        # 重みの合計差
+        sum_one = table @ w
+        balance = np.abs(2.0 * sum_one - w.sum())
+
+        # チーム内の重みの標準偏差の差
+        squares = w * w
+        mean_one = sum_one / half
+        mean_two = (other @ w) / half
+        std_one = np.sqrt(np.maximum((table @ squares) / half - mean_one**2, 0.0))
+        std_two = np.sqrt(np.maximum((other @ squares) / half - mean_two**2, 0.0))
+        spread = np.abs(std_one - std_two)
+
+        scores = self.objective.balance * balance + self.objective.spread * spread
+
+        # 直近の試合で同じチームだったペアの数
+        if cooccurrence is not None and self.objective.repeat:
+            matrix = np.asarray(cooccurrence, dtype=np.float64)
+            repeat = (((table @ matrix) * table).sum(axis=1) + ((other @ matrix) * other).sum(axis=1)) / 2.0
+            scores = scores + self.objective.repeat * repeat
+
+        return scores
+
+    def choose(
+        self,
+        weights: Sequence[int],
+        cooccurrence: Optional[Sequence[Sequence[float]]] = None,
+    ) -> Split:
+        """最良スコアの分け方からランダムに 1 つ選ぶ。人数が奇数・0 人・上限超えなら空のチームを返す。"""
+        size = len(weights)
+        if size == 0 or size % 2 != 0:
+            return (), ()
+        if np is None or size > MAX_TABLE_SIZE:
+            return best_split(weights, self._rng)
+
+        scores = self.score(weights, cooccurrence)
+        candidates = np.flatnonzero(scores <= scores.min() + 1e-9)
+        team_one, team_two = equal_size_splits(size)[int(self._rng.choice(candidates))]
+        if self._rng.random() < 0.5:
+            team_one, team_two = team_two, team_one
+        return team_one, team_two
+
+
+class TeammateHistory:
+    """ギルドごとに直近 ``max_games`` 試合のチーム構成を保持する。"""
+
+    def __init__(self, max_games: int = 5) -> None:
+        self.max_games = max_games
+        self._games: Dict[int, Deque[Tuple[FrozenSet[int], ...]]] = {}
+
+    def record(self, guild_id: int, teams: Sequence[Sequence[int]]) -> None:
+        games = self._games.setdefault(guild_id, deque(maxlen=self.max_games))
+        games.append(tuple(frozenset(team) for team in teams))
+
+    def cooccurrence(self, guild_id: int, user_ids: Sequence[Optional[int]]) -> List[List[float]]:
+        """参加者同士が直近の試合で同じチームだった回数の行列を返す（ダミーは常に 0）。"""
+        size = len(user_ids)
+        matrix = [[0.0] * size for _ in range(size)]
+        for game in self._games.get(guild_id, ()):
+            for team in game:
+                members = [index for index, user_id in enumerate(user_ids) if user_id in team]
+                for position, i in enumerate(members):
+                    for j in members[position + 1:]:
+                        matrix[i][j] += 1.0
+                        matrix[j][i] += 1.0
+        return matrix
+
+    def clear(self) -> None:
+        self._games.clear()
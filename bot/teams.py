@@ -0,0 +1,299 @@
+"""チーム分けの計算（Discord に依存しない純粋な処理）。"""
+
+from __future__ import annotations
+
+import heapq
+import random
+import time
+from functools import lru_cache
+from itertools import combinations, compress
+from typing import List, Optional, Sequence, Tuple
+
+Split = Tuple[Tuple[int, ...], Tuple[int, ...]]
+
+
+@lru_cache(maxsize=None)
+def equal_size_splits(size: int) -> Tuple[Split, ...]:
+    """``size`` 人を同じ人数の 2 チームに分ける方法をすべて返す（インデックスの組）。
+
+    チームの入れ替えで同じになる分け方は 1 つにまとめるため、0 番は常にチーム1に入る。
+    12 人なら C(11, 5) = 462 通り。
+    """
+    if size <= 0 or size % 2 != 0:
+        return ()
+    everyone = range(size)
+    splits: List[Split] = []
+    for rest in combinations(range(1, size), size // 2 - 1):
+        team_one = (0, *rest)
+        members = set(team_one)
+        team_two = tuple(index for index in everyone if index not in members)
+        splits.append((team_one, team_two))
+    return tuple(splits)
+
+
+def optimal_splits(weights: Sequence[int]) -> List[Split]:
+    """重みの合計差が最小になる同人数の分け方をすべて返す。"""
+    splits = equal_size_splits(len(weights))
+    if not splits:
+        return []
+    # combinations は equal_size_splits と同じ順序で組を列挙するので、和の位置がそのまま分け方に対応する
+    rest_sums = list(map(sum, combinations(weights[1:], len(weights) // 2 - 1)))
+    # チーム1の残りメンバーの和が target に最も近い分け方が最適（target の上下どちらも同点）
+    target = sum(weights) / 2 - weights[0]
+    distinct = set(rest_sums)
+    best_distance = min(abs(value - target) for value in distinct)
+    best_values = {value for value in distinct if abs(value - target) == best_distance}
+    return list(compress(splits, map(best_values.__contains__, rest_sums)))
+
+
+def best_split(weights: Sequence[int], rng: Optional[random.Random] = None) -> Split:
+    """最適な分け方の中から 1 つをランダムに選ぶ。人数が奇数・0 人の場合は空のチームを返す。"""
+    candidates = optimal_splits(weights)
+    if not candidates:
+        return (), ()
+    chooser = rng or random
+    team_one, team_two = chooser.choice(candidates)
+    # 0 番が常にチーム1にならないよう、チームの左右もランダムにする
+    if chooser.random() < 0.5:
+        team_one, team_two = team_two, team_one
+    return team_one, team_two
+
+
+EXACT_PARTITION_LIMIT = 12
+
+
+def team_sizes(size: int, team_count: int) -> List[int]:
+    """``size`` 人を ``team_count`` チームに分けるときの各チームの人数（差は最大 1）。"""
+    base, extra = divmod(size, team_count)
+    return [base + (1 if team < extra else 0) for team in range(team_count)]
+
+
+def partition(
+    weights: Sequence[int],
+    team_count: int,
+    *,
+    time_budget: float = 0.2,
+    seed: Optional[int] = None,
+) -> List[List[int]]:
+    """参加者を ``team_count`` チームに分ける（インデックスのリストを返す）。
+
+    各チームの人数差は最大 1 にし、チームの重み合計の最大と最小の差を小さくする。
+    ``EXACT_PARTITION_LIMIT`` 人以下は全探索で最適解を求め、それより多い場合は
+    Balanced Karmarkar–Karp（最大差分法）で初期解を作り、``time_budget`` 秒まで交換による局所探索で改善する。
+    全探索も ``time_budget`` 秒で打ち切り、それまでに見つかった最良の分け方を返す。
+    """
+    rng = random.Random(seed)
+    size = len(weights)
+    if team_count <= 1 or size == 0:
+        return [list(range(size))] + [[] for _ in range(max(team_count - 1, 0))]
+
+    if team_count == 2 and size % 2 == 0 and size <= EXACT_PARTITION_LIMIT:
+        team_one, team_two = best_split(weights, rng)
+        return [list(team_one), list(team_two)]
+    deadline = time.perf_counter() + time_budget
+    if size <= EXACT_PARTITION_LIMIT:
+        return _exact_partition(weights, team_count, rng, deadline)
+
+    teams = _balanced_karmarkar_karp(weights, team_count)
+    return _improve_by_swaps(weights, teams, deadline, rng)
+
+
+def partition_spread(weights: Sequence[int], teams: Sequence[Sequence[int]]) -> int:
+    """チームの重み合計の最大と最小の差。"""
+    sums = [sum(weights[index] for index in team) for team in teams]
+    return max(sums) - min(sums)
+
+
+def _exact_partition(
+    weights: Sequence[int],
+    team_count: int,
+    rng: random.Random,
+    deadline: float = float("inf"),
+) -> List[List[int]]:
+    # 重い順に割り当てると枝刈りが効きやすい
+    order = sorted(range(len(weights)), key=lambda index: weights[index], reverse=True)
+    capacities = team_sizes(len(weights), team_count)
+    teams: List[List[int]] = [[] for _ in range(team_count)]
+    sums = [0] * team_count
+    # Balanced Karmarkar–Karp の解を上界にして枝刈りし、時間切れでもそれ以上の分け方を返す
+    initial = _balanced_karmarkar_karp(weights, team_count)
+    best: List[List[List[int]]] = [initial]
+    best_spread = [partition_spread(weights, initial)]
+    nodes = [0]
+
+    def search(position: int) -> bool:
+        """探索を続けるなら True、時間切れなら False を返す。"""
+        nodes[0] += 1
+        if nodes[0] % 256 == 0 and time.perf_counter() >= deadline:
+            return False
+        if position == len(order):
+            spread = max(sums) - min(sums)
+            if spread < best_spread[0]:
+                best_spread[0] = spread
+                best.clear()
+            if spread == best_spread[0]:
+                best.append([list(team) for team in teams])
+            return True
+
+        index = order[position]
+        weight = weights[index]
+        seen = set()
+        for team in range(team_count):
+            if len(teams[team]) >= capacities[team]:
+                continue
+            # 合計と残り枠が同じチームは入れ替えても同じ結果になるので 1 つだけ試す
+            state = (sums[team], capacities[team] - len(teams[team]))
+            if state in seen:
+                continue
+            seen.add(state)
+            teams[team].append(index)
+            sums[team] += weight
+            # 埋まったチームの合計は確定するので、最終的な差は「現在の最大 - 埋まったチームの最小」以上になる
+            full_sums = [sums[t] for t in range(team_count) if len(teams[t]) == capacities[t]]
+            running = True
+            if not full_sums or max(sums) - min(full_sums) <= best_spread[0]:
+                running = search(position + 1)
+            sums[team] -= weight
+            teams[team].pop()
+            if not running:
+                return False
+        return True
+
+    search(0)
+    result = rng.choice(best)
+    rng.shuffle(result)
+    return result
+
+
+def _balanced_karmarkar_karp(weights: Sequence[int], team_count: int) -> List[List[int]]:
+    # 人数をチーム数の倍数にそろえるため、重み 0 のダミー（インデックス -1）で埋める
+    order = sorted(range(len(weights)), key=lambda index: weights[index], reverse=True)
+    padding = (-len(order)) % team_count
+    order.extend([-1] * padding)
+
+    def weight_of(index: int) -> int:
+        return weights[index] if index >= 0 else 0
+
+    # 各部分解は (チーム合計, メンバー) を合計の降順に並べた team_count 個の組
+    heap: List[Tuple[int, int, List[Tuple[int, List[int]]]]] = []
+    for counter, start in enumerate(range(0, len(order), team_count)):
+        chunk = order[start:start + team_count]
+        subsets = sorted(((weight_of(index), [index]) for index in chunk), key=lambda item: -item[0])
+        heapq.heappush(heap, (-(subsets[0][0] - subsets[-1][0]), counter, subsets))
+
+    counter = len(heap)
+    while len(heap) > 1:
+        _, _, first = heapq.heappop(heap)
+        _, _, second = heapq.heappop(heap)
+        # 一方の重いチームと他方の軽いチームを組み合わせて差を打ち消す
+        merged = [
+            (first[team][0] + second[-1 - team][0], first[team][1] + second[-1 - team][1])
+            for team in range(team_count)
+        ]
+        merged.sort(key=lambda item: -item[0])
+        heapq.heappush(heap, (-(merged[0][0] - merged[-1][0]), counter, merged))
+        counter += 1
+
+    _, _, subsets = heap[0]
+    return [[index for index in members if index >= 0] for _, members in subsets]
+
+
+def _improve_by_swaps(
+    weights: Sequence[int],
+    teams: List[List[int]],
+    deadline: float,
+    rng: random.Random,
+) -> List[List[int]]:
+    """最も重いチームと最も軽いチームの間で、差が縮まる入れ替えを時間切れまで繰り返す。"""
+    sums = [sum(weights[index] for index in team) for team in teams]
+    while time.perf_counter() < deadline:
+        heavy = max(range(len(teams)), key=sums.__getitem__)
+        light = min(range(len(teams)), key=sums.__getitem__)
+        gap = sums[heavy] - sums[light]
+        if gap == 0:
+            break
+
+        best_swap: Optional[Tuple[int, int]] = None
+        best_gap = gap
+        heavy_members = teams[heavy][:]
+        rng.shuffle(heavy_members)
+        for a in heavy_members:
+            for b in teams[light]:
+                delta = weights[a] - weights[b]
+                if delta <= 0:
+                    continue
+                new_gap = abs(gap - 2 * delta)
+                if new_gap < best_gap:
+                    best_gap = new_gap
+                    best_swap = (a, b)
+        if best_swap is None:
+            break
+
+        a, b = best_swap
+        delta = weights[a] - weights[b]
+        teams[heavy][teams[heavy].index(a)] = b
+        teams[light][teams[light].index(b)] = a
+        sums[heavy] -= delta
+        sums[light] += delta
+    return teams
+
+
+def plan_lobbies(size: int, team_count: int, capacity: int) -> List[int]:
+    """``size`` 人から作れるロビーの人数を返す。
+
+    各ロビーはチーム数で割り切れる ``capacity`` 人以下の人数で、ロビー数が最小になるように
+    できるだけ同じ人数にそろえる。チーム数で割り切れない端数の参加者はどのロビーにも入らない。
+    """
+    team_size_limit = capacity // team_count
+    slots = size // team_count
+    if team_size_limit == 0 or slots == 0:
+        return []
+    lobby_count = -(-slots // team_size_limit)
+    base, extra = divmod(slots, lobby_count)
+    return [(base + (1 if lobby < extra else 0)) * team_count for lobby in range(lobby_count)]
+
+
+def pool_partition(
+    weights: Sequence[int],
+    lobby_sizes: Sequence[int],
+    team_count: int,
+    *,
+    time_budget: float = 0.2,
+    seed: Optional[int] = None,
+) -> List[List[List[int]]]:
+    """参加者を ``lobby_sizes`` の人数のロビーに振り分け、各ロビーを ``team_count`` チームに分ける。
+
+    重い順に蛇行順（1→N→N→1…）でロビーへ配り、ロビー間の重みの偏りを抑えてから
+    ロビーごとに ``partition`` でチームを分ける。``time_budget`` 秒を使い切った後のロビーは
+    全探索を行わず Balanced Karmarkar–Karp の解をそのまま使うので、参加者が多くても時間は一定に収まる。
+    戻り値はロビー→チーム→参加者インデックスの入れ子のリスト。
+    """
+    rng = random.Random(seed)
+    deadline = time.perf_counter() + time_budget
+    result: List[List[List[int]]] = []
+    for members in _snake_draft(weights, lobby_sizes):
+        lobby_weights = [weights[index] for index in members]
+        remaining = deadline - time.perf_counter()
+        if remaining > 0:
+            teams = partition(lobby_weights, team_count, time_budget=remaining, seed=rng.randrange(2**32))
+        else:
+            teams = _balanced_karmarkar_karp(lobby_weights, team_count)
+        result.append([[members[index] for index in team] for team in teams])
+    return result
+
+
+def _snake_draft(weights: Sequence[int], lobby_sizes: Sequence[int]) -> List[List[int]]:
+    order = sorted(range(len(weights)), key=lambda index: weights[index], reverse=True)
+    lobbies: List[List[int]] = [[] for _ in lobby_sizes]
+    forward = list(range(len(lobby_sizes)))
+    position = 0
+    total = sum(lobby_sizes)
+    while position < min(total, len(order)):
+        for lobby in forward:
+            if position >= len(order):
+                break
+            if len(lobbies[lobby]) < lobby_sizes[lobby]:
+                lobbies[lobby].append(order[position])
+                position += 1
+        forward.reverse()
+    return lobbies
@@ -0,0 +1,168 @@
+"""イベント単位のトレース（トレースIDと入れ子のスパン）を記録する。"""
+
+from __future__ import annotations
+
+import contextlib
+import contextvars
+import functools
+import logging
+import os
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Deque, Dict, Iterator, List, Optional, TypeVar
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+@dataclass(eq=False)
+class Span:
+    name: str
+    trace: "Trace"
+    parent: Optional["Span"]
+    started: float
+    duration: Optional[float] = None
+    attrs: Dict[str, Any] = field(default_factory=dict)
+
+    @property
+    def depth(self) -> int:
+        depth = 0
+        parent = self.parent
+        while parent is not None:
+            depth += 1
+            parent = parent.parent
+        return depth
+
+    def set(self, **attrs: Any) -> None:
+        self.attrs.update(attrs)
+
+
+@dataclass(eq=False)
+class Trace:
+    trace_id: str
+    spans: List[Span] = field(default_factory=list)
+
+    @property
+    def root(self) -> Span:
+        return self.spans[0]
+
+    @property
+    def duration(self) -> float:
+        return self.root.duration or 0.0
+
+    def format(self) -> str:
+        """スパンを開始順に字下げして並べた文字列を返す。"""
+        origin = self.root.started
+        lines = [f"trace={self.trace_id} {self.root.name} {self.duration * 1000:.1f}ms"]
+        for span in sorted(self.spans[1:], key=lambda item: item.started):
+            duration = f"{span.duration * 1000:.1f}ms" if span.duration is not None else "実行中"
+            attrs = "".join(f" {key}={value}" for key, value in span.attrs.items())
+            lines.append(
+                f"{'  ' * span.depth}+{(span.started - origin) * 1000:.1f}ms {span.name} {duration}{attrs}"
+            )
+        return "\n".join(lines)
+
+
+class Tracer:
+    """完了したトレースを直近 ``capacity`` 件だけ保持し、遅いものをログに出す。"""
+
+    def __init__(self, *, slow_threshold: float = 1.0, capacity: int = 256) -> None:
+        self.enabled = slow_threshold > 0
+        self.slow_threshold = slow_threshold
+        self.recent: Deque[Trace] = deque(maxlen=capacity)
+
+    def configure(self, *, slow_threshold: float) -> None:
+        """``slow_threshold``（秒）以上かかったトレースをログに出す。0 以下ならトレースしない。"""
+        self.enabled = slow_threshold > 0
+        self.slow_threshold = slow_threshold
+
+    def slowest(self, count: int) -> List[Trace]:
+        return sorted(self.recent, key=lambda trace: trace.duration, reverse=True)[:count]
+
+    def finish(self, trace: Trace) -> None:
+        self.recent.append(trace)
+        if trace.duration >= self.slow_threshold:
+            logger.info("時間のかかった処理:\n%s", trace.format())
+
+
+tracer = Tracer()
+_current_span: contextvars.ContextVar[Optional[Span]] = contextvars.ContextVar("current_span", default=None)
+
+
+def current_span() -> Optional[Span]:
+    return _current_span.get()
+
+
+def current_trace_id() -> Optional[str]:
+    span = _current_span.get()
+    return span.trace.trace_id if span is not None else None
+
+
+@contextlib.contextmanager
+def span(name: str, *, root: bool = False, **attrs: Any) -> Iterator[Optional[Span]]:
+    """スパンを開始する。実行中のスパンがなければ（または ``root`` なら）新しいトレースを始める。"""
+    if not tracer.enabled:
+        yield None
+        return
+    parent = None if root else _current_span.get()
+    with _open(name, parent, attrs) as opened:
+        yield opened
+
+
+@contextlib.contextmanager
+def child_span(parent: Optional[Span], name: str, **attrs: Any) -> Iterator[Optional[Span]]:
+    """``parent`` の子としてスパンを開始する（別タスクで実行される処理用）。``parent`` が None なら何もしない。"""
+    if parent is None or not tracer.enabled:
+        yield None
+        return
+    with _open(name, parent, attrs) as opened:
+        yield opened
+
+
+def traced(name: str, *, root: bool = False) -> Callable[[Callable[..., Awaitable[T]]], Callable[..., Awaitable[T]]]:
+    """コルーチン関数の実行をスパンとして記録するデコレーター。"""
+
+    def decorator(func: Callable[..., Awaitable[T]]) -> Callable[..., Awaitable[T]]:
+        @functools.wraps(func)
+        async def wrapper(*args: Any, **kwargs: Any) -> T:
+            with span(name, root=root):
+                return await func(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+@contextlib.contextmanager
+def _open(name: str, parent: Optional[Span], attrs: Dict[str, Any]) -> Iterator[Span]:
+    trace = parent.trace if parent is not None else Trace(os.urandom(8).hex())
+    opened = Span(name=name, trace=trace, parent=parent, started=time.perf_counter(), attrs=attrs)
+    trace.spans.append(opened)
+    token = _current_span.set(opened)
+    try:
+        yield opened
+    except BaseException as exc:
+        opened.attrs["error"] = type(exc).__name__
+        raise
+    finally:
+        opened.duration = time.perf_counter() - opened.started
+        try:
+            if parent is None:
+                # ログにこのトレースのIDが付くよう、スパンを戻す前に記録する
+                tracer.finish(trace)
+        finally:
+            _current_span.reset(token)
+
+
+def install_log_record_factory() -> None:
+    """ログレコードに実行中のトレースID（``%(trace_id)s``、なければ ``-``）を付ける。"""
+    previous = logging.getLogRecordFactory()
+
+    def factory(*args: Any, **kwargs: Any) -> logging.LogRecord:
+        record = previous(*args, **kwargs)
+        record.trace_id = current_trace_id() or "-"
+        return record
+
+    logging.setLogRecordFactory(factory)
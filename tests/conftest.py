@@ -0,0 +1,4 @@
+import os
+
+# bot.config は読み込み時にトークンを必須とするので、テストでは仮の値を入れる
+os.environ.setdefault("DISCORD_BOT_TOKEN", "test")
@@ -0,0 +1,333 @@
+"""偽物の Discord の上で BoManager を動かすためのハーネス。
+
+ギルド・チャンネル・メッセージ・インタラクションを模した偽物の層と、その上で実際の Cog に
+イベントを流す ``FakeBot`` を提供する。偽物の REST 呼び出しには遅延と、ルートごと・全体のレート制限を入れる。
+レート制限は discord.py と同じく、上限に達した呼び出しを解除まで待たせる（待った回数と秒数を数える）。
+テストと ``benchmarks.loadtest`` の両方から使う。読み込む前に ``DISCORD_BOT_TOKEN`` を設定しておくこと。
+"""
+
+from __future__ import annotations
+
+import asyncio
+import itertools
+import random
+import time
+from dataclasses import dataclass
+from types import SimpleNamespace
+from typing import Any, Awaitable, Dict, Hashable, Iterable, List, Optional, Tuple
+
+import discord
+from discord.ext import commands
+
+from bot.commands.bo import ROLE_MAPPING, WEIGHT_ROLE_MAPPING, BoManager
+from bot.shared_state import RecruitmentState
+from bot.store import RecruitmentStore
+
+BOT_USER_ID = 1
+GUILD_ID = 10**17
+MEMBER_COUNT = 5_000
+CHANNEL_NAME = next(iter(ROLE_MAPPING))
+# ルートの種類 → (回数, 秒)。チャンネル（メンバー取得はギルド）ごとに数える。Discord で観測される制限に近い値
+RATE_LIMITS: Dict[str, Tuple[int, float]] = {
+    "edit": (5, 5.0),
+    "send": (5, 5.0),
+    "reaction": (1, 0.25),
+    "member": (10, 1.0),
+}
+# インタラクションへの応答以外のすべての呼び出しにかかる全体の制限
+GLOBAL_LIMIT = (50, 1.0)
+
+
+class _Bucket:
+    """固定の時間枠で回数を数えるレート制限。"""
+
+    def __init__(self, limit: int, per: float) -> None:
+        self.limit = limit
+        self.per = per
+        self.remaining = limit
+        self.reset_at = 0.0
+
+    def delay(self, now: float) -> float:
+        """1 回分を確保できれば 0、できなければ枠が戻るまでの秒数を返す。"""
+        if now >= self.reset_at:
+            self.remaining = self.limit
+            self.reset_at = now + self.per
+        if self.remaining > 0:
+            self.remaining -= 1
+            return 0.0
+        return self.reset_at - now
+
+
+class FakeRest:
+    """REST 呼び出しの遅延とレート制限を模し、呼び出しの数と Embed の編集を記録する。"""
+
+    def __init__(
+        self,
+        *,
+        latency: float,
+        jitter: float,
+        rate_limits: bool,
+        rng: random.Random,
+    ) -> None:
+        self.latency = latency
+        self.jitter = jitter
+        self.rate_limits = rate_limits
+        self.rng = rng
+        self._buckets: Dict[Hashable, _Bucket] = {}
+        self.in_flight = 0
+        self.reset()
+
+    def reset(self) -> None:
+        self.calls: Dict[str, int] = {}
+        self.rate_limited = 0
+        self.rate_limit_wait = 0.0
+        # メッセージID → [(Embed を組み立てた時刻, 編集が完了した時刻)]
+        self.edits: Dict[int, List[Tuple[float, float]]] = {}
+
+    async def call(self, kind: str, major: int) -> None:
+        self.in_flight += 1
+        try:
+            if self.rate_limits:
+                await self._acquire(kind, major)
+            self.calls[kind] = self.calls.get(kind, 0) + 1
+            await asyncio.sleep(max(self.latency + self.rng.uniform(-self.jitter, self.jitter), 0.0))
+        finally:
+            self.in_flight -= 1
+
+    def record_edit(self, message_id: int, built_at: float) -> None:
+        self.edits.setdefault(message_id, []).append((built_at, time.perf_counter()))
+
+    async def _acquire(self, kind: str, major: int) -> None:
+        buckets = []
+        limit = RATE_LIMITS.get(kind)
+        if limit is not None:
+            buckets.append(self._bucket((kind, major), limit))
+        if kind != "interaction":
+            buckets.append(self._bucket("global", GLOBAL_LIMIT))
+        for bucket in buckets:
+            while (delay := bucket.delay(time.perf_counter())) > 0:
+                self.rate_limited += 1
+                self.rate_limit_wait += delay
+                await asyncio.sleep(delay)
+
+    def _bucket(self, key: Hashable, limit: Tuple[int, float]) -> _Bucket:
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = self._buckets[key] = _Bucket(*limit)
+        return bucket
+
+
+class FakeMessage:
+    """PartialMessage の代わり。Cog は Embed を組み立てた直後にこれを作るので、作成時刻を組み立て時刻とみなす。"""
+
+    def __init__(self, rest: FakeRest, channel: "FakeChannel", message_id: int) -> None:
+        self.rest = rest
+        self.channel = channel
+        self.id = message_id
+        self.created_at = time.perf_counter()
+
+    async def edit(self, **kwargs: Any) -> None:
+        await self.rest.call("edit", self.channel.id)
+        self.rest.record_edit(self.id, self.created_at)
+
+    async def add_reaction(self, emoji: Any) -> None:
+        await self.rest.call("reaction", self.channel.id)
+
+    async def remove_reaction(self, emoji: Any, member: Any) -> None:
+        await self.rest.call("reaction", self.channel.id)
+
+    async def clear_reaction(self, emoji: Any) -> None:
+        await self.rest.call("reaction", self.channel.id)
+
+
+class FakeChannel:
+    def __init__(self, rest: FakeRest, channel_id: int, ids: Iterable[int]) -> None:
+        self.rest = rest
+        self.id = channel_id
+        self.name = CHANNEL_NAME
+        self._ids = ids
+
+    def get_partial_message(self, message_id: int) -> FakeMessage:
+        return FakeMessage(self.rest, self, message_id)
+
+    async def send(self, content: Optional[str] = None, **kwargs: Any) -> SimpleNamespace:
+        await self.rest.call("send", self.id)
+        return SimpleNamespace(id=next(self._ids), content=content)
+
+
+class FakeGuild:
+    def __init__(self, rest: FakeRest, guild_id: int, members: Dict[int, SimpleNamespace]) -> None:
+        self.rest = rest
+        self.id = guild_id
+        self.members = members
+
+    def get_member(self, user_id: int) -> None:
+        # discord.py の内部キャッシュは使わない（索引にないメンバーは REST で取得させる）
+        return None
+
+    async def fetch_member(self, user_id: int) -> SimpleNamespace:
+        await self.rest.call("member", self.id)
+        return self.members[user_id]
+
+
+class FakeResponse:
+    def __init__(self, interaction: "FakeInteraction") -> None:
+        self.interaction = interaction
+
+    async def send_message(self, *args: Any, **kwargs: Any) -> SimpleNamespace:
+        await self.interaction.rest.call("interaction", self.interaction.id)
+        self.interaction.message_id = next(self.interaction.ids)
+        return SimpleNamespace(message_id=self.interaction.message_id)
+
+
+class FakeInteraction:
+    def __init__(self, rest: FakeRest, ids: Iterable[int], channel: FakeChannel, user: SimpleNamespace) -> None:
+        self.rest = rest
+        self.ids = ids
+        self.id = next(ids)
+        self.guild_id = GUILD_ID
+        self.channel = channel
+        self.user = user
+        self.response = FakeResponse(self)
+        # 応答で送信したメッセージのID
+        self.message_id: Optional[int] = None
+
+
+@dataclass
+class EventSample:
+    message_id: int
+    # Embed の編集まで待つイベントか
+    expects_edit: bool
+    dispatched: float = 0.0
+    handled: float = 0.0
+
+
+class FakeBot:
+    """偽物の Discord の上で 1 つの Cog を動かす。"""
+
+    def __init__(
+        self,
+        rest: FakeRest,
+        rng: random.Random,
+        *,
+        store: Optional[RecruitmentStore] = None,
+        state: Optional[RecruitmentState] = None,
+    ) -> None:
+        self.rest = rest
+        self.rng = rng
+        self.ids = itertools.count(10**18)
+        self.channels: Dict[int, FakeChannel] = {}
+        roles = [None, *WEIGHT_ROLE_MAPPING]
+        self.members = {
+            user_id: SimpleNamespace(
+                id=user_id,
+                mention=f"<@{user_id}>",
+                roles=[SimpleNamespace(id=role)] if (role := rng.choice(roles)) is not None else [],
+            )
+            for user_id in range(1000, 1000 + MEMBER_COUNT)
+        }
+        self.guild = FakeGuild(rest, GUILD_ID, self.members)
+        self.users = iter(self.members)
+        self.samples: List[EventSample] = []
+
+        bot = commands.Bot(command_prefix="!", intents=discord.Intents.default())
+        bot._connection.user = SimpleNamespace(id=BOT_USER_ID)  # type: ignore[assignment]
+        bot.get_partial_messageable = lambda channel_id, guild_id=None: self.channel(channel_id)  # type: ignore[method-assign]
+        bot.get_channel = lambda channel_id: self.channels.get(channel_id)  # type: ignore[method-assign]
+        bot.get_guild = lambda guild_id: self.guild if guild_id == GUILD_ID else None  # type: ignore[method-assign]
+        bot.get_user = lambda user_id: None  # type: ignore[method-assign]
+        self.bot = bot
+        self.cog = BoManager(bot, store=store, state=state)
+
+    async def start(self) -> None:
+        await self.bot.add_cog(self.cog)
+        # ギルドが利用可能になったときの索引の読み込みを模す
+        self.cog.member_index.load(GUILD_ID, self.members.values())
+
+    async def close(self) -> None:
+        await self.bot.remove_cog(self.cog.qualified_name)
+
+    def channel(self, channel_id: int) -> FakeChannel:
+        channel = self.channels.get(channel_id)
+        if channel is None:
+            channel = self.channels[channel_id] = FakeChannel(self.rest, channel_id, self.ids)
+        return channel
+
+    def new_channel(self) -> FakeChannel:
+        return self.channel(next(self.ids))
+
+    def next_user(self) -> int:
+        return next(self.users)
+
+    async def create_lobby(self, channel: FakeChannel, *, sample: bool = False) -> int:
+        """``/bo start`` で募集を作成し、メッセージIDを返す。"""
+        interaction = FakeInteraction(self.rest, self.ids, channel, self.members[self.next_user()])
+        record = EventSample(message_id=0, expects_edit=True)
+        await self._measure(record, self.cog.command.callback(interaction, start="負荷試験"))  # type: ignore[union-attr]
+        assert interaction.message_id is not None
+        record.message_id = interaction.message_id
+        if sample:
+            self.samples.append(record)
+        return record.message_id
+
+    async def react(self, message_id: int, user_id: int, emoji: str, *, delay: float = 0.0) -> None:
+        await asyncio.sleep(delay)
+        data = self.cog.tracked_messages[message_id]
+        payload = SimpleNamespace(
+            message_id=message_id,
+            guild_id=GUILD_ID,
+            channel_id=data.channel_id,
+            user_id=user_id,
+            member=self.members.get(user_id),
+            emoji=discord.PartialEmoji(name=emoji),
+        )
+        await self._sampled(EventSample(message_id, expects_edit=True), self.cog.on_raw_reaction_add(payload))
+
+    async def unreact(self, message_id: int, user_id: int, emoji: str, *, delay: float = 0.0) -> None:
+        """リアクションの取り消し。ゲートウェイと同じくメンバーは付けずに送る。"""
+        await asyncio.sleep(delay)
+        data = self.cog.tracked_messages[message_id]
+        payload = SimpleNamespace(
+            message_id=message_id,
+            guild_id=GUILD_ID,
+            channel_id=data.channel_id,
+            user_id=user_id,
+            member=None,
+            emoji=discord.PartialEmoji(name=emoji),
+        )
+        await self.cog.on_raw_reaction_remove(payload)
+
+    async def close_game(self, message_id: int) -> None:
+        data = self.cog.tracked_messages[message_id]
+        interaction = FakeInteraction(self.rest, self.ids, self.channel(data.channel_id), self.members[self.next_user()])
+        # 解散の Embed の編集と参加者へのメンションはハンドラの中で完了まで待たれる
+        await self._sampled(
+            EventSample(message_id, expects_edit=False),
+            self.cog.command.callback(interaction, close_game=str(message_id)),  # type: ignore[union-attr]
+        )
+
+    async def drain(self) -> None:
+        """送信キュー・再描画・リアクションの付与と削除がすべて終わるまで待つ。"""
+        idle = 0
+        while idle < 2:
+            await asyncio.sleep(0.05)
+            stats = self.cog.outbound.stats()
+            busy = (
+                stats["queued"]
+                or stats["in_flight"]
+                or self.rest.in_flight
+                or self.cog.reaction_pipeline.pending()
+                or self.cog.reaction_cleanup.pending()
+                or any(self.cog.render_scheduler.is_pending(message_id) for message_id in self.cog.tracked_messages)
+            )
+            idle = 0 if busy else idle + 1
+
+    async def _sampled(self, sample: EventSample, handler: Awaitable[None]) -> None:
+        await self._measure(sample, handler)
+        self.samples.append(sample)
+
+    @staticmethod
+    async def _measure(sample: EventSample, handler: Awaitable[None]) -> None:
+        sample.dispatched = time.perf_counter()
+        await handler
+        sample.handled = time.perf_counter()
@@ -0,0 +1,151 @@
+"""テスト用の Redis プロトコル（RESP2）のサーバー。
+
+``RedisRecruitmentState`` が使うコマンド（GET / SET [NX] [PX] / DEL / WATCH / UNWATCH /
+MULTI / EXEC / PING）だけを、1 プロセス内の辞書の上で実装する。
+WATCH したキーが EXEC までに書き換えられていれば、本物と同じく EXEC は nil を返す。
+"""
+
+from __future__ import annotations
+
+import asyncio
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+Command = List[bytes]
+
+
+class RespServer:
+    def __init__(self) -> None:
+        self.data: Dict[bytes, bytes] = {}
+        self.expires: Dict[bytes, float] = {}
+        # キーごとの書き込み回数。WATCH は読み込み時の値と EXEC 時の値を比べる
+        self.versions: Dict[bytes, int] = {}
+        self.commands = 0
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._clients: List[Tuple[asyncio.StreamWriter, asyncio.Task[None]]] = []
+
+    @property
+    def url(self) -> str:
+        assert self._server is not None
+        host, port = self._server.sockets[0].getsockname()[:2]
+        return f"redis://{host}:{port}/0"
+
+    async def start(self) -> "RespServer":
+        self._server = await asyncio.start_server(self._handle, "127.0.0.1", 0)
+        return self
+
+    async def close(self) -> None:
+        for writer, _ in self._clients:
+            writer.close()
+        # 接続を閉じると各接続の処理は EOF を読んで終わるので、取り消されずに終わるまで待つ
+        await asyncio.gather(*(task for _, task in self._clients), return_exceptions=True)
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        task = asyncio.current_task()
+        assert task is not None
+        self._clients.append((writer, task))
+        watched: Dict[bytes, int] = {}
+        queued: Optional[List[Command]] = None
+        try:
+            while True:
+                command = await _read_command(reader)
+                if command is None:
+                    return
+                self.commands += 1
+                name = command[0].upper()
+                if name == b"WATCH":
+                    for key in command[1:]:
+                        watched[key] = self.versions.get(key, 0)
+                    reply: Any = "OK"
+                elif name == b"UNWATCH":
+                    watched.clear()
+                    reply = "OK"
+                elif name == b"MULTI":
+                    queued = []
+                    reply = "OK"
+                elif name == b"EXEC":
+                    if queued is None:
+                        reply = Exception("ERR EXEC without MULTI")
+                    elif any(self.versions.get(key, 0) != version for key, version in watched.items()):
+                        reply = None
+                    else:
+                        reply = [self._run(queued_command) for queued_command in queued]
+                    queued = None
+                    watched.clear()
+                elif queued is not None:
+                    queued.append(command)
+                    reply = "QUEUED"
+                else:
+                    reply = self._run(command)
+                writer.write(_encode(reply))
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            return
+        finally:
+            writer.close()
+
+    def _run(self, command: Command) -> Any:
+        name = command[0].upper()
+        if name == b"PING":
+            return "PONG"
+        if name == b"GET":
+            return self._get(command[1])
+        if name == b"SET":
+            key, value, options = command[1], command[2], [option.upper() for option in command[3:]]
+            if b"NX" in options and self._get(key) is not None:
+                return None
+            self.data[key] = value
+            self.expires.pop(key, None)
+            if b"PX" in options:
+                self.expires[key] = time.monotonic() + int(options[options.index(b"PX") + 1]) / 1000
+            self._touch(key)
+            return "OK"
+        if name == b"DEL":
+            removed = 0
+            for key in command[1:]:
+                if self._get(key) is not None:
+                    removed += 1
+                    del self.data[key]
+                    self._touch(key)
+            return removed
+        return Exception(f"ERR unknown command '{name.decode()}'")
+
+    def _get(self, key: bytes) -> Optional[bytes]:
+        expires = self.expires.get(key)
+        if expires is not None and expires <= time.monotonic():
+            self.data.pop(key, None)
+            del self.expires[key]
+        return self.data.get(key)
+
+    def _touch(self, key: bytes) -> None:
+        self.versions[key] = self.versions.get(key, 0) + 1
+
+
+async def _read_command(reader: asyncio.StreamReader) -> Optional[Command]:
+    line = await reader.readline()
+    if not line:
+        return None
+    count = int(line[1:-2])
+    command = []
+    for _ in range(count):
+        length = int((await reader.readline())[1:-2])
+        command.append((await reader.readexactly(length + 2))[:-2])
+    return command
+
+
+def _encode(reply: Any) -> bytes:
+    if reply is None:
+        return b"$-1\r\n"
+    if isinstance(reply, Exception):
+        return b"-" + str(reply).encode() + b"\r\n"
+    if isinstance(reply, str):
+        return b"+" + reply.encode() + b"\r\n"
+    if isinstance(reply, int):
+        return b":%d\r\n" % reply
+    if isinstance(reply, bytes):
+        return b"$%d\r\n%s\r\n" % (len(reply), reply)
+    items: Tuple[bytes, ...] = tuple(_encode(item) for item in reply)
+    return b"*%d\r\n" % len(items) + b"".join(items)
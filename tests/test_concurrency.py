@@ -0,0 +1,50 @@
+import asyncio
+import random
+
+from bot.commands.bo import MAIN_CAPACITY
+from tests.harness import FakeBot, FakeRest
+
+
+def test_interleaved_reactions_keep_the_roster_consistent() -> None:
+    async def scenario() -> None:
+        rng = random.Random(0)
+        rest = FakeRest(latency=0.002, jitter=0.002, rate_limits=False, rng=rng)
+        test = FakeBot(rest, rng)
+        await test.start()
+        try:
+            lobbies = [await test.create_lobby(test.new_channel()) for _ in range(3)]
+            players = [test.next_user() for _ in range(30)]
+            events = []
+            dummies = {message_id: 0 for message_id in lobbies}
+            for _ in range(400):
+                message_id = rng.choice(lobbies)
+                user_id = rng.choice(players)
+                delay = rng.uniform(0, 0.3)
+                kind = rng.random()
+                if kind < 0.45:
+                    events.append(test.react(message_id, user_id, "👋", delay=delay))
+                elif kind < 0.75:
+                    events.append(test.unreact(message_id, user_id, "👋", delay=delay))
+                elif kind < 0.9:
+                    events.append(test.react(message_id, user_id, "⚔️", delay=delay))
+                else:
+                    dummies[message_id] += 1
+                    events.append(test.react(message_id, user_id, "➕", delay=delay))
+            await asyncio.gather(*events)
+            await test.drain()
+
+            for message_id in lobbies:
+                data = test.cog.tracked_messages[message_id]
+                entries = list(data.participants)
+                keys = [entry.key for entry in entries]
+                user_ids = [entry.user_id for entry in entries if entry.user_id is not None]
+                assert len(keys) == len(set(keys))
+                assert len(user_ids) == len(set(user_ids))
+                main_keys = {entry.key for entry in data.participants.main(MAIN_CAPACITY)}
+                assert set(data.participants.teams) <= main_keys
+                assert data.dummy_count == dummies[message_id]
+                assert sum(entry.is_dummy for entry in entries) == dummies[message_id]
+        finally:
+            await test.close()
+
+    asyncio.run(scenario())
@@ -0,0 +1,76 @@
+import asyncio
+from typing import List
+
+from bot.deadline_scheduler import DeadlineScheduler
+
+
+async def _noop(key: int) -> None:
+    pass
+
+
+def _drain(scheduler: DeadlineScheduler, now: float) -> List[int]:
+    keys = []
+    while (key := scheduler._pop_due(now)) is not None:
+        keys.append(key)
+    return keys
+
+
+def test_due_keys_come_out_in_deadline_order() -> None:
+    scheduler = DeadlineScheduler(_noop)
+    for key, deadline in [(3, 30.0), (1, 10.0), (4, 40.0), (2, 20.0)]:
+        scheduler.schedule(key, deadline)
+    assert _drain(scheduler, 5.0) == []
+    assert _drain(scheduler, 25.0) == [1, 2]
+    assert len(scheduler) == 2
+    assert _drain(scheduler, 100.0) == [3, 4]
+    assert len(scheduler) == 0
+
+
+def test_reschedule_and_cancel_drop_the_old_deadline() -> None:
+    scheduler = DeadlineScheduler(_noop)
+    scheduler.schedule(1, 10.0)
+    scheduler.schedule(2, 20.0)
+    scheduler.schedule(3, 30.0)
+    scheduler.schedule(1, 50.0)
+    scheduler.cancel(2)
+    assert scheduler.deadline_of(1) == 50.0
+    assert scheduler.deadline_of(2) is None
+    # 古い期限の要素はヒープに残っていても読み捨てられる
+    assert _drain(scheduler, 40.0) == [3]
+    assert _drain(scheduler, 60.0) == [1]
+
+
+def test_heap_is_compacted_when_stale_entries_pile_up() -> None:
+    scheduler = DeadlineScheduler(_noop)
+    for deadline in range(1000):
+        scheduler.schedule(1, float(deadline))
+    assert len(scheduler) == 1
+    assert len(scheduler._heap) <= 2 + 64 + 1
+    assert _drain(scheduler, 1000.0) == [1]
+
+
+def test_callback_fires_when_an_earlier_deadline_is_scheduled() -> None:
+    async def scenario() -> None:
+        fired: List[int] = []
+        done = asyncio.Event()
+        loop = asyncio.get_running_loop()
+
+        async def callback(key: int) -> None:
+            fired.append(key)
+            if len(fired) == 2:
+                done.set()
+
+        scheduler = DeadlineScheduler(callback, clock=loop.time)
+        scheduler.start()
+        try:
+            scheduler.schedule(1, loop.time() + 10)
+            await asyncio.sleep(0)
+            # 眠っているタスクより早い期限が入ったら起こし直す
+            scheduler.schedule(2, loop.time() + 0.02)
+            scheduler.schedule(1, loop.time() + 0.04)
+            await asyncio.wait_for(done.wait(), timeout=1)
+        finally:
+            scheduler.close()
+        assert fired == [2, 1]
+
+    asyncio.run(scenario())
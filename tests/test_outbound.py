@@ -0,0 +1,96 @@
+import asyncio
+from typing import Any, List
+
+import pytest
+
+from bot.outbound import OutboundScheduler, Priority
+
+
+class RateLimited(Exception):
+    def __init__(self, retry_after: float) -> None:
+        super().__init__(f"retry after {retry_after}")
+        self.retry_after = retry_after
+
+
+def _flaky(calls: List[str], name: str, failures: int, retry_after: float = 0.05) -> Any:
+    async def call() -> str:
+        calls.append(name)
+        if calls.count(name) <= failures:
+            raise RateLimited(retry_after)
+        return name
+
+    return call
+
+
+def test_rate_limited_call_is_sent_again_after_the_route_unblocks() -> None:
+    async def scenario() -> None:
+        scheduler = OutboundScheduler(concurrency=2)
+        calls: List[str] = []
+        try:
+            result = await asyncio.wait_for(
+                scheduler.submit(Priority.HIGH, ("edit", 1), _flaky(calls, "edit", failures=2)),
+                timeout=2,
+            )
+        finally:
+            scheduler.close()
+        assert result == "edit"
+        assert calls == ["edit"] * 3
+        assert scheduler.rate_limited == 2
+        assert scheduler.failed == 0
+        assert scheduler.outcomes == {("edit", "rate_limited"): 2, ("edit", "ok"): 1}
+
+    asyncio.run(scenario())
+
+
+def test_rate_limited_call_fails_once_the_retry_wait_is_exceeded() -> None:
+    async def scenario() -> None:
+        scheduler = OutboundScheduler(concurrency=1, max_retry_wait=0.08)
+        calls: List[str] = []
+        try:
+            with pytest.raises(RateLimited):
+                await asyncio.wait_for(
+                    scheduler.submit(Priority.HIGH, ("edit", 1), _flaky(calls, "edit", failures=5)),
+                    timeout=2,
+                )
+        finally:
+            scheduler.close()
+        # 0.05 秒の待ちを 2 回重ねた時点で上限を超える
+        assert calls == ["edit"] * 2
+        assert scheduler.failed == 1
+
+    asyncio.run(scenario())
+
+
+def test_retry_is_merged_into_a_newer_call_with_the_same_key() -> None:
+    async def scenario() -> None:
+        scheduler = OutboundScheduler(concurrency=1)
+        calls: List[str] = []
+        try:
+            first = scheduler.submit(Priority.HIGH, ("edit", 1), _flaky(calls, "old", failures=1), key=1)
+            await asyncio.sleep(0.01)
+            # 古い呼び出しがレート制限で待っている間に、同じキーの新しい内容が届く
+            second = scheduler.submit(Priority.HIGH, ("edit", 1), _flaky(calls, "new", failures=0), key=1)
+            results = await asyncio.wait_for(asyncio.gather(first, second), timeout=2)
+        finally:
+            scheduler.close()
+        assert results == ["new", "new"]
+        assert calls == ["old", "new"]
+
+    asyncio.run(scenario())
+
+
+def test_send_now_skips_the_queue_but_counts_the_call() -> None:
+    async def scenario() -> None:
+        scheduler = OutboundScheduler(concurrency=1)
+
+        async def respond() -> str:
+            return "ok"
+
+        try:
+            assert await scheduler.send_now(("interaction", 5), respond) == "ok"
+        finally:
+            scheduler.close()
+        assert scheduler.stats()["queued"] == 0
+        assert scheduler.outcomes == {("interaction", "ok"): 1}
+
+    asyncio.run(scenario())
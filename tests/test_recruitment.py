@@ -0,0 +1,90 @@
+from bot.recruitment import ParticipantEntry, RecruitmentIndex, Roster, TrackedMessage
+
+
+def _user(user_id: int) -> ParticipantEntry:
+    return ParticipantEntry(key=f"user:{user_id}", user_id=user_id, label="")
+
+
+def _dummy(number: int) -> ParticipantEntry:
+    return ParticipantEntry(key=f"dummy:{number}", user_id=None, label=f"ダミー{number}", is_dummy=True)
+
+
+def _recruitment(channel_id: int, guild_id: int = 1) -> TrackedMessage:
+    return TrackedMessage(
+        guild_id=guild_id,
+        channel_id=channel_id,
+        title="募集",
+        color=0,
+        join_emoji="👋",
+        check_emoji=None,
+        dummy_emoji=None,
+        notify_emoji=None,
+        recruit_emoji=None,
+    )
+
+
+def test_roster_rejects_duplicate_keys_and_users() -> None:
+    roster = Roster([_user(1), _dummy(1)])
+    assert not roster.append(_user(1))
+    # キーが違っても同じユーザーは 2 回参加できない
+    assert not roster.append(ParticipantEntry(key="other", user_id=1, label=""))
+    assert not roster.append(_dummy(1))
+    assert roster.append(_user(2))
+    assert [entry.key for entry in roster] == ["user:1", "dummy:1", "user:2"]
+    assert roster.user_ids() == [1, 2]
+    assert roster.get_user(2) is roster.get("user:2")
+
+
+def test_roster_remove_drops_the_team_assignment() -> None:
+    roster = Roster([_user(1), _user(2), _user(3), _user(4)])
+    roster.assign_teams([["user:1", "user:3"], ["user:2", "user:4", "missing"]])
+    assert roster.teams == {"user:1": 0, "user:3": 0, "user:2": 1, "user:4": 1}
+
+    removed = roster.remove_user(3)
+    assert removed is not None and removed.key == "user:3"
+    assert "user:3" not in roster.teams
+    assert not roster.has_user(3)
+    assert roster.remove("user:3") is None
+    # 削除したユーザーは再び参加できる
+    assert roster.append(_user(3))
+    assert "user:3" not in roster.teams
+
+
+def test_roster_splits_main_and_reserve_in_join_order() -> None:
+    roster = Roster([_user(user_id) for user_id in range(1, 6)])
+    assert [entry.user_id for entry in roster.main(3)] == [1, 2, 3]
+    assert [entry.user_id for entry in roster.reserve(3)] == [4, 5]
+    assert roster.reserve(5) == []
+    assert roster.user_ids(3) == [1, 2, 3]
+
+    roster.assign_teams([["user:1", "user:4"], ["user:2", "user:3"]])
+    assert [entry.key for entry in roster.team_members(0, 3)] == ["user:1"]
+    # 本枠の人が抜けると補欠が繰り上がる
+    roster.remove_user(2)
+    assert [entry.user_id for entry in roster.main(3)] == [1, 3, 4]
+    assert [entry.key for entry in roster.team_members(0, 3)] == ["user:1", "user:4"]
+
+
+def test_index_keeps_message_ids_sorted_when_added_out_of_order() -> None:
+    index = RecruitmentIndex()
+    for message_id in (30, 10, 20, 10):
+        index.add(message_id, _recruitment(channel_id=5))
+    index.add(40, _recruitment(channel_id=6))
+    assert index.in_channel(5) == (10, 20, 30)
+    assert index.latest_in_channel(5) == 30
+    assert index.in_guild(1) == (10, 20, 30, 40)
+
+
+def test_index_drops_empty_keys_on_removal() -> None:
+    index = RecruitmentIndex()
+    first, second = _recruitment(channel_id=5), _recruitment(channel_id=6, guild_id=2)
+    index.add(10, first)
+    index.add(20, second)
+
+    index.discard(10, first)
+    index.discard(10, first)
+    assert index.latest_in_channel(5) is None
+    assert index.in_guild(1) == ()
+    assert 5 not in index._by_channel
+    assert 1 not in index._by_guild
+    assert index.in_guild(2) == (20,)
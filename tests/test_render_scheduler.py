@@ -0,0 +1,111 @@
+import asyncio
+from typing import List
+
+from bot.render_scheduler import RenderScheduler
+
+
+def test_marks_within_the_delay_are_rendered_once() -> None:
+    async def scenario() -> None:
+        rendered: List[int] = []
+
+        async def render(message_id: int) -> None:
+            rendered.append(message_id)
+
+        scheduler = RenderScheduler(render, delay=0.02)
+        for _ in range(5):
+            scheduler.mark_dirty(1)
+        scheduler.mark_dirty(2)
+        assert scheduler.is_pending(1)
+        await asyncio.sleep(0.06)
+        assert sorted(rendered) == [1, 2]
+        assert not scheduler.is_pending(1)
+
+    asyncio.run(scenario())
+
+
+def test_marks_during_a_render_are_coalesced_into_one_more_render() -> None:
+    async def scenario() -> None:
+        started = asyncio.Event()
+        release = asyncio.Event()
+        rendered: List[int] = []
+
+        async def render(message_id: int) -> None:
+            rendered.append(message_id)
+            started.set()
+            await release.wait()
+
+        scheduler = RenderScheduler(render, delay=0.01)
+        scheduler.mark_dirty(1)
+        await started.wait()
+        # 描画中に届いた要求は次の 1 回にまとめる
+        for _ in range(3):
+            scheduler.mark_dirty(1)
+        release.set()
+        await asyncio.sleep(0.05)
+        assert rendered == [1, 1]
+
+    asyncio.run(scenario())
+
+
+def test_flush_cancels_the_pending_render_and_renders_now() -> None:
+    async def scenario() -> None:
+        rendered: List[int] = []
+
+        async def render(message_id: int) -> None:
+            rendered.append(message_id)
+
+        scheduler = RenderScheduler(render, delay=10.0)
+        scheduler.mark_dirty(1)
+        await asyncio.wait_for(scheduler.flush(1), timeout=1)
+        assert rendered == [1]
+        assert not scheduler.is_pending(1)
+
+        # 描画の失敗はログに残して、次の要求は受け付ける
+        async def failing(message_id: int) -> None:
+            raise RuntimeError("boom")
+
+        scheduler = RenderScheduler(failing, delay=0.0)
+        await scheduler.flush(1)
+        assert not scheduler.is_pending(1)
+
+    asyncio.run(scenario())
+
+
+def test_flush_during_a_render_cancels_it_and_renders_again() -> None:
+    async def scenario() -> None:
+        started = asyncio.Event()
+        calls: List[str] = []
+
+        async def render(message_id: int) -> None:
+            calls.append("start")
+            if len(calls) == 1:
+                started.set()
+                await asyncio.sleep(10)
+            calls.append("done")
+
+        scheduler = RenderScheduler(render, delay=0.0)
+        scheduler.mark_dirty(1)
+        await started.wait()
+        await asyncio.wait_for(scheduler.flush(1), timeout=1)
+        # 実行中の描画は取り消され、最新の状態で描画し直される
+        assert calls == ["start", "start", "done"]
+        assert not scheduler.is_pending(1)
+
+    asyncio.run(scenario())
+
+
+def test_discard_drops_a_pending_render() -> None:
+    async def scenario() -> None:
+        rendered: List[int] = []
+
+        async def render(message_id: int) -> None:
+            rendered.append(message_id)
+
+        scheduler = RenderScheduler(render, delay=0.01)
+        scheduler.mark_dirty(1)
+        scheduler.discard(1)
+        await asyncio.sleep(0.03)
+        assert rendered == []
+        assert not scheduler.is_pending(1)
+
+    asyncio.run(scenario())
@@ -0,0 +1,60 @@
+import asyncio
+import random
+import time
+from pathlib import Path
+
+from bot.config import settings
+from bot.recruitment import ParticipantEntry, Roster, TrackedMessage
+from bot.store import SqliteRecruitmentStore, recruitment_to_dict
+from tests.harness import GUILD_ID, FakeBot, FakeRest
+
+
+def _recruitment(channel_id: int, *, updated_at: float) -> TrackedMessage:
+    return TrackedMessage(
+        guild_id=GUILD_ID,
+        channel_id=channel_id,
+        title="募集",
+        color=0,
+        join_emoji="👋",
+        check_emoji="⚔️",
+        dummy_emoji="➕",
+        notify_emoji=None,
+        recruit_emoji=None,
+        participants=Roster([ParticipantEntry(key="user:1000", user_id=1000, label="")]),
+        created_at=updated_at,
+        updated_at=updated_at,
+    )
+
+
+def test_recruitments_expired_while_stopped_are_archived_silently(tmp_path: Path) -> None:
+    async def scenario() -> None:
+        now = time.time()
+        store = SqliteRecruitmentStore(str(tmp_path / "state.db"))
+        store.save_many(
+            [
+                (1, recruitment_to_dict(_recruitment(10, updated_at=now - settings.auto_close_idle - 60))),
+                (2, recruitment_to_dict(_recruitment(20, updated_at=now))),
+            ]
+        )
+        rng = random.Random(0)
+        rest = FakeRest(latency=0.0, jitter=0.0, rate_limits=False, rng=rng)
+        test = FakeBot(rest, rng, store=store)
+        await test.start()
+        try:
+            assert list(test.cog.tracked_messages) == [2]
+            assert test.cog.auto_close.deadline_of(1) is None
+            record = test.cog.archive.get(1)
+            assert record is not None and record.reason == "expired"
+            await test.drain()
+            # 解散の投稿もメンションも送らない
+            assert "send" not in rest.calls
+        finally:
+            await test.close()
+
+        store = SqliteRecruitmentStore(str(tmp_path / "state.db"))
+        try:
+            assert list(store.load_open()) == [2]
+        finally:
+            store.close()
+
+    asyncio.run(scenario())
@@ -0,0 +1,24 @@
+from bot.sharding import ShardScope, shard_id_for
+
+GUILD_IDS = [(shard << 22) | 1 for shard in (0, 1, 2, 5)]
+
+
+def test_shard_of_follows_the_discord_formula() -> None:
+    scope = ShardScope(4, frozenset({1}))
+    assert [scope.shard_of(guild_id) for guild_id in GUILD_IDS] == [0, 1, 2, 1]
+    assert [scope.owns(guild_id) for guild_id in GUILD_IDS] == [False, True, False, True]
+    assert shard_id_for(GUILD_IDS[3], 4) == 1
+
+
+def test_auto_sharding_counts_by_shard_once_the_count_is_known() -> None:
+    scope = ShardScope(None, None)
+    # シャード数が分かるまではすべて 0 番に数え、すべてのギルドを受け持つ
+    assert scope.count_by_shard(GUILD_IDS) == {0: 4}
+    assert all(scope.owns(guild_id) for guild_id in GUILD_IDS)
+
+    resolved = scope.with_count(3)
+    assert resolved.count_by_shard(GUILD_IDS) == {0: 1, 1: 1, 2: 2}
+    assert all(resolved.owns(guild_id) for guild_id in GUILD_IDS)
+    # 設定で固定したシャード数は置き換えない
+    assert ShardScope(4, None).with_count(3).shard_count == 4
+    assert scope.with_count(None) is scope
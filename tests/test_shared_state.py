@@ -0,0 +1,120 @@
+import asyncio
+import random
+from typing import Any
+
+import pytest
+
+from bot.recruitment import ParticipantEntry, Roster, TrackedMessage
+from bot.shared_state import RedisRecruitmentState, RespClient
+
+from .harness import FakeBot, FakeMessage, FakeRest
+from .resp_server import RespServer
+
+MESSAGE_ID = 42
+
+
+def _recruitment() -> TrackedMessage:
+    return TrackedMessage(
+        guild_id=1,
+        channel_id=2,
+        title="募集",
+        color=0,
+        join_emoji="👋",
+        check_emoji="⚔️",
+        dummy_emoji="➕",
+        notify_emoji="📢",
+        recruit_emoji="♻️",
+        participants=Roster(
+            ParticipantEntry(key=f"user:{user_id}", user_id=user_id, label="") for user_id in range(100, 120)
+        ),
+    )
+
+
+def test_concurrent_updates_from_two_workers_are_not_lost() -> None:
+    async def scenario() -> None:
+        server = await RespServer().start()
+        workers = [RedisRecruitmentState(RespClient.from_url(server.url)) for _ in range(2)]
+        try:
+            await workers[0].put(MESSAGE_ID, _recruitment())
+
+            rng = random.Random(0)
+            joined = list(range(1, 41))
+            left = list(range(100, 115))
+            operations = (
+                [lambda worker, user_id=user_id: worker.join(MESSAGE_ID, _entry(user_id)) for user_id in joined]
+                + [lambda worker, user_id=user_id: worker.leave(MESSAGE_ID, user_id) for user_id in left]
+                + [lambda worker: worker.add_dummy(MESSAGE_ID) for _ in range(10)]
+            )
+            rng.shuffle(operations)
+            results = await asyncio.gather(
+                *(operation(workers[index % 2]) for index, operation in enumerate(operations))
+            )
+            assert all(result is not None for result in results)
+
+            final = await workers[1].get(MESSAGE_ID)
+            assert final is not None
+            user_ids = set(final.participants.user_ids())
+            assert user_ids == set(joined) | (set(range(100, 120)) - set(left))
+            dummies = [entry for entry in final.participants if entry.is_dummy]
+            assert final.dummy_count == 10
+            assert sorted(entry.key for entry in dummies) == sorted(f"dummy:{index}" for index in range(1, 11))
+            # 2 つのワーカーが同じ募集を書き換えたので、compare-and-set のやり直しが起きている
+            assert workers[0].conflicts + workers[1].conflicts > 0
+        finally:
+            for worker in workers:
+                await worker.close()
+            await server.close()
+
+    asyncio.run(scenario())
+
+
+def _entry(user_id: int) -> ParticipantEntry:
+    return ParticipantEntry(key=f"user:{user_id}", user_id=user_id, label="")
+
+
+def test_only_one_worker_claims_an_event() -> None:
+    async def scenario() -> None:
+        server = await RespServer().start()
+        workers = [RedisRecruitmentState(RespClient.from_url(server.url)) for _ in range(3)]
+        try:
+            claims = await asyncio.gather(*(worker.claim(f"{MESSAGE_ID}:7:➕", 1.0) for worker in workers))
+            assert sorted(claims) == [False, False, True]
+            # 別のイベントは別に確保できる
+            assert await workers[0].claim(f"{MESSAGE_ID}:8:➕", 1.0)
+        finally:
+            for worker in workers:
+                await worker.close()
+            await server.close()
+
+    asyncio.run(scenario())
+
+
+def test_reaction_fallbacks_are_written_to_the_shared_state(monkeypatch: pytest.MonkeyPatch) -> None:
+    original = FakeMessage.add_reaction
+
+    async def add_reaction(self: FakeMessage, emoji: Any) -> None:
+        if emoji == "⚔️":
+            raise RuntimeError("unknown emoji")
+        await original(self, emoji)
+
+    monkeypatch.setattr(FakeMessage, "add_reaction", add_reaction)
+
+    async def scenario() -> None:
+        server = await RespServer().start()
+        state = RedisRecruitmentState(RespClient.from_url(server.url))
+        rng = random.Random(0)
+        test = FakeBot(FakeRest(latency=0.0, jitter=0.0, rate_limits=False, rng=rng), rng, state=state)
+        await test.start()
+        try:
+            message_id = await test.create_lobby(test.new_channel())
+            await test.drain()
+            # ⚔️ を付けられなかった募集は、ほかのワーカーから見てもチーム分けなしになる
+            shared = await state.get(message_id)
+            assert shared is not None and shared.check_emoji is None
+            assert test.cog.tracked_messages[message_id].check_emoji is None
+            assert (message_id, "⚔️", None) not in test.cog._reaction_routes
+        finally:
+            await test.close()
+            await server.close()
+
+    asyncio.run(scenario())
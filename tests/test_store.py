@@ -0,0 +1,103 @@
+import asyncio
+from pathlib import Path
+from typing import Dict
+
+from bot.recruitment import ArchivedRecruitment, ParticipantEntry, Roster, TrackedMessage
+from bot.store import SqliteRecruitmentStore, WriteBehindWriter, recruitment_to_dict
+
+
+def _recruitment(guild_id: int = 1) -> TrackedMessage:
+    participants = Roster(
+        [
+            ParticipantEntry(key="user:1", user_id=1, label="一人目"),
+            ParticipantEntry(key="user:2", user_id=2, label="二人目"),
+            ParticipantEntry(key="dummy:1", user_id=None, label="ダミー1", is_dummy=True),
+            ParticipantEntry(key="user:3", user_id=3, label="三人目"),
+        ]
+    )
+    participants.assign_teams([["user:1", "dummy:1"], ["user:2", "user:3"]])
+    return TrackedMessage(
+        guild_id=guild_id,
+        channel_id=10,
+        title="募集",
+        color=0x123456,
+        join_emoji="👋",
+        check_emoji="⚔️",
+        dummy_emoji="➕",
+        notify_emoji=None,
+        recruit_emoji=None,
+        participants=participants,
+        team_count=3,
+        uses_buttons=True,
+        dummy_count=1,
+        teams_visible=True,
+        created_at=100.0,
+        updated_at=200.0,
+    )
+
+
+def test_saved_recruitment_loads_back_unchanged(tmp_path: Path) -> None:
+    data = _recruitment()
+    store = SqliteRecruitmentStore(str(tmp_path / "state.db"))
+    store.save_many([(42, recruitment_to_dict(data))])
+    store.close()
+
+    # 開き直しても同じ内容が読める
+    store = SqliteRecruitmentStore(str(tmp_path / "state.db"))
+    try:
+        loaded = store.load_open()
+    finally:
+        store.close()
+    assert list(loaded) == [42]
+    restored = loaded[42]
+    assert recruitment_to_dict(restored) == recruitment_to_dict(data)
+    assert restored.participants.teams == {"user:1": 0, "dummy:1": 0, "user:2": 1, "user:3": 1}
+    assert restored.dummy_count == 1
+    assert restored.participants.get("dummy:1").is_dummy
+    # 読み込んだ名簿でも同じユーザーの二重参加は弾かれる
+    assert not restored.participants.append(ParticipantEntry(key="other", user_id=2, label=""))
+
+
+def test_load_open_skips_disbanded_and_unowned_recruitments(tmp_path: Path) -> None:
+    disbanded = _recruitment()
+    disbanded.is_disbanded = True
+    store = SqliteRecruitmentStore(str(tmp_path / "state.db"))
+    try:
+        store.save_many(
+            [
+                (1, recruitment_to_dict(_recruitment(guild_id=1))),
+                (2, recruitment_to_dict(_recruitment(guild_id=2))),
+                (3, recruitment_to_dict(disbanded)),
+            ]
+        )
+        assert sorted(store.load_open()) == [1, 2]
+        assert list(store.load_open(lambda guild_id: guild_id == 2)) == [2]
+    finally:
+        store.close()
+
+
+def test_writer_flush_saves_deletes_and_archives(tmp_path: Path) -> None:
+    async def scenario() -> None:
+        tracked: Dict[int, TrackedMessage] = {1: _recruitment(), 2: _recruitment(), 3: _recruitment()}
+        store = SqliteRecruitmentStore(str(tmp_path / "state.db"))
+        writer = WriteBehindWriter(store, tracked.get, interval=60)
+        for message_id in tracked:
+            writer.mark(message_id)
+        await writer.flush()
+        assert sorted(await writer.load_open()) == [1, 2, 3]
+
+        # 2 はメモリから消え、3 はアーカイブされた
+        del tracked[2]
+        writer.mark(2)
+        writer.archive(ArchivedRecruitment.from_tracked(3, tracked.pop(3), "closed"))
+        tracked[1].participants.remove_user(3)
+        writer.mark(1)
+        await writer.flush()
+        loaded = await writer.load_open()
+        assert list(loaded) == [1]
+        assert loaded[1].participants.user_ids() == [1, 2]
+        archived = store._conn.execute("SELECT message_id, user_ids FROM archived_recruitments").fetchall()
+        assert archived == [(3, "[1, 2, 3]")]
+        await writer.close()
+
+    asyncio.run(scenario())
@@ -0,0 +1,66 @@
+import random
+
+import numpy as np
+
+from bot.team_scoring import ObjectiveWeights, TeammateHistory, TeamScorer, split_table
+from bot.teams import equal_size_splits, optimal_splits, partition_spread
+
+
+def test_split_table_rows_follow_equal_size_splits() -> None:
+    for size in (2, 6, 12):
+        table = split_table(size)
+        splits = equal_size_splits(size)
+        assert table.shape == (len(splits), size)
+        for row, (team_one, team_two) in zip(table, splits):
+            assert list(np.flatnonzero(row)) == list(team_one)
+            assert not row[list(team_two)].any()
+        assert not table.flags.writeable
+
+
+def test_balance_score_is_the_difference_of_team_sums() -> None:
+    weights = [4, 3, 1, 1, 2, 2]
+    scores = TeamScorer(ObjectiveWeights(balance=1.0, repeat=0.0, spread=0.0)).score(weights)
+    expected = [partition_spread(weights, split) for split in equal_size_splits(len(weights))]
+    assert np.allclose(scores, expected)
+
+
+def test_balance_only_choice_is_an_optimal_split() -> None:
+    rng = random.Random(0)
+    scorer = TeamScorer(ObjectiveWeights(balance=1.0, repeat=0.0, spread=0.0), rng)
+    for size in (4, 8, 12):
+        weights = [rng.randrange(1, 5) for _ in range(size)]
+        optimal = {frozenset(team_one) for team_one, _ in optimal_splits(weights)}
+        team_one, team_two = scorer.choose(weights)
+        # チームの左右はランダムなので、0 番を含む側で比べる
+        assert frozenset(team_one if 0 in team_one else team_two) in optimal
+
+
+def test_repeat_objective_avoids_recent_teammates() -> None:
+    history = TeammateHistory(max_games=2)
+    history.record(1, [[10, 11], [12, 13]])
+    user_ids = [10, 11, 12, 13]
+    cooccurrence = history.cooccurrence(1, user_ids)
+    assert cooccurrence[0][1] == cooccurrence[1][0] == 1.0
+    assert cooccurrence[0][2] == 0.0
+
+    scorer = TeamScorer(ObjectiveWeights(balance=1.0, repeat=1.0, spread=0.0), random.Random(0))
+    for _ in range(10):
+        team_one, team_two = scorer.choose([1, 1, 1, 1], cooccurrence)
+        assert {0, 1} not in ({*team_one}, {*team_two})
+        assert {2, 3} not in ({*team_one}, {*team_two})
+
+
+def test_history_keeps_only_the_latest_games() -> None:
+    history = TeammateHistory(max_games=1)
+    history.record(1, [[10, 11], [12, 13]])
+    history.record(1, [[10, 12], [11, 13]])
+    matrix = history.cooccurrence(1, [10, 11, 12, None])
+    assert matrix[0][1] == 0.0
+    assert matrix[0][2] == 1.0
+    assert matrix[3] == [0.0, 0.0, 0.0, 0.0]
+
+
+def test_choose_returns_empty_teams_for_odd_rosters() -> None:
+    scorer = TeamScorer(ObjectiveWeights())
+    assert scorer.choose([1, 2, 3]) == ((), ())
+    assert scorer.choose([]) == ((), ())
@@ -0,0 +1,120 @@
+import itertools
+import random
+import time
+from typing import List
+
+from bot.teams import (
+    equal_size_splits,
+    optimal_splits,
+    partition,
+    partition_spread,
+    plan_lobbies,
+    pool_partition,
+    team_sizes,
+)
+
+
+def test_exact_partition_stops_at_the_time_budget() -> None:
+    rng = random.Random(0)
+    weights = [rng.randrange(1, 1000) for _ in range(12)]
+    started = time.perf_counter()
+    teams = partition(weights, 4, time_budget=0.005, seed=0)
+    assert time.perf_counter() - started < 0.05
+    # 打ち切っても人数のそろった分け方を返す
+    assert sorted(len(team) for team in teams) == team_sizes(12, 4)
+    assert sorted(index for team in teams for index in team) == list(range(12))
+
+
+def test_pool_partition_keeps_to_the_time_budget() -> None:
+    rng = random.Random(1)
+    for team_count in (3, 4):
+        weights = [rng.choice((1, 2, 3, 4)) for _ in range(150)]
+        started = time.perf_counter()
+        pool_partition(weights, plan_lobbies(150, team_count, 12), team_count, time_budget=0.05, seed=0)
+        assert time.perf_counter() - started < 0.1
+
+
+def _brute_force_spread(weights: List[int], team_count: int) -> int:
+    """人数差 1 以内のすべての割り当てを調べた最小の差。"""
+    sizes = sorted(team_sizes(len(weights), team_count))
+    best = None
+    for assignment in itertools.product(range(team_count), repeat=len(weights)):
+        counts = [assignment.count(team) for team in range(team_count)]
+        if sorted(counts) != sizes:
+            continue
+        sums = [0] * team_count
+        for index, team in enumerate(assignment):
+            sums[team] += weights[index]
+        spread = max(sums) - min(sums)
+        best = spread if best is None else min(best, spread)
+    assert best is not None
+    return best
+
+
+def _assert_is_partition(teams: List[List[int]], size: int, team_count: int) -> None:
+    assert len(teams) == team_count
+    assert sorted(index for team in teams for index in team) == list(range(size))
+    assert sorted(len(team) for team in teams) == sorted(team_sizes(size, team_count))
+
+
+def test_equal_size_splits_enumerate_each_split_once() -> None:
+    splits = equal_size_splits(12)
+    assert len(splits) == 462
+    assert all(team_one[0] == 0 and len(team_one) == len(team_two) == 6 for team_one, team_two in splits)
+    assert len({frozenset(team_one) for team_one, _ in splits}) == 462
+    assert equal_size_splits(7) == ()
+
+
+def test_optimal_splits_match_brute_force() -> None:
+    rng = random.Random(2)
+    for size in (2, 4, 6, 8, 10, 12):
+        weights = [rng.randrange(1, 5) for _ in range(size)]
+        expected = _brute_force_spread(weights, 2) if size <= 10 else None
+        candidates = optimal_splits(weights)
+        spreads = {partition_spread(weights, split) for split in candidates}
+        assert len(spreads) == 1
+        if expected is not None:
+            assert spreads == {expected}
+        # 同じ差の分け方はすべて候補に含まれる
+        best = spreads.pop()
+        assert len(candidates) == sum(partition_spread(weights, split) == best for split in equal_size_splits(size))
+
+
+def test_exact_k_way_partition_matches_brute_force() -> None:
+    rng = random.Random(3)
+    for size, team_count in ((6, 3), (7, 3), (9, 3), (8, 4), (6, 4)):
+        for _ in range(3):
+            weights = [rng.randrange(1, 10) for _ in range(size)]
+            teams = partition(weights, team_count, time_budget=10, seed=rng.randrange(100))
+            _assert_is_partition(teams, size, team_count)
+            assert partition_spread(weights, teams) == _brute_force_spread(weights, team_count)
+
+
+def test_large_partitions_are_balanced_in_size_and_weight() -> None:
+    rng = random.Random(4)
+    for size, team_count in ((13, 2), (20, 3), (30, 4), (47, 5)):
+        weights = [rng.randrange(1, 5) for _ in range(size)]
+        teams = partition(weights, team_count, time_budget=0.05, seed=0)
+        _assert_is_partition(teams, size, team_count)
+        # 重み 1〜4 の参加者が多ければ、交換でほぼ差がなくなる
+        assert partition_spread(weights, teams) <= 4
+
+
+def test_plan_lobbies_uses_the_fewest_evenly_sized_lobbies() -> None:
+    assert plan_lobbies(30, 2, 12) == [10, 10, 10]
+    assert plan_lobbies(25, 2, 12) == [12, 12]
+    assert plan_lobbies(13, 4, 12) == [12]
+    assert plan_lobbies(3, 4, 12) == []
+
+
+def test_pool_partition_places_every_lobby_member_once() -> None:
+    rng = random.Random(5)
+    weights = [rng.randrange(1, 5) for _ in range(50)]
+    lobby_sizes = plan_lobbies(50, 2, 12)
+    lobbies = pool_partition(weights, lobby_sizes, 2, seed=0)
+    assert [sum(len(team) for team in lobby) for lobby in lobbies] == lobby_sizes
+    placed = [index for lobby in lobbies for team in lobby for index in team]
+    assert len(placed) == len(set(placed)) == sum(lobby_sizes)
+    # 重い順に蛇行順で配るので、外れるのは最も軽い参加者
+    left_out = set(range(50)) - set(placed)
+    assert all(weights[index] <= min(weights[member] for member in placed) for index in left_out)